@@ -5,10 +5,26 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+import functools
 import numpy as np
 from st_aggrid import AgGrid, GridOptionsBuilder
-import requests
-from io import BytesIO
+from crm_core import DatasetCompartido, DatosCRM
+from crm_core.busqueda import RESULTADOS_BUSQUEDA
+from crm_core.cadencia import TOLERANCIA
+from crm_core.compactacion import codigo_mes, etiqueta_mes
+from crm_core.dataset import activar_copy_on_write
+from crm_core.espacial import ZOOM_MAXIMO, ZOOM_MINIMO
+from crm_core.exportacion import FORMATOS, GestorExportaciones, bloques_exportacion
+from crm_core.guiones import anadir_guiones, generar_guiones
+from crm_core.historico import Fuente, fuentes_configuradas
+from crm_core.llamadas import RESULTADOS, ColasLlamadas, RegistroLlamadas
+from crm_core.matriz import ORDEN_NOMBRE, ORDEN_TOTAL
+from crm_core.refresco import RefrescadorDatos, cargar_version, cargar_version_fuentes
+from crm_core.validacion import resumen_validacion
+
+# Las sesiones trabajan sobre vistas del dataset compartido: Copy-on-Write
+# garantiza que una escritura en una sesión no modifica el de las demás
+activar_copy_on_write()
 
 # =============================================
 # 1. SECCIÓN DE AUTENTICACIÓN (AL PRINCIPIO DEL ARCHIVO)
@@ -56,22 +72,6 @@ if not check_auth():
 # 3. EL RESTO DE TU DASHBOARD (CONTENIDO PROTEGIDO)
 # =============================================
 
-# ----------------------------------------------------------
-# FUNCIÓN PARA ORDENAR CÓDIGOS
-# ----------------------------------------------------------
-def ordenar_codigos_seguro(codigos):
-    def clave_ordenacion(x):
-        try:
-            if isinstance(x, (int, float)):
-                return (0, float(x))
-            if str(x).replace('.', '', 1).isdigit():
-                return (0, float(x))
-            return (1, str(x).lower())
-        except:
-            return (1, str(x).lower())
-    
-    return sorted(codigos, key=clave_ordenacion)
-
 # ----------------------------------------------------------
 # CONFIGURACION DE LA PAGINA
 # ----------------------------------------------------------
@@ -86,91 +86,54 @@ st.set_page_config(
 # ----------------------------------------------------------
 # Función para cargar datos desde Google Drive
 # ----------------------------------------------------------
-@st.cache_data
-def load_data_from_drive(file_id):
-    """Carga y procesa los datos desde Google Drive"""
-    try:
-        # Construir la URL de descarga directa para archivos de Google Sheets
-        download_url = f"https://docs.google.com/spreadsheets/d/{file_id}/export?format=xlsx"
-        
+@st.cache_resource(show_spinner=False)
+def obtener_refrescador(file_id, fuentes=()):
+    """Un refrescador por proceso: revalida el libro y reconstruye las tablas
+    en segundo plano, fuera de las ejecuciones del script. Con varias fuentes
+    se carga el histórico particionado por meses en lugar del libro único"""
+    if fuentes:
+        return RefrescadorDatos(functools.partial(cargar_version_fuentes, [Fuente(f) for f in fuentes])).iniciar()
+    return RefrescadorDatos(functools.partial(cargar_version, file_id)).iniciar()
+
+@st.cache_resource(show_spinner=False)
+def obtener_exportaciones():
+    """Una cola de exportaciones por proceso: los archivos se generan en hilos
+    propios y un mismo corte lo comparten todas las sesiones"""
+    return GestorExportaciones()
+
+@st.cache_resource(show_spinner=False)
+def obtener_registro_llamadas():
+    """Registro de llamadas (SQLite) compartido por las sesiones del proceso"""
+    return RegistroLlamadas()
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def obtener_colas_llamadas(version, _clientes):
+    """Colas de llamadas del proceso para una versión de los datos; las llamadas
+    de otros procesos se leen del registro al pedir el siguiente cliente"""
+    return ColasLlamadas(_clientes, obtener_registro_llamadas())
+
+def load_data_from_drive(file_id, fuentes=()):
+    """Devuelve el refrescador y la versión actual de los datos.
+    Sólo se espera (con spinner) si el proceso aún no tiene ninguna versión."""
+    refrescador = obtener_refrescador(file_id, fuentes)
+    version_datos = refrescador.actual()
+    if version_datos is None:
         with st.spinner('Cargando datos...'):
-            # Descargar el archivo
-            response = requests.get(download_url)
-            response.raise_for_status()  # Verificar que la descarga fue exitosa
-            
-            # Leer el archivo Excel
-            excel_file = BytesIO(response.content)
-            
-            # Cargar las hojas de Excel
-            pedidos = pd.read_excel(excel_file, sheet_name="pedido")
-            entregas = pd.read_excel(excel_file, sheet_name="entregado")
-            clientes = pd.read_excel(excel_file, sheet_name="clientes")
-            
-            # Limpieza de datos
-            clientes["direccion"] = clientes["direccion"].astype(str).str.replace('"', '').str.strip()
-            
-            # Procesar pedidos
-            pedidos["fecha_pedido"] = pd.to_datetime(pedidos["fecha_pedido"])
-            pedidos["mes_pedido"] = pedidos["fecha_pedido"].dt.to_period('M')
-            pedidos["monto"] = pedidos["cantidad"] * pedidos["precio_unitario"]
-            
-            # Procesar entregas
-            entregas["fecha_entrega"] = pd.to_datetime(entregas["fecha_entrega"])
-            entregas["mes_entrega"] = entregas["fecha_entrega"].dt.to_period('M')
-            
-            # Obtener fechas extremas para el pie de página
-            fecha_min_pedidos = pedidos["fecha_pedido"].min().strftime('%d/%m/%Y') if not pedidos.empty else "N/A"
-            fecha_max_pedidos = pedidos["fecha_pedido"].max().strftime('%d/%m/%Y') if not pedidos.empty else "N/A"
-            fecha_min_entregas = entregas["fecha_entrega"].min().strftime('%d/%m/%Y') if not entregas.empty else "N/A"
-            fecha_max_entregas = entregas["fecha_entrega"].max().strftime('%d/%m/%Y') if not entregas.empty else "N/A"
-            
-            # Agregación de pedidos por cliente
-            pedidos_agg = pedidos.groupby("codigo_cliente").agg({
-                "fecha_pedido": "max",
-                "mes_pedido": lambda x: x.value_counts().index[0],
-                "monto": ["sum", "mean"],
-                "codigo_producto": "count"
-            })
-            pedidos_agg.columns = ['ultimo_pedido', 'mes_frecuente', 'monto_total', 'ticket_promedio', 'total_pedidos']
-            pedidos_agg = pedidos_agg.reset_index()
-            
-            # Unir datos
-            df = pd.merge(clientes, pedidos_agg, on="codigo_cliente", how="left").fillna(0)
-            
-            # CORRECCIÓN: Cálculo seguro de frecuencia de compra (días desde último pedido)
-            hoy = pd.Timestamp.now().normalize()
-            df["frecuencia_compra"] = (hoy - pd.to_datetime(df["ultimo_pedido"])).dt.days.fillna(0).astype(int)
-            
-            # CORRECCIÓN: Limitar frecuencia máxima a 365 días
-            df["frecuencia_compra"] = df["frecuencia_compra"].clip(upper=365)
-            
-            # Calcular efectividad de entrega (pedidos vs entregas)
-            entregas_count = entregas.groupby("codigo_cliente").size().reset_index(name='entregas_count')
-            df = pd.merge(df, entregas_count, on="codigo_cliente", how="left").fillna(0)
-            df["efectividad_entrega"] = (df["entregas_count"] / df["total_pedidos"].replace(0, 1)).clip(0, 1)
-            
-            # Segmentación automática
-            df["segmento"] = pd.cut(
-                df["frecuencia_compra"],
-                bins=[-1, 30, 90, float('inf')],
-                labels=["Activo", "Disminuido", "Inactivo"],
-                right=False
-            ).astype(str)
-            
-            # Valor del cliente (proyección anual)
-            df["valor_cliente"] = (df["ticket_promedio"] * (365 / df["frecuencia_compra"].replace(0, 1))).round(2)
-            
-            # Productos top y bottom
-            top_productos = (pedidos.groupby("producto")["cantidad"].sum()
-                            .nlargest(5).reset_index().dropna())
-            bottom_productos = (pedidos.groupby("producto")["cantidad"].sum()
-                               .nsmallest(5).reset_index().dropna())
-            
-            return df, top_productos, bottom_productos, pedidos, entregas, fecha_min_pedidos, fecha_max_pedidos, fecha_min_entregas, fecha_max_entregas
-        
-    except Exception as e:
-        st.error(f"Error al cargar los datos: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), "N/A", "N/A", "N/A", "N/A"
+            version_datos = refrescador.esperar_primera_version()
+    if version_datos is None:
+        st.error(f"Error al cargar los datos: {str(refrescador.ultimo_error)}")
+    return refrescador, version_datos
+
+def formatear_antiguedad(segundos):
+    """Texto corto para la antigüedad de los datos"""
+    minutos = int(segundos // 60)
+    if minutos < 1:
+        return "hace menos de 1 min"
+    if minutos < 60:
+        return f"hace {minutos} min"
+    if minutos < 48 * 60:
+        return f"hace {minutos // 60} h {minutos % 60} min"
+    return f"hace {minutos // (24 * 60)} días"
 
 # ----------------------------------------------------------
 # CARGAR DATOS DESDE GOOGLE DRIVE
@@ -179,9 +142,17 @@ def load_data_from_drive(file_id):
 # ID del archivo en Google Drive (extraído de la URL compartida)
 # URL proporcionada: https://docs.google.com/spreadsheets/d/1MLgtcblazoKbx0ZwiPljCQxix5bTuKBn/edit?usp=sharing&ouid=117295945155119200843&rtpof=true&sd=true
 FILE_ID = "1MLgtcblazoKbx0ZwiPljCQxix5bTuKBn"
+# Varios libros o ficheros locales (CRM_FUENTES); si no hay, sólo el libro de FILE_ID
+FUENTES = tuple(fuente.ubicacion for fuente in fuentes_configuradas())
 
-# Cargar datos
-df, top_productos, bottom_productos, pedidos, entregas, fecha_min_p, fecha_max_p, fecha_min_e, fecha_max_e = load_data_from_drive(FILE_ID)
+# Cargar datos: la versión se fija al inicio de la ejecución y no cambia
+# hasta la siguiente, aunque el refresco publique otra entretanto
+refrescador, version_datos = load_data_from_drive(FILE_ID, FUENTES)
+dataset = version_datos.dataset if version_datos else DatasetCompartido(DatosCRM.vacio(), version="")
+datos = dataset.vista()
+df = datos.clientes
+pedidos, entregas = datos.pedidos, datos.entregas
+(fecha_min_p, fecha_max_p), (fecha_min_e, fecha_max_e) = datos.periodo_pedidos, datos.periodo_entregas
 
 if df.empty:
     st.warning("No se encontraron datos o hubo un error al cargarlos. Verifica con el administrador.")
@@ -196,73 +167,257 @@ with st.sidebar.expander("Explicación de los filtros"):
     - **Mes:** Filtra por mes específico de actividad
     """)
 
-# Opciones de filtros
-df['zona'] = df.get('zona', 'No especificada').astype(str)
-df['segmento'] = df.get('segmento', 'No especificado').astype(str)
-
-# Filtro por mes (convertir a string para evitar problemas)
-if not pedidos.empty:
-    meses_disponibles = pedidos["mes_pedido"].astype(str).unique()
-else:
-    meses_disponibles = []
+# Opciones de filtros: precalculadas una vez por versión de los datos
+indice_filtros = dataset.indice_filtros
 
 selected_vendedor = st.sidebar.selectbox(
     "Vendedor (Zona)",
-    options=["Todos"] + sorted(df["zona"].unique().tolist(), key=str)
+    options=["Todos"] + sorted(indice_filtros.opciones("zona"), key=str)
 )
 
 selected_segmento = st.sidebar.selectbox(
     "Segmento",
-    options=["Todos"] + sorted(df["segmento"].unique().tolist(), key=str),
-    help="Clasificación basada en frecuencia de compra: Activo (<30 días), Disminuido (30-90 días), Inactivo (>90 días)"
+    options=["Todos"] + sorted(indice_filtros.opciones("segmento"), key=str),
+    help="Clasificación según el ritmo de compra de cada cliente: Activo (al día), Disminuido (atrasado), Inactivo (más de 3 ciclos sin comprar)"
 )
 
 selected_mes = st.sidebar.selectbox(
     "Mes",
-    options=["Todos"] + sorted(meses_disponibles.tolist()),
+    options=["Todos"] + dataset.meses_pedido,
     help="Filtrar por mes de actividad"
 )
 
-# Filtrado de datos
-filtered_df = df.copy()
-if selected_vendedor != "Todos":
-    filtered_df = filtered_df[filtered_df["zona"] == selected_vendedor]
-if selected_segmento != "Todos":
-    filtered_df = filtered_df[filtered_df["segmento"] == selected_segmento]
-if selected_mes != "Todos":
-    filtered_df = filtered_df[filtered_df["mes_frecuente"].astype(str) == selected_mes]
+# Filtrado de datos: intersección de listas de filas del índice, cacheada por combinación.
+# El mismo corte se aplica al cubo de ventas de las pestañas de analítica.
+filtros_activos = {
+    "zona": None if selected_vendedor == "Todos" else selected_vendedor,
+    "segmento": None if selected_segmento == "Todos" else selected_segmento,
+    "mes": None if selected_mes == "Todos" else codigo_mes(selected_mes),
+}
+filtered_df = indice_filtros.filtrar(filtros_activos)
+
+# Secciones principales: sólo se ejecuta la seleccionada. Cada sección es un
+# fragmento, así que sus propios widgets sólo vuelven a ejecutar esa sección,
+# y sus cálculos se memorizan por versión y filtros en el dataset compartido.
+seccion_activa = st.radio(
+    "Sección",
+    options=["📞 Clientes", "📊 Analítica", "👤 Vendedores", "🔥 Promociones"],
+    horizontal=True,
+    label_visibility="collapsed",
+    key="seccion"
+)
+
+def calcular_analitica(filtered_df, filtros_activos):
+    """KPIs, segmentos y productos extremos del corte, para la pestaña de analítica"""
+    cubo = dataset.cubo
+    resumen_ventas = cubo.totales(**filtros_activos)
+    segmentos = filtered_df["segmento"].value_counts()
+    return {
+        "clientes": filtered_df["codigo_cliente"].nunique(),
+        "compra_promedio": resumen_ventas["monto"] / max(resumen_ventas["clientes"], 1),
+        "frecuencia_promedio": filtered_df["frecuencia_compra"].mean(),
+        "valor_cliente_promedio": filtered_df["valor_cliente"].mean(),
+        "clientes_segmento": segmentos[segmentos > 0].rename_axis("segmento").reset_index(name="clientes"),
+        "ventas_segmento": pd.concat([
+            cubo.por(["segmento"], "monto", **filtros_activos).rename("monto_total"),
+            cubo.clientes_activos(por=["segmento"], **filtros_activos).rename("clientes"),
+        ], axis=1).fillna(0).reset_index(),
+        "productos_extremos": cubo.productos_extremos(**filtros_activos),
+    }
+
+def calcular_vendedores(filtered_df, filtros_activos):
+    """Métricas por vendedor, cumplimiento de entregas y productos por vendedor del corte"""
+    cubo = dataset.cubo
+
+    # Estadísticas por vendedor
+    vendedor_stats = filtered_df.groupby("zona", observed=True).agg({
+        "nombre": "count",
+        "frecuencia_compra": "mean",
+        "efectividad_entrega": "mean",
+        "ticket_promedio": "mean",
+        "valor_cliente": "mean",
+        "monto_total": "sum"
+    }).reset_index()
+
+    # Redondear métricas
+    vendedor_stats["frecuencia_compra"] = vendedor_stats["frecuencia_compra"].round(0)
+    vendedor_stats["efectividad_entrega"] = vendedor_stats["efectividad_entrega"] * 100
+    vendedor_stats["efectividad_entrega"] = vendedor_stats["efectividad_entrega"].round(2)
+    vendedor_stats["ticket_promedio"] = vendedor_stats["ticket_promedio"].round(2)
+    vendedor_stats["valor_cliente"] = vendedor_stats["valor_cliente"].round(2)
+    vendedor_stats["monto_total"] = vendedor_stats["monto_total"].round(2)
+
+    # Cumplimiento real: pedidos emparejados con sus entregas, por zona del cliente
+    cumplimiento_zona = cubo.cumplimiento(["zona"], **filtros_activos).rename(index=str)
+    zonas = vendedor_stats["zona"].astype(str)
+    vendedor_stats["cumplimiento"] = (zonas.map(cumplimiento_zona["tasa_cumplimiento"]) * 100).round(2)
+    vendedor_stats["dias_entrega"] = zonas.map(cumplimiento_zona["dias_entrega"]).round(1)
+
+    # Tendencia mensual por mes del pedido
+    cumplimiento_trend = cubo.cumplimiento(["mes"], **filtros_activos).reset_index()
+    cumplimiento_trend["mes"] = cumplimiento_trend["mes"].map(etiqueta_mes)
+    cumplimiento_trend[["tasa_cumplimiento", "lineas_completas"]] = (
+        cumplimiento_trend[["tasa_cumplimiento", "lineas_completas"]] * 100
+    ).round(2)
 
-# Pestañas principales
-tab1, tab2, tab3, tab4 = st.tabs(["📞 Clientes", "📊 Analítica", "👤 Vendedores", "🔥 Promociones"])
+    # Cumplimiento por vendedor del pedido
+    cumplimiento_vendedor = cubo.cumplimiento(["vendedor"], **filtros_activos).reset_index()
+
+    # Productos por vendedor: matriz dispersa, sin tabla densa
+    vendedor_producto = None
+    if not pedidos.empty:
+        vendedor_producto = cubo.matriz("vendedor", "producto", "cantidad", **filtros_activos)
+    return vendedor_stats, cumplimiento_trend, cumplimiento_vendedor, vendedor_producto
 
 # ----------------------------------------------------------
 # PESTAÑA 1: CLIENTES
 # ----------------------------------------------------------
-with tab1:
+@st.fragment
+def exportar_lista_filtrada(nombre="exportacion", parametros=None, completar=None, archivo="clientes_filtrados"):
+    """Exportación de la lista filtrada para campañas de llamadas. El archivo se
+    escribe por bloques en segundo plano; este fragmento sólo consulta el progreso.
+    `completar` añade columnas a cada bloque y `parametros` distingue sus variantes"""
+    exportaciones = obtener_exportaciones()
+    formato = st.selectbox("Formato", options=list(FORMATOS), format_func=str.upper, key=f"formato_{nombre}")
+    clave = exportaciones.clave(dataset.version, {**filtros_activos, **(parametros or {}), "exportacion": nombre}, formato)
+    trabajo = exportaciones.trabajo(clave)
+    
+    if trabajo is None or trabajo.estado == "error":
+        if trabajo is not None:
+            st.error(f"Error al exportar: {trabajo.error}")
+        if st.button("Preparar archivo", key=f"preparar_{nombre}"):
+            filas = indice_filtros.filas(filtros_activos)
+            filas = dataset.indice_busqueda.filas_en_orden(filas)
+            recomendaciones, indice_clientes = dataset.recomendaciones, dataset.indice_clientes
+            trabajo = exportaciones.solicitar(clave, formato, len(filas), lambda: bloques_exportacion(
+                df, filas,
+                lambda bloque: recomendaciones.oportunidad_principal(indice_clientes.claves_de(bloque["codigo_cliente"])),
+                completar=completar,
+            ), nombre=archivo)
+    
+    if trabajo is not None and not trabajo.terminado:
+        progreso_exportacion(clave)
+    elif trabajo is not None and trabajo.estado == "listo":
+        st.download_button(
+            f"⬇️ Descargar {trabajo.total:,} clientes ({formato.upper()})",
+            data=trabajo.leer,
+            file_name=trabajo.nombre_archivo,
+            mime=trabajo.mime,
+            key=f"descargar_{nombre}"
+        )
+
+@st.fragment(run_every=1)
+def progreso_exportacion(clave):
+    """Barra de progreso que se refresca sola mientras se escribe el archivo"""
+    trabajo = obtener_exportaciones().trabajo(clave)
+    if trabajo is None or trabajo.terminado:
+        # Terminado: se vuelve a ejecutar la página para mostrar la descarga (o el error)
+        st.rerun()
+    st.progress(trabajo.progreso, text=f"Exportando {trabajo.escritas:,} de {trabajo.total:,} clientes...")
+
+@st.fragment
+def cola_llamadas():
+    """Siguiente cliente a llamar en la zona, según la cola priorizada del día.
+    Registrar una llamada sólo actualiza a ese cliente y sólo ejecuta este fragmento"""
+    colas = obtener_colas_llamadas(dataset.version, df)
+    col_agente, col_zona = st.columns(2)
+    with col_agente:
+        agente = st.text_input("Agente", key="agente_llamadas", placeholder="Su nombre o usuario").strip()
+    with col_zona:
+        if selected_vendedor != "Todos":
+            zona = selected_vendedor
+            st.text_input("Vendedor (Zona)", value=str(zona), disabled=True, key="zona_llamadas_filtro")
+        else:
+            zona = st.selectbox("Vendedor (Zona)", options=sorted(colas.zonas, key=str), key="zona_llamadas")
+    if not agente:
+        st.info("Escriba su nombre de agente para recibir clientes de la cola")
+        return
+    
+    turno = colas.siguiente(zona, agente)
+    if turno is None:
+        st.success("No quedan clientes por llamar hoy en esta zona")
+        return
+    
+    st.caption(f"{colas.pendientes(zona):,} clientes pendientes hoy en {zona}. Este cliente queda apartado para usted.")
+    cols = st.columns(3)
+    with cols[0]:
+        st.info(f"**{turno['nombre']}**  \n{turno['codigo_cliente']} · 📞 {turno['telefono']}")
+    with cols[1]:
+        atraso = turno.get('dias_atraso')
+        detalle_atraso = "sin ritmo de compra conocido" if pd.isna(atraso) else f"{atraso:+,.0f} días respecto a su compra esperada"
+        st.info(f"**{turno['segmento']}** · {detalle_atraso}  \nValor cliente: RD${turno['valor_cliente']:,.2f}")
+    with cols[2]:
+        ultimo = "Nunca contactado" if pd.isna(turno['ultimo_contacto']) else (
+            f"Último contacto: {turno['ultimo_contacto']:%d/%m/%Y %H:%M} ({RESULTADOS.get(turno['ultimo_resultado'], turno['ultimo_resultado'])})"
+        )
+        st.info(f"**Prioridad {turno['prioridad']:.2f}**  \n{ultimo}")
+    
+    resultado = st.radio(
+        "Resultado de la llamada",
+        options=list(RESULTADOS),
+        format_func=RESULTADOS.get,
+        horizontal=True,
+        key="resultado_llamada"
+    )
+    if st.button("Registrar llamada y pasar al siguiente", key="registrar_llamada"):
+        colas.registrar(turno["codigo_cliente"], agente, resultado)
+        st.rerun(scope="fragment")
+
+@st.fragment
+def seccion_clientes():
+    """Búsqueda de clientes y vista 360; buscar o elegir otro cliente sólo ejecuta esta sección"""
     st.header("📞 Gestión de Clientes")
     
     if not filtered_df.empty:
-        # Obtener códigos únicos y manejar nulos
-        codigos_unicos = filtered_df["codigo_cliente"].dropna().unique()
+        with st.expander("📋 Cola de llamadas de hoy", expanded=True):
+            st.caption(
+                "Clientes ordenados por segmento, atraso en su ritmo de compra, valor dentro de la zona "
+                "y tiempo desde el último contacto. 'No contesta' y 'Volver a llamar' vuelven a la cola en 2 horas."
+            )
+            cola_llamadas()
+        
+        # Búsqueda incremental: el índice se construye una vez por versión y cada
+        # consulta devuelve sólo las mejores coincidencias dentro de los filtros
+        indice_busqueda = dataset.indice_busqueda
+        filas_filtradas = indice_filtros.filas(filtros_activos)
+        consulta_cliente = st.text_input(
+            "Buscar cliente",
+            placeholder="Código, nombre, teléfono o dirección",
+            help="Escriba parte del código, del nombre, del teléfono o de la dirección"
+        )
         
-        # Convertir a strings y ordenar
-        codigos_options = [""] + ordenar_codigos_seguro([str(cod) for cod in codigos_unicos])
+        if consulta_cliente.strip():
+            resultados_busqueda = indice_busqueda.buscar(consulta_cliente, k=RESULTADOS_BUSQUEDA, filas=filas_filtradas)
+            filas_opciones = resultados_busqueda["fila"].to_numpy()
+            if not len(filas_opciones):
+                st.info("Ningún cliente coincide con la búsqueda")
+        else:
+            # Sin consulta: los primeros códigos en orden natural
+            filas_opciones = indice_busqueda.filas_en_orden(filas_filtradas, limite=RESULTADOS_BUSQUEDA)
+        
+        clientes_opciones = df.iloc[filas_opciones]
+        etiquetas_clientes = dict(zip(
+            clientes_opciones["codigo_cliente"].astype(str).str.strip(),
+            clientes_opciones["codigo_cliente"].astype(str).str.strip() + " · "
+            + clientes_opciones["nombre"].fillna("").astype(str) + " · "
+            + clientes_opciones["telefono"].fillna("").astype(str)
+        ))
         
         # Selector de códigos
         cliente_search_code = st.selectbox(
             "Seleccione el código del cliente",
-            options=codigos_options,
-            format_func=lambda x: "Seleccione un código..." if x == "" else x
+            options=[""] + list(etiquetas_clientes),
+            format_func=lambda x: "Seleccione un código..." if x == "" else etiquetas_clientes.get(x, x)
         )
         
         # Proceso de búsqueda
         if cliente_search_code and cliente_search_code != "":
             try:
-                # Búsqueda flexible
-                cliente_filtrado = filtered_df[filtered_df["codigo_cliente"].astype(str) == cliente_search_code]
+                # Búsqueda directa en el índice de clientes (código normalizado)
+                indice_clientes = dataset.indice_clientes
+                cliente_data = indice_clientes.cliente(cliente_search_code)
                 
-                if not cliente_filtrado.empty:
-                    cliente_data = cliente_filtrado.iloc[0]
+                if cliente_data is not None:
                     
                     # Mostrar datos básicos
                     cols = st.columns(3)
@@ -283,7 +438,11 @@ with tab1:
                     with kpi_cols[0]:
                         st.metric("Ticket promedio", f"RD${cliente_data['ticket_promedio']:,.2f}")
                     with kpi_cols[1]:
-                        st.metric("Frecuencia compra", f"{cliente_data['frecuencia_compra']:,.0f} días")
+                        st.metric(
+                            "Frecuencia compra",
+                            f"{cliente_data['frecuencia_compra']:,.0f} días",
+                            help="Intervalo mediano entre sus días de compra (365 si tiene menos de dos compras)"
+                        )
                     with kpi_cols[2]:
                         st.metric("Efectividad entrega", f"{cliente_data['efectividad_entrega']:.2%}")
                     with kpi_cols[3]:
@@ -296,31 +455,30 @@ with tab1:
                     st.subheader("🍅 Análisis de Productos", help="Datos históricos de compras y recomendaciones")
                     
                     # Productos del cliente
-                    productos_cliente = pedidos[pedidos['codigo_cliente'] == cliente_data['codigo_cliente']]
+                    productos_cliente = indice_clientes.pedidos(cliente_search_code)
                     
                     # Top productos del cliente
-                    top_productos_cliente = productos_cliente.groupby('producto')['cantidad'].sum().nlargest(5).reset_index()
+                    top_productos_cliente = productos_cliente.groupby('producto', observed=True)['cantidad'].sum().nlargest(5).reset_index()
                     
                     # Productos recomendados (basado en clientes similares)
                     with st.expander("🔍 Método de recomendación"):
                         st.write("""
                         Los productos recomendados se calculan basándose en:
-                        1. Clientes con mismo tipo de negocio y zona
-                        2. Productos más vendidos entre ese grupo
-                        3. Productos que este cliente no compra actualmente
+                        1. Productos que suelen comprar los clientes que compran lo mismo que este cliente
+                        2. Afinidad: suma de similitudes con los productos que ya compra
+                        3. Sin historial de compras: productos más vendidos entre clientes con mismo tipo de negocio y zona
+                        
+                        Las oportunidades son productos que este cliente no compra actualmente, los más vendidos de su grupo primero.
                         """)
                     
-                    clientes_similares = filtered_df[
-                        (filtered_df['tipo_negocio'] == cliente_data['tipo_negocio']) & 
-                        (filtered_df['zona'] == cliente_data['zona'])
-                    ]
-                    productos_recomendados = pedidos[
-                        pedidos['codigo_cliente'].isin(clientes_similares['codigo_cliente'])
-                    ].groupby('producto')['cantidad'].sum().nlargest(5).reset_index()
+                    # Tablas precalculadas por versión de los datos
+                    recomendaciones = dataset.recomendaciones
+                    productos_recomendados = dataset.recomendador.recomendar(cliente_search_code)
+                    if productos_recomendados.empty:
+                        productos_recomendados = recomendaciones.recomendados(cliente_search_code)
                     
-                    # Productos no comprados (oportunidades)
-                    todos_productos = pedidos['producto'].unique()
-                    productos_no_comprados = [p for p in todos_productos if p not in productos_cliente['producto'].unique()]
+                    # Productos no comprados (oportunidades), los más populares de su grupo primero
+                    productos_no_comprados = recomendaciones.oportunidades(cliente_search_code)
                     
                     # Mostrar en 3 columnas
                     col1, col2, col3 = st.columns(3)
@@ -346,60 +504,65 @@ with tab1:
                     with st.expander(f"📌 Explicación del segmento: {cliente_data['segmento']}"):
                         if cliente_data['segmento'] == "Activo":
                             st.write("""
-                            **Cliente ACTIVO:** Realiza compras frecuentes (última compra hace menos de 30 días)
+                            **Cliente ACTIVO:** Compra a su ritmo habitual (no ha pasado su fecha esperada de compra más un margen; sin historial suficiente, última compra hace menos de 30 días)
                             - Estrategia: Fidelización y venta cruzada
                             - Objetivo: Aumentar ticket promedio
                             """)
                         elif cliente_data['segmento'] == "Disminuido":
                             st.write("""
-                            **Cliente DISMINUIDO:** Frecuencia de compra reducida (última compra hace 30-90 días)
+                            **Cliente DISMINUIDO:** Atrasado respecto a su ritmo de compra, menos de 3 ciclos (sin historial suficiente, última compra hace 30-90 días)
                             - Estrategia: Reactivación
                             - Objetivo: Recuperar frecuencia histórica
                             """)
                         else:
                             st.write("""
-                            **Cliente INACTIVO:** Sin compras recientes (última compra hace más de 90 días)
+                            **Cliente INACTIVO:** Más de 3 ciclos de compra sin comprar (sin historial suficiente, última compra hace más de 90 días)
                             - Estrategia: Recuperación
                             - Objetivo: Primera compra
                             """)
                     
-                    # Discurso recomendado
+                    # Discurso recomendado: mismas plantillas que los guiones por lotes de Promociones.
+                    # Sin historial o sin recomendados se usa el otro producto o una frase genérica.
+                    guion = generar_guiones(pd.DataFrame({
+                        "nombre": [cliente_data['nombre']],
+                        "segmento": [cliente_data['segmento']],
+                        "producto_mas_comprado": [top_productos_cliente['producto'].iloc[0] if len(top_productos_cliente) else None],
+                        "producto_recomendado": [productos_recomendados['producto'].iloc[0] if len(productos_recomendados) else None],
+                    }), negritas=True)["guion"].iloc[0]
                     if cliente_data['segmento'] == "Activo":
                         st.success("**Discurso recomendado para cliente ACTIVO:**")
-                        st.write(f"""
-                        "Don/Dña {cliente_data['nombre'].split()[0]}, siempre es un placer atenderle. 
-                        Como veo que frecuenta nuestro colmado, quería comentarle sobre **{productos_recomendados.iloc[0]['producto']}** 
-                        que está teniendo mucha aceptación. ¿Le interesaría probar una muestra o llevar una cantidad pequeña 
-                        con un **5% de descuento** por ser cliente preferencial?"
-                        """)
-                        
                     elif cliente_data['segmento'] == "Disminuido":
                         st.warning("**Discurso recomendado para cliente DISMINUIDO:**")
-                        st.write(f"""
-                        "Don/Dña {cliente_data['nombre'].split()[0]}, ¡cuánto tiempo sin atenderle! 
-                        Hemos notado que antes solía comprar **{top_productos_cliente.iloc[0]['producto']}** con frecuencia. 
-                        Tenemos una **oferta especial** solo para usted este mes. ¿Quiere que le aparte algunas unidades 
-                        con un **10% de descuento** para que vuelva a disfrutar de nuestros productos?"
-                        """)
-                        
                     else:
                         st.error("**Discurso recomendado para cliente INACTIVO:**")
-                        st.write(f"""
-                        "Don/Dña {cliente_data['nombre'].split()[0]}, espero que esté bien. 
-                        Nos hacía falta su visita y queríamos ofrecerle un **descuento especial del 15%** 
-                        en su próxima compra más **entrega gratuita**. ¿Qué productos necesita actualmente 
-                        para su negocio? Tenemos disponibilidad de **{productos_recomendados.iloc[0]['producto']}** 
-                        que podría interesarle."
-                        """)
+                    st.write(f'"{guion}"')
                     
-                    # Frecuencia de contacto recomendada
+                    # Frecuencia de contacto recomendada según su cadencia de compra
                     st.markdown("**⏰ Frecuencia recomendada de contacto:**")
-                    if cliente_data['frecuencia_compra'] < 15:
-                        st.write("- Cada 2 semanas (cliente muy activo)")
-                    elif cliente_data['frecuencia_compra'] < 30:
-                        st.write("- Semanal (mantener engagement)")
+                    ultimas_llamadas = obtener_registro_llamadas().historial(cliente_search_code, n=1)
+                    if len(ultimas_llamadas):
+                        ultima_llamada = ultimas_llamadas.iloc[0]
+                        st.write(
+                            f"- Último contacto: {ultima_llamada['registrada_en']:%d/%m/%Y %H:%M} "
+                            f"({RESULTADOS.get(ultima_llamada['resultado'], ultima_llamada['resultado'])}, {ultima_llamada['agente']})"
+                        )
+                    if pd.isna(cliente_data.get('proxima_compra')):
+                        st.write("- Semanal hasta conocer su ritmo de compra (menos de dos compras registradas)")
                     else:
-                        st.write("- 2-3 veces por semana (recuperación urgente)")
+                        proxima_compra = pd.Timestamp(cliente_data['proxima_compra'])
+                        st.write(
+                            f"- Compra cada {cliente_data['intervalo_mediano']:,.0f} días "
+                            f"(±{cliente_data['dispersion_intervalo']:,.0f}); próxima compra esperada: {proxima_compra:%d/%m/%Y}"
+                        )
+                        if cliente_data['dias_atraso'] < -TOLERANCIA:
+                            llamada = proxima_compra - pd.Timedelta(days=TOLERANCIA)
+                            st.write(f"- Llamar el {llamada:%d/%m/%Y} ({TOLERANCIA:g} días antes de su compra esperada) y luego cada {cliente_data['intervalo_mediano']:,.0f} días")
+                        elif cliente_data['segmento'] == "Activo":
+                            st.write("- Llamar hoy: está en su fecha habitual de compra")
+                        elif cliente_data['segmento'] == "Disminuido":
+                            st.write(f"- 2 veces por semana hasta recuperar su ritmo (atrasado {cliente_data['dias_atraso']:,.0f} días)")
+                        else:
+                            st.write("- 2-3 veces por semana (recuperación urgente)")
                     
                 else:
                     st.warning("No se encontró el cliente con el código especificado")
@@ -407,70 +570,67 @@ with tab1:
                 st.error(f"Error en la búsqueda: {str(e)}")
         else:
             st.info("Seleccione un código de cliente para ver detalles")
+        
+        with st.expander("📤 Exportar lista filtrada"):
+            st.caption(f"{len(filas_filtradas):,} clientes con los filtros actuales, con su producto recomendado")
+            exportar_lista_filtrada()
     else:
         st.warning("No hay clientes que coincidan con los filtros seleccionados")
 
 # ----------------------------------------------------------
 # PESTAÑA 2: ANALÍTICA
 # ----------------------------------------------------------
-with tab2:
+@st.fragment
+def seccion_analitica():
+    """Analítica comercial; cambiar el detalle del mapa sólo ejecuta esta sección"""
     st.header("📊 Analítica Comercial", help="Métricas y visualizaciones para toma de decisiones")
     
     if not filtered_df.empty:
-        # KPIs generales con formato mejorado
-        st.subheader("📈 Indicadores Clave")
-        metric_cols = st.columns(4)
-        with metric_cols[0]:
-            st.metric("Clientes totales", filtered_df["codigo_cliente"].nunique())
-        with metric_cols[1]:
-            st.metric("Compra promedio", f"RD${filtered_df['monto_total'].mean():,.2f}")
-        with metric_cols[2]:
-            # CORRECCIÓN: Días promedio con límite de 365
-            dias_promedio = filtered_df['frecuencia_compra'].mean()
-            st.metric("Frecuencia promedio", f"{dias_promedio:,.0f} días")
-        with metric_cols[3]:
-            st.metric("Valor cliente promedio", f"RD${filtered_df['valor_cliente'].mean():,.2f}")
-    
-    if not filtered_df.empty:
+        # Ventas del corte seleccionado, leídas del cubo y memorizadas por filtros
+        analitica = dataset.memorizar("analitica", filtros_activos, lambda: calcular_analitica(filtered_df, filtros_activos))
+        
         # KPIs generales con explicación
         st.subheader("📈 Indicadores Clave")
         with st.expander("ℹ️ Explicación de los KPIs"):
             st.write("""
             - **Clientes totales:** Número único de clientes activos
-            - **Compra promedio:** Valor promedio de los pedidos
+            - **Compra promedio:** Valor comprado en promedio por cada cliente con pedidos en el período
             - **Frecuencia promedio:** Días entre compras (menos es mejor)
             - **Valor cliente:** Proyección anual de gasto del cliente
             """)
         
         metric_cols = st.columns(4)
         with metric_cols[0]:
-            st.metric("Clientes totales", filtered_df["codigo_cliente"].nunique())
+            st.metric("Clientes totales", analitica["clientes"])
         with metric_cols[1]:
-            st.metric("Compra promedio", f"${filtered_df['monto_total'].mean():,.2f}")
+            st.metric("Compra promedio", f"RD${analitica['compra_promedio']:,.2f}")
         with metric_cols[2]:
-            st.metric("Frecuencia promedio", f"{filtered_df['frecuencia_compra'].mean():.0f} días")
+            st.metric("Frecuencia promedio", f"{analitica['frecuencia_promedio']:,.0f} días")
         with metric_cols[3]:
-            st.metric("Valor cliente promedio", f"${filtered_df['valor_cliente'].mean():,.2f}")
+            st.metric("Valor cliente promedio", f"RD${analitica['valor_cliente_promedio']:,.2f}")
         
         # Segmentación de clientes
         st.subheader("🔍 Segmentación de Clientes")
         with st.expander("📌 Cómo se calculan los segmentos"):
             st.write("""
-            Los clientes se clasifican automáticamente según días desde su última compra:
-            - **Activo:** <30 días
-            - **Disminuido:** 30-90 días
-            - **Inactivo:** >90 días
+            Los clientes se clasifican según su propio ritmo de compra (intervalo mediano
+            entre compras y su dispersión):
+            - **Activo:** no ha pasado su fecha esperada de compra más un margen
+            - **Disminuido:** atrasado, pero menos de 3 ciclos de compra
+            - **Inactivo:** 3 ciclos o más sin comprar
+            
+            Con menos de dos compras se usan los días desde la última: Activo <30, Disminuido 30-90, Inactivo >90.
             """)
         
         seg_cols = st.columns(2)
         with seg_cols[0]:
-            fig = px.pie(filtered_df, names="segmento", title="Distribución por Segmento")
+            fig = px.pie(analitica["clientes_segmento"], names="segmento", values="clientes", title="Distribución por Segmento")
             st.plotly_chart(fig, use_container_width=True)
         with seg_cols[1]:
             fig = px.bar(
-                filtered_df.groupby("segmento").agg({"monto_total": "sum", "codigo_cliente": "nunique"}).reset_index(),
+                analitica["ventas_segmento"],
                 x="segmento",
-                y=["monto_total", "codigo_cliente"],
+                y=["monto_total", "clientes"],
                 barmode="group",
                 title="Ventas vs Cantidad de Clientes",
                 labels={"value": "Cantidad", "variable": "Métrica"}
@@ -481,10 +641,11 @@ with tab2:
         st.subheader("📦 Análisis de Productos")
         with st.expander("ℹ️ Fuente de datos"):
             st.write("""
-            Datos calculados a partir del historial completo de pedidos.
+            Datos calculados a partir de los pedidos de la zona, segmento y mes seleccionados.
             Los productos se ponderan por cantidad vendida.
             """)
         
+        top_productos, bottom_productos = analitica["productos_extremos"]
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("**🏆 Top 5 Productos**")
@@ -504,31 +665,43 @@ with tab2:
             - Planificar campañas geolocalizadas
             """)
         
-        # Asegurar coordenadas
-        if "lat" not in filtered_df.columns or "lon" not in filtered_df.columns:
-            filtered_df["lat"] = 18.5  # RD centro
-            filtered_df["lon"] = -69.9
-        
-        fig = px.density_mapbox(
-            filtered_df,
-            lat="lat",
-            lon="lon",
-            z="monto_total",
-            radius=20,
-            zoom=7,
-            mapbox_style="open-street-map",
-            hover_name="nombre",
-            hover_data=["segmento", "valor_cliente"],
-            title="Concentración de Ventas por Zona"
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        # Celdas agregadas en el servidor; el nivel de detalle define el tamaño de la celda
+        capas = dataset.capas_espaciales
+        if capas.hay_coordenadas:
+            zoom_mapa = st.select_slider(
+                "Nivel de detalle del mapa",
+                options=list(range(ZOOM_MINIMO, ZOOM_MAXIMO + 1)),
+                value=7,
+                help="Más detalle = celdas más pequeñas y mapa más cercano"
+            )
+            capa_mapa = capas.capa(filtros_activos, zoom_mapa)
+            fig = px.density_mapbox(
+                capa_mapa.celdas,
+                lat="lat",
+                lon="lon",
+                z="monto_total",
+                radius=20,
+                zoom=capa_mapa.zoom,
+                center={"lat": capa_mapa.lat, "lon": capa_mapa.lon},
+                mapbox_style="open-street-map",
+                hover_data=["clientes", "segmento"],
+                title="Concentración de Ventas por Zona"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            sin_coordenadas = capas.sin_coordenadas(filtros_activos)
+            if sin_coordenadas:
+                st.caption(f"{sin_coordenadas:,} clientes sin coordenadas no aparecen en el mapa")
+        else:
+            st.info("Los clientes no tienen coordenadas (lat/lon); el mapa no está disponible.")
     else:
         st.warning("No hay datos que coincidan con los filtros seleccionados")
 
 # ----------------------------------------------------------
 # PESTAÑA 3: VENDEDORES
 # ----------------------------------------------------------
-with tab3:
+@st.fragment
+def seccion_vendedores():
+    """Desempeño por vendedor/zona, memorizado por filtros"""
     st.header("👤 Desempeño de Vendedores", help="Métricas y análisis por vendedor/zona")
     
     if not filtered_df.empty:
@@ -539,32 +712,13 @@ with tab3:
             - **Clientes:** Número de clientes únicos atendidos  
             - **Frecuencia:** Días promedio entre compras de sus clientes  
             - **Efectividad:** % de pedidos entregados satisfactoriamente  
+            - **Cumplimiento:** % de la cantidad pedida que se entregó (pedidos emparejados con sus entregas)  
+            - **Días entrega:** Días promedio entre el pedido y su entrega completa  
             - **Ticket promedio:** Valor promedio de cada pedido  
             """)
-        # Mostrar columnas para debug
-        # st.write("Columnas disponibles en filtered_df:", filtered_df.columns.tolist())
-        # st.write(filtered_df[["ultimo_pedido", "mes_frecuente"]].head(10))
-
-        # Convierte 'ultimo_pedido' a datetime
-        filtered_df["ultimo_pedido"] = pd.to_datetime(filtered_df["ultimo_pedido"], errors='coerce')
-
-        # Estadísticas por vendedor
-        vendedor_stats = filtered_df.groupby("zona").agg({
-            "nombre": "count",
-            "frecuencia_compra": "mean",
-            "efectividad_entrega": "mean",
-            "ticket_promedio": "mean",
-            "valor_cliente": "mean",
-            "monto_total": "sum"
-        }).reset_index()
-
-        # Redondear métricas
-        vendedor_stats["frecuencia_compra"] = vendedor_stats["frecuencia_compra"].round(0)
-        vendedor_stats["efectividad_entrega"] = vendedor_stats["efectividad_entrega"] * 100
-        vendedor_stats["efectividad_entrega"] = vendedor_stats["efectividad_entrega"].round(2)
-        vendedor_stats["ticket_promedio"] = vendedor_stats["ticket_promedio"].round(2)
-        vendedor_stats["valor_cliente"] = vendedor_stats["valor_cliente"].round(2)
-        vendedor_stats["monto_total"] = vendedor_stats["monto_total"].round(2)
+        vendedor_stats, cumplimiento_trend, cumplimiento_vendedor, vendedor_producto = dataset.memorizar(
+            "vendedores", filtros_activos, lambda: calcular_vendedores(filtered_df, filtros_activos)
+        )
 
         # Configuración de AgGrid
         gb = GridOptionsBuilder.from_dataframe(vendedor_stats)
@@ -597,11 +751,20 @@ with tab3:
                             valueFormatter='`$${value.toLocaleString("en-US", {minimumFractionDigits: 2})}`',
                             tooltipField="Ventas Totales",
                             headerTooltip="Ventas acumuladas en el período")
+        gb.configure_column("cumplimiento", 
+                            type=["numericColumn"], 
+                            tooltipField="Cumplimiento (%)",
+                            headerTooltip="Porcentaje de la cantidad pedida que fue entregada")
+        gb.configure_column("dias_entrega", 
+                            type=["numericColumn"], 
+                            tooltipField="Días entrega",
+                            headerTooltip="Días promedio entre el pedido y su entrega completa")
 
         grid_options = gb.build()
 
         AgGrid(
-            vendedor_stats,
+            # Copia: la tabla memorizada se comparte entre sesiones
+            vendedor_stats.copy(),
             gridOptions=grid_options,
             theme="alpine",  # Puedes usar: "streamlit", "alpine", "material"
             enable_enterprise_modules=False,
@@ -620,48 +783,116 @@ with tab3:
         )
         st.plotly_chart(fig, use_container_width=True)
 
-        # Gráfico de tendencia mensual de efectividad
-        st.subheader("📈 Tendencia Mensual de Efectividad de Entrega")
+        # Gráfico de tendencia mensual de cumplimiento
+        st.subheader("📈 Tendencia Mensual de Cumplimiento de Entregas")
+        with st.expander("ℹ️ Cómo se calcula"):
+            st.write("""
+            Cada línea de pedido se empareja con las entregas del mismo cliente y producto
+            en orden de fecha (la primera entrega cubre el pedido más antiguo pendiente).
+            - **Cumplimiento:** cantidad entregada / cantidad pedida, por mes del pedido
+            - **Líneas completas:** % de líneas de pedido entregadas por completo
+            - **Días de entrega:** días entre el pedido y su última entrega, en las líneas completas
+            """)
 
-        # Filtra solo registros recientes
-        fecha_minima = pd.to_datetime("2024-01-01")  # o usar fecha máxima menos 6 meses
-        df_efectividad = filtered_df[filtered_df["ultimo_pedido"] >= fecha_minima].copy()
+        if not cumplimiento_trend.empty:
+            trend_cols = st.columns(2)
+            with trend_cols[0]:
+                fig_tendencia = px.line(
+                    cumplimiento_trend,
+                    x="mes",
+                    y=["tasa_cumplimiento", "lineas_completas"],
+                    title="Cumplimiento por Mes del Pedido",
+                    labels={"mes": "Mes", "value": "Porcentaje (%)", "variable": "Métrica"},
+                    markers=True
+                )
+                fig_tendencia.update_layout(yaxis=dict(ticksuffix="%"))
+                st.plotly_chart(fig_tendencia, use_container_width=True)
+            with trend_cols[1]:
+                fig_dias = px.bar(
+                    cumplimiento_trend,
+                    x="mes",
+                    y="dias_entrega",
+                    title="Días hasta la Entrega Completa",
+                    labels={"mes": "Mes", "dias_entrega": "Días"}
+                )
+                st.plotly_chart(fig_dias, use_container_width=True)
 
-        # Agrupa y calcula
-        efectividad_trend = (
-            df_efectividad.groupby(pd.Grouper(key="ultimo_pedido", freq="M"))["efectividad_entrega"]
-            .mean()
-            .reset_index()
-        )
-        efectividad_trend["efectividad_entrega"] = (efectividad_trend["efectividad_entrega"] * 100).round(2)
-
-        # Gráfico
-        fig_tendencia = px.line(
-            efectividad_trend,
-            x="ultimo_pedido",
-            y="efectividad_entrega",
-            title="Tendencia Mensual de Efectividad de Entrega (últimos meses)",
-            labels={"ultimo_pedido": "Fecha", "efectividad_entrega": "Efectividad (%)"},
-            markers=True
-        )
-        fig_tendencia.update_layout(yaxis=dict(ticksuffix="%"))
-        st.plotly_chart(fig_tendencia, use_container_width=True)
+            st.markdown("**🚚 Cumplimiento por vendedor**")
+            st.dataframe(
+                cumplimiento_vendedor,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "vendedor": "Vendedor",
+                    "cantidad": st.column_config.NumberColumn("Cantidad pedida", format="%d"),
+                    "cantidad_cumplida": st.column_config.NumberColumn("Cantidad entregada", format="%d"),
+                    "tasa_cumplimiento": st.column_config.ProgressColumn("Cumplimiento", format="percent", min_value=0, max_value=1),
+                    "lineas_completas": st.column_config.ProgressColumn("Líneas completas", format="percent", min_value=0, max_value=1),
+                    "dias_entrega": st.column_config.NumberColumn("Días entrega", format="%.1f"),
+                }
+            )
+        else:
+            st.info("No hay pedidos en el período seleccionado")
         
         # Efectividad por producto
         st.subheader("📦 Productos por Vendedor")
-        if not pedidos.empty:
-            vendedor_producto = pedidos.groupby(["vendedor", "producto"])["cantidad"].sum().unstack().fillna(0)
-            st.dataframe(
-                vendedor_producto.style.background_gradient(cmap='YlOrRd'),
-                use_container_width=True
+        if vendedor_producto is not None and vendedor_producto.no_nulos:
+            vista_matriz = st.radio(
+                "Vista",
+                options=["Matriz", "Top por vendedor"],
+                horizontal=True,
+                help="La matriz se muestra por páginas de productos; el top lista los más vendidos de cada vendedor"
             )
+            
+            if vista_matriz == "Top por vendedor":
+                n_top = st.number_input("Productos por vendedor", min_value=1, max_value=50, value=10)
+                st.dataframe(vendedor_producto.top_por_fila(int(n_top)), hide_index=True, use_container_width=True)
+            else:
+                ordenes = {"Total vendido": ORDEN_TOTAL, "Nombre del producto": ORDEN_NOMBRE}
+                ordenes.update({f"Ventas de {vendedor}": vendedor for vendedor in vendedor_producto.filas})
+                n_productos = vendedor_producto.forma[1]
+                
+                orden_cols = st.columns(3)
+                with orden_cols[0]:
+                    orden_matriz = st.selectbox("Ordenar productos por", options=list(ordenes))
+                with orden_cols[1]:
+                    ancho_pagina = st.select_slider("Productos por página", options=[10, 25, 50, 100], value=25)
+                with orden_cols[2]:
+                    n_paginas = max(-(-n_productos // ancho_pagina), 1)
+                    pagina_matriz = st.number_input("Página", min_value=1, max_value=n_paginas, value=1)
+                
+                # Sólo la página visible se vuelve densa y se colorea
+                orden = vendedor_producto.orden_columnas(
+                    ordenes[orden_matriz], descendente=ordenes[orden_matriz] is not ORDEN_NOMBRE
+                )
+                inicio = (int(pagina_matriz) - 1) * ancho_pagina
+                st.dataframe(
+                    vendedor_producto.pagina(orden, inicio, ancho_pagina).style.background_gradient(cmap='YlOrRd'),
+                    use_container_width=True
+                )
+                st.caption(
+                    f"Productos {inicio + 1}-{min(inicio + ancho_pagina, n_productos)} de {n_productos:,} · "
+                    f"{vendedor_producto.no_nulos:,} combinaciones vendedor-producto con ventas"
+                )
+            
+            st.download_button(
+                "Descargar CSV",
+                data=dataset.memorizar("vendedor_producto_csv", filtros_activos, vendedor_producto.a_csv),
+                file_name="vendedor_producto.csv",
+                mime="text/csv",
+                help="Todas las combinaciones vendedor-producto con ventas (formato largo)"
+            )
+        else:
+            st.info("No hay ventas por producto para los filtros seleccionados")
     else:
         st.warning("No hay datos de vendedores que coincidan con los filtros seleccionados")
 
 # ----------------------------------------------------------
 # PESTAÑA 4: PROMOCIONES
 # ----------------------------------------------------------
-with tab4:
+@st.fragment
+def seccion_promociones():
+    """Generador de promociones; sus controles sólo ejecutan esta sección"""
     st.header("🔥 Estrategias de Promoción", help="Generador de promociones por segmento")
     
     # Promociones por segmento
@@ -706,7 +937,7 @@ with tab4:
     
     producto_promo = st.selectbox(
         "Producto para promoción",
-        options=pedidos['producto'].unique(),
+        options=dataset.memorizar("productos_promocion", {}, lambda: pedidos['producto'].unique()),
         help="Seleccione el producto a promocionar"
     )
     
@@ -740,6 +971,42 @@ with tab4:
             data=f"""Oferta especial: {descuento}% en {producto_promo} hasta {validez.strftime('%d/%m/%Y')}""",
             file_name="oferta_promocional.txt"
         )
+    
+    # Guiones y promociones personalizadas para toda la lista filtrada
+    st.subheader("📨 Guiones y Promociones para la Lista Filtrada")
+    st.caption(
+        f"{len(filtered_df):,} clientes con los filtros actuales. Cada fila lleva el guion de su segmento "
+        f"y el texto promocional con el {descuento}% de descuento hasta el {validez.strftime('%d/%m/%Y')}."
+    )
+    usar_recomendado = st.radio(
+        "Producto de la promoción",
+        options=[True, False],
+        format_func=lambda x: "El recomendado de cada cliente" if x else f"{producto_promo} para todos",
+        horizontal=True,
+        key="producto_guiones"
+    )
+    recomendaciones, indice_clientes, recomendador = dataset.recomendaciones, dataset.indice_clientes, dataset.recomendador
+    promocion = {
+        "descuento": descuento,
+        "validez": validez,
+        "producto_promocion": None if usar_recomendado or producto_promo is None else str(producto_promo),
+    }
+    exportar_lista_filtrada(
+        nombre="guiones",
+        parametros=promocion,
+        completar=functools.partial(anadir_guiones, indice=indice_clientes, recomendaciones=recomendaciones,
+                                    recomendador=recomendador, **promocion),
+        archivo="guiones_clientes",
+    )
+
+# Sólo se ejecuta la sección elegida
+secciones = {
+    "📞 Clientes": seccion_clientes,
+    "📊 Analítica": seccion_analitica,
+    "👤 Vendedores": seccion_vendedores,
+    "🔥 Promociones": seccion_promociones,
+}
+secciones[seccion_activa]()
 
 # Pie de página con información de fechas
 st.sidebar.markdown("---")
@@ -748,6 +1015,40 @@ st.sidebar.info(f"""
 📅 Período de datos:  
 Pedidos: {fecha_min_p} - {fecha_max_p}  
 Entregas: {fecha_min_e} - {fecha_max_e}  
-Actualizado: {datetime.now().strftime('%d/%m/%Y %H:%M')}
+Actualizado: {datetime.fromtimestamp(version_datos.descargado_en).strftime('%d/%m/%Y %H:%M')} ({formatear_antiguedad(version_datos.antiguedad())})  
+Versión: {version_datos.sha256[:8]}
 
 """)
+
+if refrescador.ultimo_error is not None:
+    st.sidebar.warning(f"No se pudo actualizar: {str(refrescador.ultimo_error)}. Se muestran los últimos datos disponibles.")
+if refrescador.refrescando:
+    st.sidebar.caption("🔄 Actualizando datos en segundo plano...")
+elif st.sidebar.button("🔄 Actualizar datos", help="Revisa si hay datos nuevos sin interrumpir a nadie"):
+    refrescador.solicitar()
+    st.sidebar.caption("🔄 Actualización solicitada; los datos nuevos aparecerán al terminar.")
+
+# Validación: filas apartadas en la carga, que siguió adelante sin ellas
+cuarentena = datos.cuarentena
+with st.sidebar.expander("🧪 Validación de datos" + (f" ({len(cuarentena):,} incidencias)" if len(cuarentena) else "")):
+    if cuarentena.empty:
+        st.caption("✅ Todas las filas pasaron la validación")
+    else:
+        descartadas = cuarentena[cuarentena["accion"] == "descartada"].drop_duplicates(["fuente", "hoja", "fila"])
+        st.write(f"Filas descartadas: {len(descartadas):,}")
+        st.dataframe(resumen_validacion(cuarentena), hide_index=True)
+        st.download_button(
+            "Descargar cuarentena (CSV)",
+            data=dataset.memorizar("cuarentena_csv", {}, lambda: cuarentena.to_csv(index=False).encode("utf-8")),
+            file_name="cuarentena.csv",
+            mime="text/csv",
+            help="Cada fila apartada o corregida con su hoja, fila del libro, columna, valor y motivo"
+        )
+
+# Memoria: lo que comparte el proceso frente a lo que añade esta sesión
+with st.sidebar.expander("🧠 Memoria"):
+    memoria = dataset.memoria_sesion(filtered_df=filtered_df)
+    st.write(f"Dataset compartido: {dataset.bytes_compartidos() / 1e6:,.1f} MB")
+    st.write(f"Esta sesión añade: {memoria['total'] / 1e6:,.2f} MB")
+    for tabla, (antes, despues) in datos.memoria.items():
+        st.caption(f"{tabla}: {antes / 1e6:,.1f} MB → {despues / 1e6:,.1f} MB tras compactar tipos")
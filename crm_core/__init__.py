@@ -0,0 +1,64 @@
+"""Núcleo de datos del dashboard de Televentas, utilizable sin Streamlit."""
+from .agregacion import ResumenClientes, agregar_por_cliente
+from .busqueda import IndiceBusqueda
+from .cadencia import ModeloCadencia
+from .cubo import CuboVentas
+from .cumplimiento import emparejar_entregas
+from .dataset import DatasetCompartido
+from .descarga import (
+    ErrorDescarga,
+    LibroDescargado,
+    Transporte,
+    TransporteRequests,
+    descargar_libro,
+)
+from .espacial import CapasEspaciales
+from .exportacion import GestorExportaciones, bloques_exportacion
+from .filtrado_colaborativo import MotorRecomendacion
+from .filtros import IndiceFiltros
+from .geocodificacion import Nomenclator, geocodificar_clientes
+from .guiones import generar_guiones
+from .historico import Fuente, HistoricoParticionado
+from .indice_clientes import IndiceClientes
+from .ingesta import HojasCRM, leer_libro
+from .llamadas import ColasLlamadas, RegistroLlamadas
+from .matriz import MatrizVentas
+from .pipeline import DatosCRM, cargar_datos, ejecutar_pipeline
+from .recomendaciones import TablasRecomendacion
+from .validacion import validar_hojas
+
+__all__ = [
+    "CapasEspaciales",
+    "ColasLlamadas",
+    "CuboVentas",
+    "DatasetCompartido",
+    "DatosCRM",
+    "ErrorDescarga",
+    "Fuente",
+    "GestorExportaciones",
+    "HistoricoParticionado",
+    "HojasCRM",
+    "IndiceBusqueda",
+    "IndiceClientes",
+    "IndiceFiltros",
+    "LibroDescargado",
+    "MatrizVentas",
+    "ModeloCadencia",
+    "MotorRecomendacion",
+    "Nomenclator",
+    "RegistroLlamadas",
+    "ResumenClientes",
+    "TablasRecomendacion",
+    "Transporte",
+    "TransporteRequests",
+    "agregar_por_cliente",
+    "bloques_exportacion",
+    "cargar_datos",
+    "descargar_libro",
+    "ejecutar_pipeline",
+    "emparejar_entregas",
+    "generar_guiones",
+    "geocodificar_clientes",
+    "leer_libro",
+    "validar_hojas",
+]
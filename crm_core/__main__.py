@@ -0,0 +1,39 @@
+"""Ejecución batch del pipeline: python -m crm_core <file_id | ruta.xlsx> [más fuentes .xlsx/.csv/file_id]
+
+Con más de una fuente se carga el histórico particionado por meses.
+"""
+import os
+import sys
+import time
+
+from .historico import Fuente, HistoricoParticionado, materializar_fuentes
+from .ingesta import leer_libro
+from .pipeline import cargar_datos, ejecutar_pipeline
+
+
+def main(argumentos):
+    if not argumentos:
+        print(__doc__)
+        return 2
+    fuente = argumentos[0]
+
+    inicio = time.perf_counter()
+    if len(argumentos) > 1:
+        fuentes = materializar_fuentes([Fuente(argumento) for argumento in argumentos])
+        datos = ejecutar_pipeline(HistoricoParticionado().cargar(fuentes))
+    elif os.path.exists(fuente):
+        datos = ejecutar_pipeline(leer_libro(fuente))
+    else:
+        datos = cargar_datos(fuente)
+    segundos = time.perf_counter() - inicio
+
+    print(f"Clientes: {len(datos.clientes):,}  Pedidos: {len(datos.pedidos):,}  Entregas: {len(datos.entregas):,}")
+    print(f"Pedidos: {datos.periodo_pedidos[0]} - {datos.periodo_pedidos[1]}")
+    print(f"Entregas: {datos.periodo_entregas[0]} - {datos.periodo_entregas[1]}")
+    print(datos.clientes["segmento"].value_counts().to_string())
+    print(f"Tiempo total: {segundos:.3f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
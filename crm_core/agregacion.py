@@ -0,0 +1,233 @@
+"""Motor vectorizado de agregación por cliente.
+
+Sustituye al `groupby(...).agg` con lambda: los códigos de cliente se
+factorizan una vez a enteros y todas las métricas se calculan con núcleos de
+NumPy (`bincount`, `maximum.at`) sobre esos enteros, sin llamar a Python por
+cliente. El coste es lineal en el número de líneas.
+
+Las métricas se obtienen de un resumen sumable (`ResumenClientes`): sumas,
+conteos, máximos y líneas por cliente y mes. Los resúmenes de partes
+distintas de las tablas (por ejemplo, meses ya cerrados y el mes en curso) se
+combinan sin volver a leer sus líneas.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+_NAT = np.iinfo(np.int64).min
+
+
+def meses_desde_epoch(fechas: pd.Series) -> np.ndarray:
+    """Mes de cada fecha como entero (meses desde 1970-01); -1 si falta.
+
+    Coincide con el ordinal de `Period('M')`; `compactacion.etiqueta_mes` da su texto.
+    """
+    valores = fechas.to_numpy(dtype="datetime64[ns]")
+    meses = valores.astype("datetime64[M]").astype(np.int64)
+    meses[np.isnat(valores)] = -1
+    return meses
+
+
+def moda_por_grupo(grupos: np.ndarray, valores: np.ndarray, n_grupos: int,
+                   pesos: Optional[np.ndarray] = None) -> np.ndarray:
+    """Valor más frecuente de cada grupo; en empate gana el mayor (el mes más reciente).
+
+    Equivale a `value_counts().index[0]`, cuyo desempate no es determinista.
+    Los valores negativos se tratan como nulos y los grupos sin valores devuelven -1.
+    Con `pesos`, cada par (grupo, valor) cuenta como ese número de apariciones.
+    """
+    validos = valores >= 0
+    grupos, valores = grupos[validos], valores[validos]
+    pesos = pesos[validos] if pesos is not None else None
+    resultado = np.full(n_grupos, -1, dtype=np.int64)
+    if len(grupos) == 0:
+        return resultado
+
+    minimo = valores.min()
+    rango = int(valores.max() - minimo) + 1
+    if n_grupos * rango <= 4 * len(valores) + 1024:
+        # Pocos valores distintos (meses): tabla densa grupo x valor con bincount
+        conteos = np.bincount(grupos * rango + (valores - minimo), weights=pesos, minlength=n_grupos * rango)
+        conteos = conteos.reshape(n_grupos, rango)[:, ::-1]
+        con_datos = conteos.max(axis=1) > 0
+        elegido = rango - 1 - conteos.argmax(axis=1)
+        resultado[con_datos] = elegido[con_datos] + minimo
+        return resultado
+
+    # Muchos valores distintos: contar sólo los pares (grupo, valor) que existen
+    pares, unicos = pd.factorize(grupos * rango + (valores - minimo), sort=False)
+    conteos = np.bincount(pares, weights=pesos)
+    grupo_par, valor_par = unicos // rango, unicos % rango + minimo
+    orden = np.lexsort((-valor_par, -conteos, grupo_par))
+    primeros = orden[np.r_[True, grupo_par[orden][1:] != grupo_par[orden][:-1]]]
+    resultado[grupo_par[primeros]] = valor_par[primeros]
+    return resultado
+
+
+def sumar_por_par(grupos: np.ndarray, valores: np.ndarray, n_grupos: int,
+                  pesos: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pares (grupo, valor) distintos y la suma de `pesos` (o el número de apariciones) de cada uno.
+
+    Con pocos valores distintos (meses) cuenta en una tabla densa con bincount;
+    si no, ordena los pares.
+    """
+    if len(grupos) == 0:
+        vacio = np.empty(0, dtype=np.int64)
+        return vacio, vacio, np.empty(0, dtype=np.float64 if pesos is not None else np.int64)
+    minimo = int(valores.min())
+    rango = int(valores.max() - minimo) + 1
+    claves = grupos.astype(np.int64) * rango + (valores - minimo)
+    if n_grupos * rango <= 4 * len(valores) + 1024:
+        sumas = np.bincount(claves, weights=pesos, minlength=n_grupos * rango)
+        pares = np.flatnonzero(sumas)
+        sumas = sumas[pares]
+    else:
+        pares, inversa = np.unique(claves, return_inverse=True)
+        sumas = np.bincount(inversa.ravel(), weights=pesos, minlength=len(pares))
+    return pares // rango, pares % rango + minimo, sumas
+
+
+@dataclass
+class ResumenClientes:
+    """Resumen sumable de pedidos y entregas por cliente.
+
+    `por_cliente`: último pedido, monto total, líneas con monto, pedidos (líneas
+    con producto), líneas de pedido y entregas de cada cliente. `por_mes`:
+    líneas de pedido de cada cliente en cada mes, para el mes más frecuente;
+    su código de cliente es categórico con las categorías de `por_cliente`, de
+    modo que sus códigos son las filas de `por_cliente`.
+    """
+
+    por_cliente: pd.DataFrame
+    por_mes: pd.DataFrame
+
+    @classmethod
+    def de_tablas(cls, pedidos: pd.DataFrame, entregas: pd.DataFrame) -> "ResumenClientes":
+        """Resumen de unas líneas de pedido y de entrega, en una sola pasada."""
+        n_pedidos = len(pedidos)
+        codigos, clientes = pd.factorize(
+            pd.concat([pedidos["codigo_cliente"], entregas["codigo_cliente"]], ignore_index=True)
+        )
+        n = len(clientes)
+        cod_pedidos, cod_entregas = codigos[:n_pedidos], codigos[n_pedidos:]
+
+        # Los códigos nulos (-1) no pertenecen a ningún cliente
+        con_cliente = cod_pedidos >= 0
+        cp = cod_pedidos[con_cliente]
+
+        # Último pedido
+        fechas = pedidos["fecha_pedido"].to_numpy(dtype="datetime64[ns]")[con_cliente]
+        ultimo = np.full(n, _NAT, dtype=np.int64)
+        np.maximum.at(ultimo, cp, fechas.astype(np.int64))
+
+        # Monto total y líneas con monto (los nulos no cuentan, igual que sum/mean de pandas)
+        monto = (pedidos["cantidad"].to_numpy(dtype=np.float64) *
+                 pedidos["precio_unitario"].to_numpy(dtype=np.float64))[con_cliente]
+        monto_valido = ~np.isnan(monto)
+
+        # Número de pedidos (líneas con producto) y de entregas
+        if "codigo_producto" in pedidos.columns:
+            con_producto = pedidos["codigo_producto"].notna().to_numpy()[con_cliente]
+            total_pedidos = np.bincount(cp[con_producto], minlength=n)
+        else:
+            total_pedidos = np.bincount(cp, minlength=n)
+
+        # Líneas por (cliente, mes)
+        meses = meses_desde_epoch(pedidos["fecha_pedido"])[con_cliente]
+        con_mes = meses >= 0
+        grupos_mes, meses_par, lineas_mes = sumar_por_par(cp[con_mes], meses[con_mes], n)
+
+        por_cliente = pd.DataFrame({
+            "codigo_cliente": clientes,
+            "ultimo_pedido": ultimo,
+            "monto_total": np.bincount(cp, weights=np.where(monto_valido, monto, 0.0), minlength=n),
+            "lineas_con_monto": np.bincount(cp[monto_valido], minlength=n),
+            "total_pedidos": total_pedidos,
+            "lineas_pedido": np.bincount(cp, minlength=n),
+            "entregas_count": np.bincount(cod_entregas[cod_entregas >= 0], minlength=n),
+        })
+        return cls(por_cliente, _por_mes(clientes, grupos_mes, meses_par, lineas_mes))
+
+    @classmethod
+    def combinar(cls, resumenes: Iterable["ResumenClientes"]) -> "ResumenClientes":
+        """Un solo resumen a partir de resúmenes de partes disjuntas de las tablas."""
+        resumenes = list(resumenes)
+        filas = pd.concat([r.por_cliente for r in resumenes], ignore_index=True)
+        codigos, clientes = pd.factorize(filas["codigo_cliente"])
+        n = len(clientes)
+        ultimo = np.full(n, _NAT, dtype=np.int64)
+        np.maximum.at(ultimo, codigos, filas["ultimo_pedido"].to_numpy(dtype=np.int64))
+        por_cliente = pd.DataFrame({"codigo_cliente": clientes, "ultimo_pedido": ultimo})
+        for columna in ("monto_total", "lineas_con_monto", "total_pedidos", "lineas_pedido", "entregas_count"):
+            suma = np.bincount(codigos, weights=filas[columna].to_numpy(dtype=np.float64), minlength=n)
+            por_cliente[columna] = suma if columna == "monto_total" else suma.astype(np.int64)
+
+        # Cada resumen traduce sus códigos de cliente (posiciones en su por_cliente) a los combinados
+        grupos = np.concatenate([
+            clientes.get_indexer(r.por_cliente["codigo_cliente"])[_posiciones_mes(r)] for r in resumenes
+        ])
+        meses = np.concatenate([r.por_mes["mes"].to_numpy(dtype=np.int64) for r in resumenes])
+        lineas = np.concatenate([r.por_mes["lineas"].to_numpy(dtype=np.float64) for r in resumenes])
+        grupos_mes, meses_par, lineas_mes = sumar_por_par(grupos, meses, n, pesos=lineas)
+        return cls(por_cliente, _por_mes(clientes, grupos_mes, meses_par, lineas_mes))
+
+    def agregados(self) -> pd.DataFrame:
+        """Métricas por cliente, como las devuelve `agregar_por_cliente`."""
+        por_cliente = self.por_cliente
+        n = len(por_cliente)
+        monto_total = por_cliente["monto_total"].to_numpy(dtype=np.float64)
+        lineas_con_monto = por_cliente["lineas_con_monto"].to_numpy()
+        total_pedidos = por_cliente["total_pedidos"].to_numpy()
+        entregas_count = por_cliente["entregas_count"].to_numpy()
+        ticket = np.divide(monto_total, lineas_con_monto, out=np.full(n, np.nan), where=lineas_con_monto > 0)
+        efectividad = np.clip(entregas_count / np.maximum(total_pedidos, 1), 0, 1)
+        mes_frecuente = moda_por_grupo(
+            _posiciones_mes(self),
+            self.por_mes["mes"].to_numpy(dtype=np.int64),
+            n,
+            pesos=self.por_mes["lineas"].to_numpy(dtype=np.float64),
+        )
+        tiene_pedidos = por_cliente["lineas_pedido"].to_numpy() > 0
+
+        return pd.DataFrame({
+            "codigo_cliente": por_cliente["codigo_cliente"].to_numpy(),
+            "ultimo_pedido": pd.to_datetime(por_cliente["ultimo_pedido"].to_numpy(dtype=np.int64).view("datetime64[ns]")),
+            "mes_frecuente": mes_frecuente.astype(np.int32),
+            "monto_total": np.where(tiene_pedidos, monto_total, np.nan),
+            "ticket_promedio": ticket,
+            "total_pedidos": np.where(tiene_pedidos, total_pedidos, np.nan),
+            "entregas_count": entregas_count,
+            "efectividad_entrega": efectividad,
+        })
+
+
+def _por_mes(clientes: pd.Index, grupos: np.ndarray, meses: np.ndarray, lineas: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({
+        "codigo_cliente": pd.Categorical.from_codes(grupos, categories=pd.Index(clientes, dtype=object)),
+        "mes": meses.astype(np.int32),
+        "lineas": lineas.astype(np.int64),
+    })
+
+
+def _posiciones_mes(resumen: ResumenClientes) -> np.ndarray:
+    """Fila de `por_cliente` de cada fila de `por_mes`."""
+    codigos = resumen.por_mes["codigo_cliente"]
+    if isinstance(codigos.dtype, pd.CategoricalDtype) and codigos.cat.categories.equals(
+        pd.Index(resumen.por_cliente["codigo_cliente"], dtype=object)
+    ):
+        return codigos.cat.codes.to_numpy(dtype=np.int64)
+    return pd.Index(resumen.por_cliente["codigo_cliente"]).get_indexer(codigos)
+
+
+def agregar_por_cliente(pedidos: pd.DataFrame, entregas: pd.DataFrame) -> pd.DataFrame:
+    """Calcula en una sola pasada todas las métricas por cliente.
+
+    Devuelve una fila por cliente presente en pedidos o entregas con:
+    último pedido, mes más frecuente (código entero, -1 si no hay), monto
+    total y medio, número de pedidos, número de entregas y efectividad.
+    """
+    return ResumenClientes.de_tablas(pedidos, entregas).agregados()
@@ -0,0 +1,674 @@
+"""Benchmarks de los núcleos del CRM con datos sintéticos.
+
+    python -m crm_core.bench agregacion [--tamanos 100000 1000000 10000000]
+    python -m crm_core.bench filtros [--tamanos 1000000]
+    python -m crm_core.bench cliente [--tamanos 1000000 10000000]
+    python -m crm_core.bench recomendador [--tamanos 100000]   (clientes, 5.000 productos)
+    python -m crm_core.bench busqueda [--tamanos 500000]
+    python -m crm_core.bench matriz [--tamanos 1000 5000]   (productos, 200 vendedores)
+    python -m crm_core.bench cumplimiento [--tamanos 1000000 10000000]
+    python -m crm_core.bench cadencia [--tamanos 1000000 10000000]
+    python -m crm_core.bench exportacion [--tamanos 500000]   (clientes; csv, xlsx y parquet)
+    python -m crm_core.bench guiones [--tamanos 500000]   (clientes)
+    python -m crm_core.bench llamadas [--tamanos 500000]   (clientes, 50 agentes)
+    python -m crm_core.bench historico [--tamanos 1000000]   (líneas en 6 CSV por año)
+    python -m crm_core.bench validacion [--tamanos 5000000]   (líneas; limpias, 0,1% erróneas y pipeline)
+    python -m crm_core.bench descarga [--tamanos 50000000]   (bytes; servidor HTTP local)
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+from .agregacion import agregar_por_cliente
+from .busqueda import IndiceBusqueda
+from .cadencia import ModeloCadencia
+from .cubo import DIMENSIONES, MEDIDAS, CuboVentas
+from .cumplimiento import TOLERANCIA, emparejar_entregas
+from .dataset import DatasetCompartido
+from .descarga import ErrorDescarga, TransporteRequests, descargar_libro
+from .exportacion import ESCRITORES, bloques_exportacion
+from .filtrado_colaborativo import MotorRecomendacion
+from .filtros import IndiceFiltros
+from .guiones import generar_guiones
+from .historico import Fuente, HistoricoParticionado, materializar_fuentes
+from .indice_clientes import IndiceClientes
+from .ingesta import HojasCRM
+from .llamadas import ColasLlamadas, RegistroLlamadas
+from .matriz import MatrizVentas
+from .pipeline import ejecutar_pipeline
+from .validacion import validar_hojas
+
+
+def pedidos_sinteticos(n_lineas: int, n_clientes: int, n_productos: int = 2000, semilla: int = 0):
+    """Genera pedidos y entregas con códigos de cliente y producto como texto."""
+    rng = np.random.default_rng(semilla)
+    codigos = np.array([f"C{i:07d}" for i in range(n_clientes)], dtype=object)
+    productos = np.array([f"P{i:05d}" for i in range(n_productos)], dtype=object)
+    inicio = np.datetime64("2022-01-01", "ns")
+    dias = rng.integers(0, 3 * 365, n_lineas).astype("timedelta64[D]")
+    pedidos = pd.DataFrame({
+        "codigo_cliente": codigos[rng.integers(0, n_clientes, n_lineas)],
+        "fecha_pedido": inicio + dias,
+        "codigo_producto": productos[rng.integers(0, n_productos, n_lineas)],
+        "cantidad": rng.integers(1, 50, n_lineas).astype(np.float64),
+        "precio_unitario": rng.uniform(10, 900, n_lineas).round(2),
+    })
+    entregados = rng.random(n_lineas) < 0.85
+    entregas = pedidos.loc[entregados, ["codigo_cliente", "codigo_producto", "cantidad"]].reset_index(drop=True)
+    entregas["fecha_entrega"] = pedidos.loc[entregados, "fecha_pedido"].to_numpy() + np.timedelta64(2, "D")
+    return pedidos, entregas
+
+
+def medir(funcion, *args, repeticiones: int = 1) -> float:
+    """Mejor tiempo (segundos) de `repeticiones` ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def _agregar_con_lambda(pedidos: pd.DataFrame, entregas: pd.DataFrame) -> pd.DataFrame:
+    """Implementación anterior (groupby con lambda por cliente), sólo como referencia."""
+    pedidos = pedidos.assign(
+        mes_pedido=pedidos["fecha_pedido"].dt.to_period("M"),
+        monto=pedidos["cantidad"] * pedidos["precio_unitario"],
+    )
+    agg = pedidos.groupby("codigo_cliente").agg({
+        "fecha_pedido": "max",
+        "mes_pedido": lambda x: x.value_counts().index[0],
+        "monto": ["sum", "mean"],
+        "codigo_producto": "count",
+    })
+    agg.columns = ["ultimo_pedido", "mes_frecuente", "monto_total", "ticket_promedio", "total_pedidos"]
+    entregas_count = entregas.groupby("codigo_cliente").size()
+    return agg.join(entregas_count.rename("entregas_count"))
+
+
+def bench_agregacion(tamanos, comparar_hasta: int = 300_000) -> None:
+    """Tiempo de `agregar_por_cliente` por tamaño; ns/línea constante indica escala lineal."""
+    print(f"{'líneas':>12} {'clientes':>9} {'vectorizado':>12} {'ns/línea':>9} {'lambda':>9}")
+    for n_lineas in tamanos:
+        n_clientes = max(n_lineas // 20, 1)
+        pedidos, entregas = pedidos_sinteticos(n_lineas, n_clientes)
+        segundos = medir(agregar_por_cliente, pedidos, entregas, repeticiones=3 if n_lineas <= 1_000_000 else 1)
+        referencia = (
+            f"{medir(_agregar_con_lambda, pedidos, entregas):8.2f}s" if n_lineas <= comparar_hasta else "-"
+        )
+        print(f"{n_lineas:>12,} {n_clientes:>9,} {segundos:>11.3f}s {segundos / n_lineas * 1e9:>9.0f} {referencia:>9}")
+        del pedidos, entregas
+
+
+def clientes_sinteticos(n_clientes: int, semilla: int = 0) -> pd.DataFrame:
+    """Tabla de clientes con las columnas de filtro ya compactadas."""
+    rng = np.random.default_rng(semilla)
+    zonas = pd.CategoricalDtype([f"Zona {i:02d}" for i in range(40)])
+    segmentos = pd.CategoricalDtype(["Activo", "Disminuido", "Inactivo"], ordered=True)
+    return pd.DataFrame({
+        "codigo_cliente": np.arange(n_clientes).astype(str),
+        "zona": pd.Categorical.from_codes(rng.integers(0, 40, n_clientes), dtype=zonas),
+        "segmento": pd.Categorical.from_codes(rng.integers(0, 3, n_clientes), dtype=segmentos),
+        "mes_frecuente": rng.integers(640, 676, n_clientes).astype(np.int32),
+        "monto_total": rng.uniform(0, 1e5, n_clientes),
+    })
+
+
+def bench_filtros(tamanos) -> None:
+    """Filtro combinado: escaneo booleano frente al índice (con y sin caché)."""
+    print(f"{'clientes':>10} {'construir':>10} {'escaneo':>10} {'índice':>10} {'caché':>10}")
+    for n_clientes in tamanos:
+        df = clientes_sinteticos(n_clientes)
+        filtros = {"zona": "Zona 07", "segmento": "Activo", "mes_frecuente": 650}
+
+        def escaneo():
+            return df[(df["zona"].astype(str) == "Zona 07") & (df["segmento"].astype(str) == "Activo")
+                      & (df["mes_frecuente"] == 650)]
+
+        inicio = time.perf_counter()
+        indice = IndiceFiltros(df, columnas=("zona", "segmento", "mes_frecuente"))
+        construir = time.perf_counter() - inicio
+        t_escaneo = medir(escaneo, repeticiones=3)
+        t_indice = medir(indice.filas, filtros, repeticiones=20)
+        indice.filtrar(filtros)
+        t_cache = medir(indice.filtrar, filtros, repeticiones=20)
+        assert len(indice.filtrar(filtros)) == len(escaneo())
+        print(f"{n_clientes:>10,} {construir * 1e3:>8.1f}ms {t_escaneo * 1e3:>8.1f}ms "
+              f"{t_indice * 1e6:>8.0f}µs {t_cache * 1e6:>8.0f}µs")
+
+
+def bench_cliente(tamanos) -> None:
+    """Vista 360 de un cliente: recorrido con cast a texto frente al índice por cliente."""
+    print(f"{'lineas':>12} {'construir':>10} {'escaneo':>10} {'índice':>10}")
+    for n_lineas in tamanos:
+        n_clientes = max(n_lineas // 15, 1)
+        pedidos, entregas = pedidos_sinteticos(n_lineas, n_clientes)
+        clientes = pd.DataFrame({"codigo_cliente": pd.unique(pedidos["codigo_cliente"])})
+        codigo = clientes["codigo_cliente"].iloc[len(clientes) // 2]
+
+        def escaneo():
+            cliente = clientes[clientes["codigo_cliente"].astype(str) == codigo].iloc[0]
+            return cliente, pedidos[pedidos["codigo_cliente"] == cliente["codigo_cliente"]]
+
+        inicio = time.perf_counter()
+        indice = IndiceClientes(clientes, pedidos, entregas)
+        construir = time.perf_counter() - inicio
+
+        def con_indice():
+            return indice.cliente(codigo), indice.pedidos(codigo)
+
+        t_escaneo = medir(escaneo, repeticiones=3)
+        t_indice = medir(con_indice, repeticiones=20)
+        assert con_indice()[1].equals(escaneo()[1])
+        print(f"{n_lineas:>12,} {construir:>9.2f}s {t_escaneo * 1e3:>8.1f}ms {t_indice * 1e6:>8.0f}µs")
+
+
+def bench_recomendador(tamanos, productos: int = 5000, lineas_por_cliente: int = 20) -> None:
+    """Construcción, consulta por cliente y actualización incremental del recomendador."""
+    print(f"{'clientes':>10} {'lineas':>12} {'construir':>10} {'consulta':>10} {'+1.000 lineas':>14}")
+    for n_clientes in tamanos:
+        n_lineas = n_clientes * lineas_por_cliente
+        pedidos, _ = pedidos_sinteticos(n_lineas + 1000, n_clientes, productos)
+        pedidos = pedidos.rename(columns={"codigo_producto": "producto"})
+        historico, nuevas = pedidos.iloc[:n_lineas], pedidos.iloc[n_lineas:]
+
+        inicio = time.perf_counter()
+        motor = MotorRecomendacion(historico)
+        construir = time.perf_counter() - inicio
+        codigos = historico["codigo_cliente"].iloc[:200].tolist()
+        inicio = time.perf_counter()
+        for codigo in codigos:
+            motor.recomendar(codigo)
+        consulta = (time.perf_counter() - inicio) / len(codigos)
+        actualizar = medir(motor.actualizar, nuevas)
+        print(f"{n_clientes:>10,} {n_lineas:>12,} {construir:>9.2f}s {consulta * 1e3:>8.2f}ms {actualizar:>13.2f}s")
+
+
+def bench_busqueda(tamanos) -> None:
+    """Búsqueda de clientes: escaneo con `str.contains` frente al índice de prefijos y trigramas."""
+    consultas = ["12345", "juan per", "8095551", "rodrigez", "calle 12"]
+    print(f"{'clientes':>10} {'construir':>10} {'escaneo':>10} {'índice':>10}")
+    for n_clientes in tamanos:
+        rng = np.random.default_rng(0)
+        nombres = np.array(["Juan", "José", "Ana", "Rosa", "Pedro", "Luisa", "Ramón", "Yolanda"])
+        apellidos = np.array(["Pérez", "Rodríguez", "Castillo", "Jiménez", "Santana", "Reyes"])
+        clientes = pd.DataFrame({
+            "codigo_cliente": np.arange(n_clientes).astype(str),
+            "nombre": pd.Series(rng.choice(nombres, n_clientes)) + " " + rng.choice(apellidos, n_clientes),
+            "telefono": pd.Series(rng.integers(8_090_000_000, 8_499_999_999, n_clientes)).astype(str),
+            "direccion": "Calle " + pd.Series(rng.integers(1, 100, n_clientes)).astype(str),
+        })
+
+        def escaneo():
+            for consulta in consultas:
+                clientes[clientes["codigo_cliente"].str.contains(consulta, case=False, regex=False)
+                         | clientes["nombre"].str.contains(consulta, case=False, regex=False)
+                         | clientes["telefono"].str.contains(consulta, regex=False)]
+
+        inicio = time.perf_counter()
+        indice = IndiceBusqueda(clientes)
+        construir = time.perf_counter() - inicio
+
+        def con_indice():
+            for consulta in consultas:
+                indice.buscar(consulta)
+
+        t_escaneo = medir(escaneo) / len(consultas)
+        t_indice = medir(con_indice, repeticiones=5) / len(consultas)
+        print(f"{n_clientes:>10,} {construir:>9.2f}s {t_escaneo * 1e3:>8.1f}ms {t_indice * 1e3:>8.1f}ms")
+
+
+def bench_matriz(tamanos, vendedores: int = 200, densidad: float = 0.2) -> None:
+    """Vista vendedor×producto: pivote denso coloreado entero frente a la matriz dispersa paginada.
+
+    Los dos primeros vendedores se llaman "total" y "nombre" para comprobar que
+    ordenar por sus ventas no se confunde con los órdenes por total o por nombre.
+    """
+    print(f"{'productos':>10} {'no nulos':>10} {'denso':>10} {'disperso':>10} {'página':>10} {'top 10':>10}")
+    for n_productos in tamanos:
+        rng = np.random.default_rng(0)
+        n = int(vendedores * n_productos * densidad)
+        pares = np.unique(rng.integers(0, vendedores, n) * n_productos + rng.integers(0, n_productos, n))
+        celdas = pd.DataFrame({
+            "vendedor": pares // n_productos,
+            "producto": pares % n_productos,
+            "cantidad": rng.integers(1, 500, len(pares)).astype(np.float64),
+        })
+        nombres_vendedor = pd.Index(["total", "nombre"] + [f"Vendedor {i}" for i in range(2, vendedores)])
+        nombres_producto = pd.Index([f"Producto {i}" for i in range(n_productos)])
+
+        def denso():
+            tabla = celdas.groupby(["vendedor", "producto"])["cantidad"].sum().unstack(fill_value=0)
+            return tabla.style.background_gradient(cmap="YlOrRd").to_html()
+
+        def disperso():
+            return MatrizVentas(celdas["vendedor"].to_numpy(), celdas["producto"].to_numpy(),
+                                celdas["cantidad"].to_numpy(), nombres_vendedor, nombres_producto)
+
+        matriz = disperso()
+        for vendedor in ("total", "nombre"):
+            ventas = matriz.pagina(matriz.orden_columnas(vendedor), 0, matriz.forma[1]).loc[vendedor].to_numpy()
+            assert (np.diff(ventas) <= 0).all(), f"ordenar por el vendedor {vendedor!r} no sigue sus ventas"
+
+        def pagina():
+            visible = matriz.pagina(matriz.orden_columnas(), 0, 25)
+            return visible.style.background_gradient(cmap="YlOrRd").to_html()
+
+        print(f"{n_productos:>10,} {len(celdas):>10,} {medir(denso):>9.2f}s {medir(disperso) * 1e3:>8.1f}ms "
+              f"{medir(pagina, repeticiones=3) * 1e3:>8.1f}ms {medir(matriz.top_por_fila, 10) * 1e3:>8.1f}ms")
+
+
+def _emparejar_linea_a_linea(pedidos: pd.DataFrame, entregas: pd.DataFrame) -> tuple[list, list]:
+    """FIFO por clave entrega a entrega y en fracciones decimales exactas, sólo como referencia.
+
+    Devuelve la cantidad cumplida (`Fraction`) y los días de entrega (NaN sin
+    entregas) de cada línea de pedido.
+    """
+    def lineas(df: pd.DataFrame, fecha: str):
+        for fila, (cliente, producto, dia, cantidad) in enumerate(
+            zip(df["codigo_cliente"], df["codigo_producto"], df[fecha], df["cantidad"])
+        ):
+            if not (pd.isna(cliente) or pd.isna(producto) or pd.isna(dia) or pd.isna(cantidad)):
+                yield (str(cliente).strip(), str(producto).strip()), dia, fila, Fraction(str(max(float(cantidad), 0.0)))
+
+    por_clave: dict[tuple, tuple[list, list]] = {}
+    for clave, dia, fila, cantidad in lineas(pedidos, "fecha_pedido"):
+        por_clave.setdefault(clave, ([], []))[0].append((dia, fila, cantidad))
+    for clave, dia, fila, cantidad in lineas(entregas, "fecha_entrega"):
+        if clave in por_clave:
+            por_clave[clave][1].append((dia, fila, cantidad))
+
+    cumplida, dias = [Fraction(0)] * len(pedidos), [np.nan] * len(pedidos)
+    for de_pedidos, de_entregas in por_clave.values():
+        de_pedidos.sort(key=lambda linea: linea[:2])
+        de_entregas.sort(key=lambda linea: linea[:2])
+        actual, pendiente = 0, de_pedidos[0][2]
+        for dia_entrega, _, entregado in de_entregas:
+            while entregado and actual < len(de_pedidos):
+                if not pendiente:
+                    actual += 1
+                    pendiente = de_pedidos[actual][2] if actual < len(de_pedidos) else 0
+                    continue
+                dia_pedido, fila, _ = de_pedidos[actual]
+                pieza = min(entregado, pendiente)
+                entregado, pendiente = entregado - pieza, pendiente - pieza
+                cumplida[fila] += pieza
+                dias[fila] = max((dia_entrega - dia_pedido).days, 0)
+    return cumplida, dias
+
+
+def _casos_fraccionarios(n_casos: int, semilla: int = 0):
+    """Pedidos y entregas pequeños de dos clientes y dos productos con cantidades no enteras."""
+    rng = np.random.default_rng(semilla)
+    cantidades = np.array([0.1, 0.2, 0.5, 1.0, 1.7, 2.3, 3.0])
+    for _ in range(n_casos):
+        tablas = []
+        for fecha, n in (("fecha_pedido", rng.integers(1, 12)), ("fecha_entrega", rng.integers(0, 14))):
+            tablas.append(pd.DataFrame({
+                "codigo_cliente": rng.choice(["C1", "C2"], n),
+                "codigo_producto": rng.choice(["P1", "P2"], n),
+                fecha: pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 40, n), unit="D"),
+                "cantidad": rng.choice(cantidades, n),
+            }))
+        yield tablas
+
+
+def bench_cumplimiento(tamanos, casos: int = 300) -> None:
+    """Emparejamiento FIFO de pedidos con entregas por cliente y producto.
+
+    Además compara `casos` emparejamientos pequeños con cantidades fraccionarias
+    con el FIFO línea a línea en fracciones exactas.
+    """
+    print(f"{'lineas':>12} {'entregas':>12} {'emparejar':>10} {'completas':>10}")
+    for n_lineas in tamanos:
+        pedidos, entregas = pedidos_sinteticos(n_lineas, max(n_lineas // 15, 1))
+        # Como tras la compactación: productos con un diccionario común a ambas tablas
+        productos = pd.CategoricalDtype(np.unique(pedidos["codigo_producto"].to_numpy(dtype=str)))
+        pedidos["codigo_producto"] = pedidos["codigo_producto"].astype(productos)
+        entregas["codigo_producto"] = entregas["codigo_producto"].astype(productos)
+        inicio = time.perf_counter()
+        resultado = emparejar_entregas(pedidos, entregas)
+        emparejar = time.perf_counter() - inicio
+        print(f"{n_lineas:>12,} {len(entregas):>12,} {emparejar:>9.2f}s {resultado['entrega_completa'].mean():>10.1%}")
+
+    distintos = 0
+    for pedidos, entregas in _casos_fraccionarios(casos):
+        resultado = emparejar_entregas(pedidos, entregas)
+        cumplida, dias = _emparejar_linea_a_linea(pedidos, entregas)
+        pedida = [Fraction(str(float(cantidad))) for cantidad in pedidos["cantidad"]]
+        completa = [q > 0 and c >= q for q, c in zip(pedida, cumplida)]
+        iguales = (
+            np.allclose(resultado["cantidad_cumplida"], np.array(cumplida, dtype=np.float64), rtol=0, atol=TOLERANCIA)
+            and np.array_equal(resultado["dias_entrega"].to_numpy(np.float64), np.array(dias), equal_nan=True)
+            and resultado["entrega_completa"].tolist() == completa
+        )
+        distintos += not iguales
+    print(f"frente al FIFO línea a línea con cantidades fraccionarias: {distintos} de {casos} casos distintos")
+
+
+def bench_cadencia(tamanos) -> None:
+    """Cadencia de compra: construcción completa frente a añadir el último mes."""
+    print(f"{'lineas':>12} {'clientes':>10} {'completa':>10} {'+1 mes':>10}")
+    for n_lineas in tamanos:
+        pedidos, _ = pedidos_sinteticos(n_lineas, max(n_lineas // 15, 1))
+        ultimo_mes = pedidos["fecha_pedido"] >= pedidos["fecha_pedido"].max().to_period("M").start_time
+        completa = medir(lambda: ModeloCadencia().actualizar(pedidos).tabla())
+        modelo = ModeloCadencia().actualizar(pedidos[~ultimo_mes])
+        inicio = time.perf_counter()
+        modelo.actualizar(pedidos[ultimo_mes]).tabla()
+        mes = time.perf_counter() - inicio
+        print(f"{n_lineas:>12,} {len(modelo.codigos):>10,} {completa:>9.2f}s {mes:>9.2f}s")
+
+
+def bench_exportacion(tamanos) -> None:
+    """Exportación por bloques de toda la tabla de clientes: tiempo y pico de memoria por formato."""
+    print(f"{'clientes':>10} {'formato':>8} {'tiempo':>9} {'pico':>10} {'archivo':>10}")
+    for n_clientes in tamanos:
+        clientes = clientes_sinteticos(n_clientes)
+        clientes["nombre"] = "Cliente " + clientes["codigo_cliente"]
+        clientes["telefono"] = (8090000000 + np.arange(n_clientes)).astype(str)
+        filas = np.arange(n_clientes)
+        recomendar = lambda bloque: pd.Series(np.full(len(bloque), "P00001", dtype=object))
+        with tempfile.TemporaryDirectory() as directorio:
+            for formato, escribir in ESCRITORES.items():
+                ruta = os.path.join(directorio, "clientes." + formato)
+                tracemalloc.start()
+                inicio = time.perf_counter()
+                escribir(bloques_exportacion(clientes, filas, recomendar), ruta)
+                segundos = time.perf_counter() - inicio
+                pico = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{n_clientes:>10,} {formato:>8} {segundos:>8.2f}s {pico / 2**20:>8.1f}MB "
+                      f"{os.path.getsize(ruta) / 2**20:>8.1f}MB")
+
+
+def bench_guiones(tamanos) -> None:
+    """Guion y texto promocional de todos los clientes, con uno y con todos los hilos."""
+    print(f"{'clientes':>10} {'1 hilo':>9} {'hilos':>6} {'paralelo':>9}")
+    for n_clientes in tamanos:
+        clientes = clientes_sinteticos(n_clientes)
+        rng = np.random.default_rng(0)
+        productos = np.array([f"P{i:05d}" for i in range(2000)] + [None], dtype=object)
+        clientes["nombre"] = "Cliente " + clientes["codigo_cliente"]
+        clientes["producto_mas_comprado"] = productos[rng.integers(0, len(productos), n_clientes)]
+        clientes["producto_recomendado"] = productos[rng.integers(0, len(productos), n_clientes)]
+        validez = pd.Timestamp("2026-12-31").date()
+        uno = medir(lambda: generar_guiones(clientes, 10, validez, hilos=1))
+        hilos = os.cpu_count() or 1
+        paralelo = medir(lambda: generar_guiones(clientes, 10, validez, hilos=hilos))
+        print(f"{n_clientes:>10,} {uno:>8.2f}s {hilos:>6} {paralelo:>8.2f}s")
+
+
+def bench_llamadas(tamanos, agentes: int = 50, llamadas: int = 20) -> None:
+    """Colas de llamadas: construcción y siguiente+registrar con varios agentes a la vez."""
+    print(f"{'clientes':>10} {'construir':>10} {'llamadas':>9} {'total':>8} {'por llamada':>12}")
+    for n_clientes in tamanos:
+        clientes = clientes_sinteticos(n_clientes)
+        rng = np.random.default_rng(0)
+        clientes["puntaje_atraso"] = np.where(rng.random(n_clientes) < 0.3, np.nan, rng.normal(0, 3, n_clientes))
+        clientes["dias_sin_compra"] = rng.integers(0, 365, n_clientes).astype(np.float64)
+        clientes["valor_cliente"] = clientes["monto_total"]
+        with tempfile.TemporaryDirectory() as directorio:
+            registro = RegistroLlamadas(os.path.join(directorio, "llamadas.sqlite3"))
+            inicio = time.perf_counter()
+            colas = ColasLlamadas(clientes, registro)
+            construir = time.perf_counter() - inicio
+            zonas = list(colas.zonas)
+
+            def agente(i):
+                for _ in range(llamadas):
+                    turno = colas.siguiente(zonas[i % len(zonas)], f"agente{i}")
+                    if turno is None:
+                        return
+                    colas.registrar(turno["codigo_cliente"], f"agente{i}", "pedido")
+
+            hilos = [threading.Thread(target=agente, args=(i,)) for i in range(agentes)]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            total = time.perf_counter() - inicio
+            n_llamadas = registro.ultimo_id()
+            print(f"{n_clientes:>10,} {construir:>9.2f}s {n_llamadas:>9,} {total:>7.2f}s {total / n_llamadas * 1e3:>10.2f}ms")
+
+
+def _comparar_historico(hojas: HojasCRM, pedidos, entregas, clientes, hoy: pd.Timestamp) -> bool:
+    """Clientes, cadencia, cubo y clientes activos por mes del histórico frente a todas las líneas de una vez."""
+    opciones = dict(mostrar_memoria=False, geocodificar=False)
+    directo = ejecutar_pipeline(HojasCRM(pedidos, entregas, clientes), hoy, **opciones)
+    desde_historico = ejecutar_pipeline(hojas, hoy, **opciones)
+    cubos = [DatasetCompartido(datos, version="").cubo for datos in (directo, desde_historico)]
+
+    def celdas(cubo: CuboVentas) -> pd.DataFrame:
+        tabla = cubo.cortar().astype({dimension: str for dimension in DIMENSIONES})
+        return tabla.groupby(list(DIMENSIONES), dropna=False)[list(MEDIDAS)].sum().sort_index()
+
+    def activos(cubo: CuboVentas, datos) -> pd.Index:
+        meses, filas = cubo.clientes_por_mes()
+        codigos = datos.clientes["codigo_cliente"].to_numpy(dtype=object)[filas]
+        return pd.MultiIndex.from_arrays([meses, codigos]).sort_values()
+
+    try:
+        pd.testing.assert_frame_equal(
+            desde_historico.clientes.set_index("codigo_cliente").sort_index(),
+            directo.clientes.set_index("codigo_cliente").sort_index(),
+            check_dtype=False, check_index_type=False, check_categorical=False,
+        )
+        pd.testing.assert_frame_equal(celdas(cubos[1]), celdas(cubos[0]))
+        return activos(cubos[1], desde_historico).equals(activos(cubos[0], directo))
+    except AssertionError:
+        return False
+
+
+def bench_historico(tamanos) -> None:
+    """Histórico particionado: carga inicial, refresco sin cambios y con sólo el año en curso cambiado.
+
+    `iguales` carga el histórico un mes antes y otra vez hoy, de modo que se
+    congela un mes más, y compara el resultado con el pipeline sobre todas las líneas.
+    """
+    print(f"{'líneas':>10} {'inicial':>9} {'sin cambios':>12} {'año actual':>11} {'completo':>9} {'iguales':>8}")
+    hoy = pd.Timestamp("2024-12-20").date()
+    for n_lineas in tamanos:
+        n_clientes = max(n_lineas // 50, 1)
+        pedidos, entregas = pedidos_sinteticos(n_lineas, n_clientes)
+        rng = np.random.default_rng(1)
+        pedidos["producto"] = pedidos["codigo_producto"]
+        pedidos["vendedor"] = np.array([f"V{i:02d}" for i in range(20)], dtype=object)[rng.integers(0, 20, n_lineas)]
+        entregas["producto"] = entregas["codigo_producto"]
+        clientes = pd.DataFrame({
+            "codigo_cliente": np.array([f"C{i:07d}" for i in range(n_clientes)], dtype=object),
+            "direccion": "Calle 1",
+            "zona": np.array([f"Zona {i:02d}" for i in range(8)], dtype=object)[rng.integers(0, 8, n_clientes)],
+        })
+        with tempfile.TemporaryDirectory() as directorio:
+            rutas = [os.path.join(directorio, "clientes.csv")]
+            clientes.to_csv(rutas[0], index=False)
+            for nombre, tabla, columna in (("pedido", pedidos, "fecha_pedido"), ("entregas", entregas, "fecha_entrega")):
+                for anio, parte in tabla.groupby(tabla[columna].dt.year):
+                    rutas.append(os.path.join(directorio, f"{nombre}_{anio}.csv"))
+                    parte.to_csv(rutas[-1], index=False)
+            fuentes = [Fuente(ruta) for ruta in rutas]
+            historico = HistoricoParticionado(os.path.join(directorio, "historico"))
+            cargar = lambda: historico.cargar(materializar_fuentes(fuentes), hoy, mostrar_tiempos=False)
+
+            inicial = medir(cargar)
+            sin_cambios = medir(cargar)
+            for ruta in rutas:
+                if ruta.endswith("_2024.csv"):
+                    os.utime(ruta)
+            anio_actual = medir(cargar)
+            hojas = cargar()
+            completo = medir(agregar_por_cliente, hojas.pedidos, hojas.entregas)
+
+            comprobacion = HistoricoParticionado(os.path.join(directorio, "comprobacion"))
+            comprobacion.cargar(materializar_fuentes(fuentes), hoy - pd.Timedelta(days=31), mostrar_tiempos=False)
+            hojas = comprobacion.cargar(materializar_fuentes(fuentes), hoy, mostrar_tiempos=False)
+            iguales = _comparar_historico(hojas, pedidos, entregas, clientes, pd.Timestamp(hoy))
+            print(f"{n_lineas:>10,} {inicial:>8.2f}s {sin_cambios:>11.2f}s {anio_actual:>10.2f}s "
+                  f"{completo:>8.2f}s {str(iguales):>8}")
+
+
+def bench_validacion(tamanos, erroneas: float = 0.001) -> None:
+    """Validación de las hojas con datos limpios y con celdas erróneas, frente al pipeline completo."""
+    print(f"{'líneas':>10} {'limpias':>9} {'erróneas':>9} {'cuarentena':>11} {'pipeline':>9} {'coste':>7}")
+    for n_lineas in tamanos:
+        n_clientes = max(n_lineas // 50, 1)
+        pedidos, entregas = pedidos_sinteticos(n_lineas, n_clientes)
+        pedidos["producto"] = pedidos["codigo_producto"]
+        entregas["producto"] = entregas["codigo_producto"]
+        clientes = pd.DataFrame({
+            "codigo_cliente": np.array([f"C{i:07d}" for i in range(n_clientes)], dtype=object),
+            "direccion": "Calle 1",
+            "zona": "Zona 01",
+        })
+        limpias = HojasCRM(pedidos, entregas, clientes)
+
+        # Fechas y cantidades como llegan de un libro con celdas de texto sueltas: sin tipar
+        rng = np.random.default_rng(0)
+        sucias = pedidos.assign(
+            fecha_pedido=pedidos["fecha_pedido"].dt.strftime("%Y-%m-%d").astype(object),
+            cantidad=pedidos["cantidad"].astype(object),
+        )
+        sucias.loc[rng.random(n_lineas) < erroneas, "fecha_pedido"] = "pendiente"
+        sucias.loc[rng.random(n_lineas) < erroneas, "cantidad"] = "sin dato"
+        con_errores = HojasCRM(sucias, entregas, clientes)
+
+        limpio = medir(validar_hojas, limpias)
+        erroneo = medir(validar_hojas, con_errores)
+        cuarentena = len(validar_hojas(con_errores).cuarentena)
+        pipeline = medir(lambda: ejecutar_pipeline(limpias, mostrar_memoria=False, geocodificar=False))
+        print(f"{n_lineas:>10,} {limpio:>8.3f}s {erroneo:>8.2f}s {cuarentena:>11,} {pipeline:>8.2f}s "
+              f"{limpio / pipeline:>6.1%}")
+
+
+class _ExportacionLocal(http.server.BaseHTTPRequestHandler):
+    """Sustituto local del export de Google Sheets: ETag, 304 y fallos programados.
+
+    El servidor lleva `contenido`, `etag`, `fallos` (estados a devolver antes de
+    responder bien) y `peticiones`.
+    """
+
+    def do_GET(self):
+        servidor = self.server
+        servidor.peticiones += 1
+        if servidor.fallos:
+            self.send_response(servidor.fallos.pop(0))
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == servidor.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", servidor.etag)
+        self.send_header("Content-Length", str(len(servidor.contenido)))
+        self.end_headers()
+        vista = memoryview(servidor.contenido)
+        for inicio in range(0, len(vista), 1 << 20):
+            self.wfile.write(vista[inicio:inicio + (1 << 20)])
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_descarga(tamanos, transporte=None, reintentos: int = 2) -> None:
+    """Descarga contra un servidor HTTP local: 200 por bloques, 304, reintentos y copia obsoleta.
+
+    Comprueba además que un fallo definitivo (404) no se reintenta y devuelve la
+    copia local, que sin copia se propaga `ErrorDescarga` y que una versión nueva
+    sustituye al cuerpo anterior sin dejarlo en disco.
+    """
+    transporte = transporte or TransporteRequests()
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ExportacionLocal)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/export"
+    print(f"{'bytes':>12} {'200':>8} {'pico':>9} {'304':>8} {'503→obsoleta':>13} {'404→obsoleta':>13}")
+    try:
+        for n_bytes in tamanos:
+            servidor.contenido, servidor.etag, servidor.fallos, servidor.peticiones = os.urandom(n_bytes), '"v1"', [], 0
+            with tempfile.TemporaryDirectory() as directorio:
+                descargar = lambda: descargar_libro("libro", directorio, transporte, url=url, reintentos=reintentos)
+
+                tracemalloc.start()
+                inicio = time.perf_counter()
+                libro = descargar()
+                completa = time.perf_counter() - inicio
+                pico = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                assert libro.cambiado and libro.sha256 == hashlib.sha256(servidor.contenido).hexdigest()
+
+                inicio = time.perf_counter()
+                libro = descargar()
+                revalidacion = time.perf_counter() - inicio
+                assert not libro.cambiado and not libro.obsoleto
+
+                servidor.fallos = [503] * (reintentos + 1)
+                inicio = time.perf_counter()
+                libro = descargar()
+                obsoleta = time.perf_counter() - inicio
+                assert libro.obsoleto and not servidor.fallos
+
+                servidor.fallos, antes = [404], servidor.peticiones
+                libro = descargar()
+                assert libro.obsoleto and servidor.peticiones == antes + 1
+
+                servidor.contenido, servidor.etag, anterior = os.urandom(n_bytes), '"v2"', libro.ruta
+                libro = descargar()
+                assert libro.cambiado and libro.ruta != anterior and not os.path.exists(anterior)
+                assert sorted(os.listdir(directorio)) == sorted(["libro.json", os.path.basename(libro.ruta)])
+
+            with tempfile.TemporaryDirectory() as directorio:
+                servidor.fallos = [404]
+                try:
+                    descargar_libro("libro", directorio, transporte, url=url, reintentos=reintentos)
+                    raise AssertionError("sin copia local, un 404 debe propagar ErrorDescarga")
+                except ErrorDescarga:
+                    pass
+            print(f"{n_bytes:>12,} {completa:>7.2f}s {pico / 2**20:>7.1f}MB {revalidacion * 1e3:>6.1f}ms "
+                  f"{obsoleta:>12.2f}s {'ok':>13}")
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+BENCHMARKS = {
+    "cliente": bench_cliente,
+    "agregacion": bench_agregacion,
+    "busqueda": bench_busqueda,
+    "cadencia": bench_cadencia,
+    "cumplimiento": bench_cumplimiento,
+    "descarga": bench_descarga,
+    "exportacion": bench_exportacion,
+    "filtros": bench_filtros,
+    "guiones": bench_guiones,
+    "historico": bench_historico,
+    "llamadas": bench_llamadas,
+    "matriz": bench_matriz,
+    "recomendador": bench_recomendador,
+    "validacion": bench_validacion,
+}
+
+
+def main(argumentos=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    opciones = parser.parse_args(argumentos)
+    BENCHMARKS[opciones.benchmark](opciones.tamanos)
+
+
+if __name__ == "__main__":
+    main()
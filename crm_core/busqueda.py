@@ -0,0 +1,192 @@
+"""Búsqueda incremental de clientes (typeahead) por código, nombre, teléfono y dirección.
+
+Se construye una vez por versión del dataset:
+- prefijos: arrays ordenados de códigos, teléfonos (sólo dígitos) y palabras
+  de nombre y dirección, consultados con búsqueda binaria;
+- trigramas: listas de filas por trigrama de código, nombre y teléfono, para
+  coincidencias parciales o con errores de escritura;
+- el orden natural de los códigos (numéricos por valor, luego el resto).
+
+Cada consulta combina las fuentes con un puntaje por fila y devuelve las `k`
+mejores, opcionalmente restringidas a las filas que dejan los filtros.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Puntaje de cada tipo de coincidencia; los de palabras y trigramas se escalan por la fracción encontrada
+PUNTAJES = {
+    "codigo_exacto": 1.0,
+    "codigo_prefijo": 0.9,
+    "telefono_prefijo": 0.85,
+    "nombre_palabra": 0.8,
+    "direccion_palabra": 0.6,
+    "trigramas": 0.7,
+}
+MINIMO_TELEFONO = 4
+# Opciones que se ofrecen en el selector de clientes
+RESULTADOS_BUSQUEDA = 50
+# Texto indexado por trigramas (se trunca a este ancho), filas por bloque y trigramas usados por consulta
+ANCHO_TRIGRAMAS = 64
+BLOQUE_TRIGRAMAS = 50_000
+TRIGRAMAS_CONSULTA = 8
+
+
+def normalizar_texto(serie: pd.Series) -> pd.Series:
+    """Minúsculas, sin acentos y sólo letras y dígitos separados por un espacio."""
+    return (
+        serie.fillna("").astype(str).str.lower()
+        .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+    )
+
+
+def _columna(clientes: pd.DataFrame, nombre: str) -> pd.Series:
+    """Columna con índice posicional; vacía si no existe."""
+    if nombre in clientes.columns:
+        return clientes[nombre].reset_index(drop=True)
+    return pd.Series([""] * len(clientes))
+
+
+def _ordenados(valores: np.ndarray, filas: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    orden = np.argsort(valores, kind="stable")
+    return valores[orden], filas[orden].astype(np.int32)
+
+
+def _rango_prefijo(ordenados: np.ndarray, prefijo: str) -> slice:
+    inicio = np.searchsorted(ordenados, prefijo, side="left")
+    fin = np.searchsorted(ordenados, prefijo + "\uffff", side="left")
+    return slice(int(inicio), int(fin))
+
+
+def _trigramas(textos: pd.Series) -> np.ndarray:
+    """Código entero de cada trigrama de cada texto (texto×posición); 0 donde no hay trigrama.
+
+    Los textos ya normalizados son ASCII: cada trigrama son tres bytes.
+    """
+    bytes_ = (" " + textos + " ").to_numpy(dtype=object).astype(f"S{ANCHO_TRIGRAMAS}")
+    u = bytes_.view(np.uint8).reshape(len(textos), -1).astype(np.int32)
+    codigos = (u[:, :-2] << 16) | (u[:, 1:-1] << 8) | u[:, 2:]
+    codigos[u[:, 2:] == 0] = 0
+    return codigos
+
+
+def orden_natural(codigos: pd.Series) -> np.ndarray:
+    """Posiciones de los códigos en orden natural: primero los numéricos por valor, luego texto."""
+    texto = codigos.fillna("").astype(str).str.strip()
+    numeros = pd.to_numeric(texto, errors="coerce").to_numpy(dtype=np.float64)
+    es_texto = np.isnan(numeros)
+    return np.lexsort((texto.str.lower().to_numpy(dtype=object), np.where(es_texto, 0, numeros), es_texto))
+
+
+class IndiceBusqueda:
+    """Prefijos, trigramas y orden natural de los clientes de una versión."""
+
+    def __init__(self, clientes: pd.DataFrame):
+        self._n = len(clientes)
+        filas = np.arange(self._n, dtype=np.int32)
+        codigos = normalizar_texto(_columna(clientes, "codigo_cliente"))
+        telefonos = _columna(clientes, "telefono").fillna("").astype(str).str.replace(r"\D+", "", regex=True)
+        nombres = normalizar_texto(_columna(clientes, "nombre"))
+        direcciones = normalizar_texto(_columna(clientes, "direccion"))
+
+        self._codigos, self._filas_codigo = _ordenados(codigos.to_numpy(dtype=object), filas)
+        self._telefonos, self._filas_telefono = _ordenados(telefonos.to_numpy(dtype=object), filas)
+        self._palabras = {}
+        for campo, textos in (("nombre_palabra", nombres), ("direccion_palabra", direcciones)):
+            palabras = textos.str.split().explode()
+            palabras = palabras[palabras.notna() & (palabras != "")]
+            self._palabras[campo] = _ordenados(palabras.to_numpy(dtype=object), palabras.index.to_numpy())
+
+        # Trigramas de código, nombre y teléfono; la dirección se busca por palabras
+        self._indexar_trigramas(codigos + " " + nombres + " " + telefonos)
+        self._orden_natural = orden_natural(_columna(clientes, "codigo_cliente"))
+
+    def _indexar_trigramas(self, textos: pd.Series) -> None:
+        """Listas de filas por trigrama, construidas por bloques con aritmética de bytes."""
+        valores, filas = [np.empty(0, dtype=np.int32)], [np.empty(0, dtype=np.int32)]
+        for inicio in range(0, len(textos), BLOQUE_TRIGRAMAS):
+            codigos = _trigramas(textos.iloc[inicio:inicio + BLOQUE_TRIGRAMAS])
+            # Un trigrama repetido en el mismo texto cuenta una vez
+            codigos.sort(axis=1)
+            codigos[:, 1:][codigos[:, 1:] == codigos[:, :-1]] = 0
+            fila, _ = np.nonzero(codigos)
+            valores.append(codigos[codigos != 0])
+            filas.append((fila + inicio).astype(np.int32))
+        valores = np.concatenate(valores)
+        orden = np.argsort(valores, kind="stable")
+        self._trigramas, inicios = np.unique(valores[orden], return_index=True)
+        self._trigrama_offsets = np.append(inicios, len(valores))
+        self._trigrama_filas = np.concatenate(filas)[orden]
+
+    def _filas_trigrama(self, codigo: int) -> np.ndarray:
+        posicion = np.searchsorted(self._trigramas, codigo)
+        if posicion == len(self._trigramas) or self._trigramas[posicion] != codigo:
+            return self._trigrama_filas[:0]
+        return self._trigrama_filas[self._trigrama_offsets[posicion]:self._trigrama_offsets[posicion + 1]]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def filas_en_orden(self, filas: Optional[np.ndarray] = None, limite: Optional[int] = None) -> np.ndarray:
+        """Filas en el orden natural de sus códigos, sólo de `filas` si se indica."""
+        orden = self._orden_natural
+        if filas is not None:
+            permitidas = np.zeros(self._n, dtype=bool)
+            permitidas[filas] = True
+            orden = orden[permitidas[orden]]
+        return orden[:limite]
+
+    def buscar(self, consulta: str, k: int = 20, filas: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Las `k` mejores filas para la consulta (columnas fila, puntaje), de mayor a menor."""
+        texto = normalizar_texto(pd.Series([consulta])).iloc[0]
+        if not texto:
+            return pd.DataFrame({"fila": np.empty(0, dtype=np.int32), "puntaje": np.empty(0)})
+        puntajes = np.zeros(self._n, dtype=np.float32)
+
+        rango = _rango_prefijo(self._codigos, texto)
+        coincidentes = self._filas_codigo[rango]
+        self._subir(puntajes, coincidentes, PUNTAJES["codigo_prefijo"])
+        self._subir(puntajes, coincidentes[self._codigos[rango] == texto], PUNTAJES["codigo_exacto"])
+
+        # Un teléfono se puede escribir con espacios o guiones: sólo cuentan los dígitos
+        digitos = texto.replace(" ", "")
+        if len(digitos) >= MINIMO_TELEFONO and digitos.isdigit():
+            rango = _rango_prefijo(self._telefonos, digitos)
+            self._subir(puntajes, self._filas_telefono[rango], PUNTAJES["telefono_prefijo"])
+
+        # Fracción de las palabras de la consulta que son prefijo de alguna palabra del campo
+        palabras = texto.split()
+        for campo, (ordenadas, filas_palabra) in self._palabras.items():
+            aciertos = np.zeros(self._n, dtype=np.float32)
+            for palabra in palabras:
+                presentes = np.zeros(self._n, dtype=bool)
+                presentes[filas_palabra[_rango_prefijo(ordenadas, palabra)]] = True
+                aciertos += presentes
+            np.maximum(puntajes, aciertos * (PUNTAJES[campo] / len(palabras)), out=puntajes)
+
+        # Fracción de los trigramas más raros de la consulta presentes en el cliente
+        if len(texto) >= 3:
+            codigos = np.unique(_trigramas(pd.Series([texto]))[0])
+            listas = sorted((self._filas_trigrama(c) for c in codigos[codigos != 0]), key=len)
+            listas = listas[:TRIGRAMAS_CONSULTA]
+            if listas:
+                conteos = np.bincount(np.concatenate(listas), minlength=self._n)
+                np.maximum(puntajes, conteos * np.float32(PUNTAJES["trigramas"] / len(listas)), out=puntajes)
+
+        if filas is not None:
+            permitidas = np.zeros(self._n, dtype=bool)
+            permitidas[filas] = True
+            puntajes[~permitidas] = 0
+        candidatas = np.flatnonzero(puntajes > 0)
+        if len(candidatas) > k:
+            candidatas = candidatas[np.argpartition(-puntajes[candidatas], k - 1)[:k]]
+        candidatas = candidatas[np.lexsort((candidatas, -puntajes[candidatas]))]
+        return pd.DataFrame({"fila": candidatas.astype(np.int32), "puntaje": puntajes[candidatas].round(3)})
+
+    @staticmethod
+    def _subir(puntajes: np.ndarray, filas: np.ndarray, puntaje: float) -> None:
+        puntajes[filas] = np.maximum(puntajes[filas], puntaje)
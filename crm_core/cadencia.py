@@ -0,0 +1,192 @@
+"""Modelo de cadencia de compra por cliente.
+
+Una compra es un día con pedidos del cliente (varias líneas el mismo día
+cuentan una vez). Con los días de compra ordenados por cliente, la diferencia
+entre días consecutivos da los intervalos entre compras; de ellos salen la
+mediana (la frecuencia real del cliente) y la dispersión (desviación absoluta
+mediana). La próxima compra esperada es la última más la mediana, y el atraso
+se mide en escalas de dispersión respecto a esa fecha.
+
+Todo se calcula con `lexsort`, `diff` y offsets por grupo, sin bucles por
+cliente. `actualizar` incorpora pedidos nuevos (p. ej. un mes recién cerrado)
+y sólo recalcula los clientes que tienen días de compra nuevos; el histórico
+particionado guarda el modelo de los meses congelados con `estado` y lo
+reconstruye con `desde_estado`.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Un evento se codifica como clave * _ESCALA + día (días desde 1970, desplazados para fechas antiguas)
+_ESCALA = 1 << 20
+_DESPLAZAMIENTO = 1 << 19
+
+# Margen tras la fecha esperada, en escalas de dispersión, antes de considerar al cliente atrasado
+TOLERANCIA = 2.0
+# Ciclos (intervalo esperado más margen) sin comprar para pasar a Inactivo
+CICLOS_INACTIVO = 3
+# Escala mínima de dispersión: días y fracción del intervalo mediano
+ESCALA_MINIMA_DIAS = 3.0
+ESCALA_MINIMA_FRACCION = 0.1
+
+COLUMNAS = (
+    "compras", "intervalo_mediano", "dispersion_intervalo",
+    "proxima_compra", "dias_atraso", "puntaje_atraso", "limite_activo",
+)
+
+
+def _normalizar_codigos(codigos: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Códigos enteros y valores distintos (sin espacios sobrantes) de una columna de clientes."""
+    crudos, valores = pd.factorize(codigos)
+    normalizados, unicos = pd.factorize(pd.Series(valores, dtype=object).astype(str).str.strip())
+    return np.where(crudos >= 0, normalizados[np.maximum(crudos, 0)], -1), pd.Index(unicos)
+
+
+def _mediana_por_grupo(grupos: np.ndarray, valores: np.ndarray, n_grupos: int) -> np.ndarray:
+    """Mediana de `valores` por grupo (NaN en grupos vacíos)."""
+    orden = np.lexsort((valores, grupos))
+    ordenados = valores[orden]
+    conteos = np.bincount(grupos, minlength=n_grupos)
+    inicios = np.cumsum(conteos) - conteos
+    mediana = np.full(n_grupos, np.nan)
+    con_datos = conteos > 0
+    bajo = inicios[con_datos] + (conteos[con_datos] - 1) // 2
+    alto = inicios[con_datos] + conteos[con_datos] // 2
+    mediana[con_datos] = (ordenados[bajo] + ordenados[alto]) / 2
+    return mediana
+
+
+def estadisticas_intervalos(claves: np.ndarray, dias: np.ndarray, n_claves: int) -> dict[str, np.ndarray]:
+    """Compras, última compra, mediana y dispersión de los intervalos por clave.
+
+    `claves` y `dias` deben venir ordenados por (clave, día) y sin pares repetidos.
+    """
+    compras = np.bincount(claves, minlength=n_claves)
+    ultima = np.full(n_claves, np.iinfo(np.int64).min, dtype=np.int64)
+    if len(claves):
+        fin = np.r_[claves[1:] != claves[:-1], True]
+        ultima[claves[fin]] = dias[fin]
+    mismo = claves[1:] == claves[:-1]
+    grupos, intervalos = claves[1:][mismo], np.diff(dias)[mismo].astype(np.float64)
+    mediana = _mediana_por_grupo(grupos, intervalos, n_claves)
+    desvio = _mediana_por_grupo(grupos, np.abs(intervalos - mediana[grupos]), n_claves)
+    return {"compras": compras, "ultima": ultima, "mediana": mediana, "dispersion": desvio}
+
+
+class ModeloCadencia:
+    """Días de compra por cliente y estadísticas de sus intervalos, actualizables por lotes."""
+
+    def __init__(self):
+        self.codigos = pd.Index([], dtype=object)
+        self._eventos = np.empty(0, dtype=np.int64)
+        self._compras = np.empty(0, dtype=np.int64)
+        self._ultima = np.empty(0, dtype=np.int64)
+        self._mediana = np.empty(0, dtype=np.float64)
+        self._dispersion = np.empty(0, dtype=np.float64)
+
+    def estado(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Tablas (por cliente, eventos) con las que `desde_estado` reconstruye el modelo."""
+        por_cliente = pd.DataFrame({
+            "codigo_cliente": self.codigos.to_numpy(dtype=object),
+            "compras": self._compras,
+            "ultima": self._ultima,
+            "mediana": self._mediana,
+            "dispersion": self._dispersion,
+        })
+        return por_cliente, pd.DataFrame({"evento": self._eventos})
+
+    @classmethod
+    def desde_estado(cls, por_cliente: pd.DataFrame, eventos: pd.DataFrame) -> "ModeloCadencia":
+        # Copias: `actualizar` escribe en estos arrays y los de Parquet son de sólo lectura
+        modelo = cls()
+        modelo.codigos = pd.Index(por_cliente["codigo_cliente"].to_numpy(dtype=object), dtype=object)
+        modelo._eventos = eventos["evento"].to_numpy(dtype=np.int64, copy=True)
+        modelo._compras = por_cliente["compras"].to_numpy(dtype=np.int64, copy=True)
+        modelo._ultima = por_cliente["ultima"].to_numpy(dtype=np.int64, copy=True)
+        modelo._mediana = por_cliente["mediana"].to_numpy(dtype=np.float64, copy=True)
+        modelo._dispersion = por_cliente["dispersion"].to_numpy(dtype=np.float64, copy=True)
+        return modelo
+
+    def _claves(self, codigos: pd.Series) -> np.ndarray:
+        """Clave de cada código, dando de alta los clientes nuevos."""
+        codigos, unicos = _normalizar_codigos(codigos)
+        posiciones = self.codigos.get_indexer(unicos)
+        nuevos = unicos[posiciones < 0]
+        if len(nuevos):
+            self.codigos = self.codigos.append(nuevos)
+            posiciones = self.codigos.get_indexer(unicos)
+            extra = len(nuevos)
+            self._compras = np.r_[self._compras, np.zeros(extra, dtype=np.int64)]
+            self._ultima = np.r_[self._ultima, np.full(extra, np.iinfo(np.int64).min, dtype=np.int64)]
+            self._mediana = np.r_[self._mediana, np.full(extra, np.nan)]
+            self._dispersion = np.r_[self._dispersion, np.full(extra, np.nan)]
+        return np.where(codigos >= 0, posiciones[np.maximum(codigos, 0)], -1)
+
+    def actualizar(self, pedidos: pd.DataFrame) -> "ModeloCadencia":
+        """Añade los días de compra de `pedidos` y recalcula sólo los clientes afectados."""
+        if pedidos.empty:
+            return self
+        claves = self._claves(pedidos["codigo_cliente"])
+        fechas = pedidos["fecha_pedido"].to_numpy(dtype="datetime64[ns]")
+        validos = (claves >= 0) & ~np.isnat(fechas)
+        dias = fechas[validos].astype("datetime64[D]").astype(np.int64) + _DESPLAZAMIENTO
+        eventos = np.unique(claves[validos] * _ESCALA + dias)
+        # Los eventos guardados están ordenados: pertenencia e inserción por búsqueda binaria
+        posiciones = np.searchsorted(self._eventos, eventos)
+        existentes = posiciones < len(self._eventos)
+        existentes[existentes] = self._eventos[posiciones[existentes]] == eventos[existentes]
+        nuevos = eventos[~existentes]
+        if not len(nuevos):
+            return self
+        self._eventos = np.insert(self._eventos, posiciones[~existentes], nuevos)
+
+        # Eventos completos de los clientes afectados: un rango contiguo por cliente
+        afectados = np.unique(nuevos // _ESCALA)
+        inicios = np.searchsorted(self._eventos, afectados * _ESCALA)
+        fines = np.searchsorted(self._eventos, (afectados + 1) * _ESCALA)
+        largos = fines - inicios
+        posiciones = np.repeat(inicios - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+        eventos = self._eventos[posiciones]
+        grupos = np.repeat(np.arange(len(afectados)), largos)
+        estadisticas = estadisticas_intervalos(grupos, eventos % _ESCALA - _DESPLAZAMIENTO, len(afectados))
+
+        self._compras[afectados] = estadisticas["compras"]
+        self._ultima[afectados] = estadisticas["ultima"]
+        self._mediana[afectados] = estadisticas["mediana"]
+        self._dispersion[afectados] = estadisticas["dispersion"]
+        return self
+
+    def tabla(self, hoy: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Cadencia de cada cliente a la fecha `hoy`, indexada por código.
+
+        `dias_atraso` (hoy menos la próxima compra esperada) es negativo si aún
+        no toca comprar; `puntaje_atraso` es ese atraso en escalas de dispersión.
+        Los clientes con menos de dos días de compra no tienen cadencia (NaN).
+        """
+        hoy = hoy if hoy is not None else pd.Timestamp.now().normalize()
+        dia_hoy = np.datetime64(hoy, "D").astype(np.int64)
+        con_compras = self._compras > 0
+        ultima = np.where(con_compras, self._ultima, 0)
+        escala = np.maximum(
+            np.fmax(self._dispersion, 0), np.maximum(ESCALA_MINIMA_DIAS, ESCALA_MINIMA_FRACCION * self._mediana)
+        )
+        proxima = ultima + self._mediana
+        dias_atraso = dia_hoy - proxima
+        proxima_compra = pd.to_datetime(np.where(np.isnan(proxima), np.nan, proxima), unit="D")
+        return pd.DataFrame({
+            "compras": self._compras.astype(np.int32),
+            "intervalo_mediano": self._mediana.astype(np.float32),
+            "dispersion_intervalo": self._dispersion.astype(np.float32),
+            "proxima_compra": proxima_compra,
+            "dias_atraso": dias_atraso.astype(np.float32),
+            "puntaje_atraso": (dias_atraso / escala).astype(np.float32),
+            "limite_activo": (self._mediana + TOLERANCIA * escala).astype(np.float32),
+        }, index=pd.Index(self.codigos, name="codigo_cliente"))
+
+
+def cadencia_clientes(pedidos: pd.DataFrame, hoy: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Cadencia de todos los clientes con pedidos (un solo lote)."""
+    return ModeloCadencia().actualizar(pedidos).tabla(hoy)
@@ -0,0 +1,98 @@
+"""Compactación de tipos de las tablas tras la ingesta.
+
+Las columnas de texto con pocos valores distintos pasan a `category` con un
+diccionario común a todas las tablas (el mismo producto tiene el mismo código
+en pedidos y entregas), los enteros se reducen al menor tipo que los contiene
+y los meses se guardan como enteros (meses desde 1970-01, -1 si falta). Las
+comparaciones y agrupaciones sobre estas columnas operan así sobre códigos
+enteros en lugar de cadenas.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# Columna -> diccionario compartido al que pertenece
+CATEGORICAS = {
+    "producto": "producto",
+    "codigo_producto": "codigo_producto",
+    "vendedor": "vendedor",
+    "zona": "zona",
+    "tipo_negocio": "tipo_negocio",
+    "quien_atiende": "quien_atiende",
+}
+ENTERAS = ("cantidad",)
+
+
+def etiqueta_mes(codigo: int) -> str:
+    """'AAAA-MM' de un código de mes; cadena vacía si falta."""
+    if codigo < 0:
+        return ""
+    return f"{1970 + codigo // 12:04d}-{codigo % 12 + 1:02d}"
+
+
+def codigo_mes(etiqueta: str) -> int:
+    """Código de mes de una etiqueta 'AAAA-MM'."""
+    anio, mes = etiqueta.split("-")
+    return (int(anio) - 1970) * 12 + int(mes) - 1
+
+
+def codigos_y_valores(serie: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Códigos enteros (int32, -1 si falta) y valores de una columna, categórica o no."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy().astype(np.int32), serie.cat.categories
+    codigos, valores = pd.factorize(serie)
+    return codigos.astype(np.int32), pd.Index(valores)
+
+
+def _diccionarios(tablas: dict[str, pd.DataFrame]) -> dict[str, pd.CategoricalDtype]:
+    """Un CategoricalDtype por grupo con la unión ordenada de valores de todas las tablas."""
+    valores: dict[str, list] = {}
+    for df in tablas.values():
+        for columna, grupo in CATEGORICAS.items():
+            if columna in df.columns:
+                valores.setdefault(grupo, []).append(pd.unique(df[columna].dropna()))
+    return {
+        grupo: pd.CategoricalDtype(np.sort(pd.unique(np.concatenate(partes)).astype(str)))
+        for grupo, partes in valores.items()
+    }
+
+
+def _reducir_enteros(serie: pd.Series) -> pd.Series:
+    """Convierte a int32 si todos los valores son enteros, caben y no hay nulos.
+
+    No se baja de int32: las restas y productos entre cantidades desbordarían int8/int16.
+    """
+    valores = serie.to_numpy()
+    if serie.isna().any() or not np.array_equal(valores, np.round(valores)):
+        return serie
+    limites = np.iinfo(np.int32)
+    if len(valores) and (valores.min() < limites.min or valores.max() > limites.max):
+        return serie
+    return serie.astype(np.int32)
+
+
+def compactar_tablas(**tablas: pd.DataFrame) -> tuple[dict[str, pd.DataFrame], dict[str, tuple[int, int]]]:
+    """Compacta cada tabla; devuelve las tablas y la memoria (antes, después) de cada una."""
+    diccionarios = _diccionarios(tablas)
+    compactas, informe = {}, {}
+    for nombre, df in tablas.items():
+        antes = int(df.memory_usage(deep=True).sum())
+        df = df.copy()
+        for columna, grupo in CATEGORICAS.items():
+            if columna in df.columns:
+                df[columna] = df[columna].astype(str).where(df[columna].notna()).astype(diccionarios[grupo])
+        for columna in ENTERAS:
+            if columna in df.columns:
+                df[columna] = _reducir_enteros(df[columna])
+        compactas[nombre] = df
+        informe[nombre] = (antes, int(df.memory_usage(deep=True).sum()))
+    return compactas, informe
+
+
+def resumen_memoria(informe: dict[str, tuple[int, int]]) -> str:
+    lineas = [
+        f"  {nombre:<10} {antes / 1e6:9.2f} MB -> {despues / 1e6:8.2f} MB  ({1 - despues / max(antes, 1):.0%} menos)"
+        for nombre, (antes, despues) in informe.items()
+    ]
+    return "[compactación]\n" + "\n".join(lineas)
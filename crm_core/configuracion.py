@@ -0,0 +1,36 @@
+"""Parámetros de ejecución del CRM, configurables por variables de entorno."""
+import os
+
+# Directorio donde se guardan la copia local del libro y sus validadores
+DIRECTORIO_CACHE = os.environ.get(
+    "CRM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "crm_televentas")
+)
+
+# Segundos entre revalidaciones del libro contra Google Drive
+INTERVALO_REVALIDACION = int(os.environ.get("CRM_INTERVALO_REVALIDACION", "300"))
+
+# Tiempo máximo de espera (segundos) por petición HTTP y número de reintentos
+TIMEOUT_DESCARGA = float(os.environ.get("CRM_TIMEOUT_DESCARGA", "30"))
+REINTENTOS_DESCARGA = int(os.environ.get("CRM_REINTENTOS_DESCARGA", "3"))
+
+# Motor de lectura de Excel: "auto" (calamine si está instalado), "calamine" u "openpyxl"
+MOTOR_EXCEL = os.environ.get("CRM_MOTOR_EXCEL", "auto")
+
+# Formato de las fechas guardadas como texto en el libro
+FORMATO_FECHA = os.environ.get("CRM_FORMATO_FECHA", "%Y-%m-%d")
+
+# Tamaño (bytes) a partir del cual las hojas se leen en procesos paralelos
+UMBRAL_PARALELO = int(os.environ.get("CRM_UMBRAL_PARALELO", str(4 * 1024 * 1024)))
+
+# Nomenclátor local (CSV: nombre, tipo, padre, lat, lon) para geocodificar direcciones sin conexión
+RUTA_NOMENCLATOR = os.environ.get("CRM_NOMENCLATOR", os.path.join(DIRECTORIO_CACHE, "nomenclator.csv"))
+
+# Base SQLite con el registro de llamadas y las reservas de la cola diaria
+RUTA_LLAMADAS = os.environ.get("CRM_LLAMADAS", os.path.join(DIRECTORIO_CACHE, "llamadas.sqlite3"))
+
+# Fuentes del histórico separadas por ";": ids de libros de Google Drive o rutas locales .xlsx/.csv
+# (un CSV contiene una sola hoja, indicada al principio de su nombre: pedido_2024.csv, clientes.csv)
+FUENTES = os.environ.get("CRM_FUENTES", "")
+
+# Días tras el fin de un mes a partir de los cuales se congela como partición inmutable
+DIAS_CIERRE = int(os.environ.get("CRM_DIAS_CIERRE", "5"))
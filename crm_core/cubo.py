@@ -0,0 +1,320 @@
+"""Cubo mensual de ventas para las pestañas Analítica y Vendedores.
+
+Las líneas de pedido y entrega se agregan una vez por versión sobre
+(zona, segmento, tipo_negocio, mes, producto, vendedor); zona, segmento y
+tipo de negocio son los del cliente. Cada celda guarda monto, cantidad y
+número de líneas pedidas, y cantidad y líneas entregadas. Si los pedidos
+traen el emparejamiento con entregas (`cumplimiento`), también la cantidad
+cumplida, las líneas completas y la suma de sus días de entrega, todo por
+mes del pedido. Aparte se llevan los clientes con pedidos por mes, que no se
+pueden sumar entre productos.
+
+Los KPIs, el top/bottom de productos, la matriz dispersa vendedor×producto y
+las ventas por segmento se responden cortando el cubo, cuyo tamaño crece con
+las combinaciones distintas y no con el número de líneas. `agregar` añade
+líneas nuevas (normalmente un mes cerrado) sin recalcular el histórico.
+
+El histórico particionado guarda además las celdas por cliente de sus meses
+congelados (`celdas_por_cliente`): no dependen de la zona ni del segmento del
+cliente, así que cada versión las pasa a `agregar` y sólo agrega línea a
+línea el mes abierto y los pedidos congelados aún no cumplidos.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Hashable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .compactacion import codigos_y_valores
+from .indice_clientes import IndiceClientes
+from .matriz import MatrizVentas
+
+ATRIBUTOS_CLIENTE = ("zona", "segmento", "tipo_negocio")
+DIMENSIONES = ATRIBUTOS_CLIENTE + ("mes", "producto", "vendedor")
+MEDIDAS = (
+    "monto", "cantidad", "lineas_pedido", "cantidad_entregada", "lineas_entrega",
+    "cantidad_cumplida", "lineas_completas", "dias_completas",
+)
+# Claves de las celdas por cliente; producto y vendedor como texto
+CLAVES_CELDAS = ("codigo_cliente", "mes", "producto", "vendedor")
+
+
+@dataclass
+class CeldasCongeladas:
+    """Celdas por cliente de las líneas de meses congelados, ya sumadas.
+
+    `pedidos` y `entregas` marcan las filas de las tablas de la versión que ya
+    están en `celdas`; el cubo sólo agrega las demás.
+    """
+
+    celdas: pd.DataFrame
+    pedidos: np.ndarray
+    entregas: np.ndarray
+
+
+def _medidas_pedidos(pedidos: pd.DataFrame) -> dict[str, np.ndarray]:
+    medidas = {
+        "monto": pedidos["monto"].to_numpy(dtype=np.float64),
+        "cantidad": pedidos["cantidad"].to_numpy(dtype=np.float64),
+        "lineas_pedido": np.ones(len(pedidos)),
+    }
+    if "cantidad_cumplida" in pedidos.columns:
+        completa = pedidos["entrega_completa"].to_numpy(dtype=bool)
+        medidas["cantidad_cumplida"] = pedidos["cantidad_cumplida"].to_numpy(dtype=np.float64)
+        medidas["lineas_completas"] = completa.astype(np.float64)
+        medidas["dias_completas"] = np.where(completa, pedidos["dias_entrega"].to_numpy(dtype=np.float64), 0)
+    return medidas
+
+
+def _medidas_entregas(entregas: pd.DataFrame) -> dict[str, np.ndarray]:
+    return {
+        "cantidad_entregada": entregas["cantidad"].to_numpy(dtype=np.float64),
+        "lineas_entrega": np.ones(len(entregas)),
+    }
+
+
+def _lineas_cliente(df: pd.DataFrame, mes: str, medidas: dict[str, np.ndarray]) -> pd.DataFrame:
+    ceros = np.zeros(len(df))
+    return pd.DataFrame({
+        "codigo_cliente": df["codigo_cliente"].astype(str).str.strip().to_numpy(dtype=object),
+        "mes": df[mes].to_numpy().astype(np.int32),
+        **{
+            columna: df[columna].to_numpy(dtype=object) if columna in df.columns else np.full(len(df), None)
+            for columna in ("producto", "vendedor")
+        },
+        **{m: medidas.get(m, ceros) for m in MEDIDAS},
+    })
+
+
+def celdas_por_cliente(
+    pedidos: pd.DataFrame,
+    entregas: pd.DataFrame,
+    anteriores: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Medidas de unas líneas por (cliente, mes, producto, vendedor), sumadas a `anteriores`.
+
+    Las claves van como texto, no como atributos del cliente ni códigos de un
+    diccionario: las celdas se pueden guardar y pasar a `CuboVentas.agregar` de
+    cualquier versión. Se devuelven como categóricas para que cada versión las
+    recodifique por sus valores distintos y no celda a celda.
+    """
+    partes = [] if anteriores is None else [anteriores]
+    if len(pedidos):
+        partes.append(_lineas_cliente(pedidos, "mes_pedido", _medidas_pedidos(pedidos)))
+    if len(entregas):
+        partes.append(_lineas_cliente(entregas, "mes_entrega", _medidas_entregas(entregas)))
+    if not partes:
+        return _lineas_cliente(pd.DataFrame({"codigo_cliente": [], "mes": []}), "mes", {})
+    celdas = (
+        pd.concat(partes, ignore_index=True)
+        .groupby(list(CLAVES_CELDAS), sort=False, as_index=False, dropna=False, observed=True)[list(MEDIDAS)].sum()
+    )
+    return celdas.astype({columna: "category" for columna in ("codigo_cliente", "producto", "vendedor")})
+
+
+class CuboVentas:
+    """Agregados por celda, cortables por zona, segmento, tipo de negocio y mes."""
+
+    def __init__(self, clientes: pd.DataFrame, indice: IndiceClientes):
+        self._indice = indice
+        self._tipos: dict[str, pd.CategoricalDtype] = {}
+        self._atributos: dict[str, np.ndarray] = {}
+        filas = indice.filas_clientes
+        for columna in ATRIBUTOS_CLIENTE:
+            if columna in clientes.columns:
+                codigos = self._recodificar(columna, clientes[columna])[filas]
+            else:
+                codigos = np.full(len(filas), -1, dtype=np.int32)
+                self._tipos[columna] = pd.CategoricalDtype([])
+            self._atributos[columna] = codigos
+
+        self.celdas = pd.DataFrame(
+            {**{d: np.empty(0, dtype=np.int32) for d in DIMENSIONES},
+             **{m: np.empty(0, dtype=np.float64) for m in MEDIDAS}}
+        )
+        # Pares (mes + 1) * clientes + clave de cada cliente con pedidos en el mes
+        self._pares = np.empty(0, dtype=np.int64)
+        self._activos_mes = pd.DataFrame()
+        self._activos_total = pd.DataFrame()
+
+    def _recodificar(self, columna: str, serie: pd.Series) -> np.ndarray:
+        """Códigos de la serie en el diccionario del cubo, ampliándolo con valores nuevos."""
+        codigos, valores = codigos_y_valores(serie)
+        actual = self._tipos.get(columna)
+        if actual is None:
+            ordenada = isinstance(serie.dtype, pd.CategoricalDtype) and serie.dtype.ordered
+            self._tipos[columna] = pd.CategoricalDtype(valores, ordered=ordenada)
+            return codigos
+        if valores.equals(actual.categories):
+            return codigos
+        # Los valores nuevos van al final: los códigos ya guardados siguen siendo válidos
+        nuevos = valores.difference(actual.categories, sort=False)
+        if len(nuevos):
+            self._tipos[columna] = pd.CategoricalDtype(actual.categories.append(nuevos), ordered=actual.ordered)
+        mapa = self._tipos[columna].categories.get_indexer(valores).astype(np.int32)
+        return np.where(codigos >= 0, mapa[codigos], -1).astype(np.int32)
+
+    def _lineas(self, df: pd.DataFrame, mes: str, medidas: dict[str, np.ndarray]) -> pd.DataFrame:
+        claves = self._indice.claves_de(df["codigo_cliente"])
+        conocido = claves >= 0
+        lineas = {
+            columna: np.where(conocido, self._atributos[columna][np.maximum(claves, 0)], -1).astype(np.int32)
+            for columna in ATRIBUTOS_CLIENTE
+        }
+        lineas["mes"] = df[mes].to_numpy().astype(np.int32)
+        for columna in ("producto", "vendedor"):
+            if columna in df.columns:
+                lineas[columna] = self._recodificar(columna, df[columna])
+            else:
+                lineas[columna] = np.full(len(df), -1, dtype=np.int32)
+                self._tipos.setdefault(columna, pd.CategoricalDtype([]))
+        ceros = np.zeros(len(df))
+        lineas.update({m: medidas.get(m, ceros) for m in MEDIDAS})
+        return pd.DataFrame(lineas)
+
+    def agregar(
+        self,
+        pedidos: pd.DataFrame,
+        entregas: pd.DataFrame,
+        celdas: Optional[pd.DataFrame] = None,
+    ) -> "CuboVentas":
+        """Suma líneas nuevas de pedidos y entregas al cubo, y las celdas por cliente de `celdas_por_cliente`."""
+        partes = [self.celdas]
+        # (clave de cliente, mes) de cada línea o celda con pedidos
+        activos: list[tuple[np.ndarray, np.ndarray]] = []
+        if celdas is not None and len(celdas):
+            partes.append(self._lineas(celdas, "mes", {m: celdas[m].to_numpy(dtype=np.float64) for m in MEDIDAS}))
+            con_pedidos = celdas[celdas["lineas_pedido"].to_numpy() > 0]
+            activos.append((self._indice.claves_de(con_pedidos["codigo_cliente"]), con_pedidos["mes"].to_numpy()))
+        if len(pedidos):
+            partes.append(self._lineas(pedidos, "mes_pedido", _medidas_pedidos(pedidos)))
+            activos.append((self._indice.claves_de(pedidos["codigo_cliente"]), pedidos["mes_pedido"].to_numpy()))
+        if activos:
+            self._agregar_activos(*(np.concatenate(columna).astype(np.int64) for columna in zip(*activos)))
+        if len(entregas):
+            partes.append(self._lineas(entregas, "mes_entrega", _medidas_entregas(entregas)))
+        self.celdas = (
+            pd.concat(partes, ignore_index=True)
+            .groupby(list(DIMENSIONES), sort=False, as_index=False)[list(MEDIDAS)].sum()
+        )
+        return self
+
+    def _agregar_activos(self, claves: np.ndarray, meses: np.ndarray) -> None:
+        n_claves = len(self._indice)
+        conocidos = claves >= 0
+        nuevos = (meses[conocidos] + 1) * n_claves + claves[conocidos]
+        self._pares = np.union1d(self._pares, nuevos)
+
+        claves, meses = self._pares % n_claves, self._pares // n_claves - 1
+        atributos = {c: self._atributos[c][claves] for c in ATRIBUTOS_CLIENTE}
+        self._activos_mes = (
+            pd.DataFrame({**atributos, "mes": meses.astype(np.int32), "clientes": 1})
+            .groupby(list(ATRIBUTOS_CLIENTE) + ["mes"], sort=False, as_index=False)["clientes"].sum()
+        )
+        con_compras = np.unique(claves)
+        self._activos_total = (
+            pd.DataFrame({**{c: self._atributos[c][con_compras] for c in ATRIBUTOS_CLIENTE}, "clientes": 1})
+            .groupby(list(ATRIBUTOS_CLIENTE), sort=False, as_index=False)["clientes"].sum()
+        )
+
+    def meses(self) -> np.ndarray:
+        """Códigos de mes con pedidos, ordenados."""
+        return np.unique(self._pares // max(len(self._indice), 1) - 1)
+
+    def clientes_por_mes(self) -> tuple[np.ndarray, np.ndarray]:
+        """(código de mes, fila de `clientes`) de cada cliente con pedidos en ese mes."""
+        n_claves = max(len(self._indice), 1)
+        return self._pares // n_claves - 1, self._indice.filas_clientes[self._pares % n_claves]
+
+    def _mascara(self, tabla: pd.DataFrame, corte: dict[str, Optional[Hashable]]) -> np.ndarray:
+        mascara = np.ones(len(tabla), dtype=bool)
+        for columna, valor in corte.items():
+            if valor is None:
+                continue
+            if columna == "mes":
+                codigo = int(valor)
+            else:
+                categorias = self._tipos[columna].categories
+                if valor not in categorias:
+                    return np.zeros(len(tabla), dtype=bool)
+                codigo = categorias.get_loc(valor)
+            mascara &= tabla[columna].to_numpy() == codigo
+        return mascara
+
+    def _etiquetar(self, tabla: pd.DataFrame) -> pd.DataFrame:
+        tabla = tabla.copy()
+        for columna, tipo in self._tipos.items():
+            if columna in tabla.columns:
+                tabla[columna] = pd.Categorical.from_codes(tabla[columna].to_numpy(), dtype=tipo)
+        return tabla
+
+    def cortar(self, **corte: Optional[Hashable]) -> pd.DataFrame:
+        """Celdas del corte con las dimensiones como categóricas; None = sin filtro."""
+        return self._etiquetar(self.celdas[self._mascara(self.celdas, corte)])
+
+    def por(self, dimensiones: Sequence[str], medida: str = "cantidad", **corte: Optional[Hashable]) -> pd.Series:
+        """Suma de `medida` en el corte agrupada por `dimensiones`."""
+        celdas = self.cortar(**corte)
+        return celdas.groupby(list(dimensiones), observed=True)[medida].sum()
+
+    def matriz(self, filas: str = "vendedor", columnas: str = "producto", medida: str = "cantidad",
+               **corte: Optional[Hashable]) -> MatrizVentas:
+        """Matriz dispersa filas×columnas de `medida` en el corte, sin pasar por una tabla densa."""
+        celdas = self.celdas[self._mascara(self.celdas, corte)]
+        return MatrizVentas(
+            celdas[filas].to_numpy(), celdas[columnas].to_numpy(), celdas[medida].to_numpy(),
+            self._tipos[filas].categories, self._tipos[columnas].categories,
+            eje_filas=filas, eje_columnas=columnas, medida=medida,
+        )
+
+    def totales(self, **corte: Optional[Hashable]) -> dict[str, float]:
+        """Suma de cada medida en el corte y clientes con pedidos."""
+        celdas = self.celdas[self._mascara(self.celdas, corte)]
+        totales = {medida: float(celdas[medida].sum()) for medida in MEDIDAS}
+        totales["clientes"] = int(self.clientes_activos(**corte))
+        return totales
+
+    def clientes_activos(self, por: Sequence[str] = (), **corte: Optional[Hashable]):
+        """Clientes con pedidos en el corte; sin mes, en todo el período.
+
+        Con `por` (atributos del cliente) devuelve una serie en lugar de un total.
+        """
+        if corte.get("mes") is None:
+            tabla = self._activos_total
+            corte = {c: v for c, v in corte.items() if c != "mes"}
+        else:
+            tabla = self._activos_mes
+        if tabla.empty:
+            return 0 if not por else pd.Series(dtype=np.int64, name="clientes")
+        tabla = tabla[self._mascara(tabla, corte)]
+        if not por:
+            return int(tabla["clientes"].sum())
+        return self._etiquetar(tabla).groupby(list(por), observed=True)["clientes"].sum()
+
+    def cumplimiento(self, por: Sequence[str] = ("mes",), **corte: Optional[Hashable]) -> pd.DataFrame:
+        """Tasa de cumplimiento y días hasta la entrega completa de los pedidos del corte por `por`.
+
+        `tasa_cumplimiento` es cantidad cumplida / pedida, `lineas_completas` la
+        fracción de líneas entregadas por completo y `dias_entrega` la media de
+        días entre el pedido y su última entrega en las líneas completas.
+        """
+        celdas = self.cortar(**corte)
+        tabla = celdas[celdas["lineas_pedido"] > 0].groupby(list(por), observed=True)[
+            ["cantidad", "cantidad_cumplida", "lineas_pedido", "lineas_completas", "dias_completas"]
+        ].sum()
+        return pd.DataFrame({
+            "cantidad": tabla["cantidad"],
+            "cantidad_cumplida": tabla["cantidad_cumplida"],
+            "tasa_cumplimiento": tabla["cantidad_cumplida"] / tabla["cantidad"].where(tabla["cantidad"] > 0),
+            "lineas_completas": tabla["lineas_completas"] / tabla["lineas_pedido"],
+            "dias_entrega": tabla["dias_completas"] / tabla["lineas_completas"].where(tabla["lineas_completas"] > 0),
+        })
+
+    def productos_extremos(self, n: int = 5, **corte: Optional[Hashable]) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Los `n` productos más y menos pedidos (por cantidad) en el corte."""
+        celdas = self.cortar(**corte)
+        celdas = celdas[celdas["lineas_pedido"] > 0]
+        cantidades = celdas.groupby("producto", observed=True)["cantidad"].sum()
+        return cantidades.nlargest(n).reset_index(), cantidades.nsmallest(n).reset_index()
@@ -0,0 +1,160 @@
+"""Emparejamiento de líneas de pedido con líneas de entrega.
+
+Las entregas de un cliente y producto se asignan a sus pedidos en orden
+FIFO por fecha: las cantidades pedidas y entregadas se acumulan por clave
+(cliente, producto), desde cero en cada una, y cada entrega cubre el tramo del
+acumulado de pedidos con el que se solapa. Así una entrega puede completar
+varios pedidos y un pedido puede recibir varias entregas parciales. Todo se
+resuelve con arrays ordenados (`lexsort`, `cumsum`, `searchsorted`, `repeat`),
+sin bucles. Con cantidades fraccionarias los acumulados arrastran errores de
+redondeo: los solapes de menos de `TOLERANCIA` no cuentan como entrega.
+
+Por línea de pedido se obtiene la cantidad cumplida, los días hasta la
+última entrega asignada y si quedó completa; el cubo de ventas los suma por
+mes, zona, vendedor, etc. Una entrega registrada antes que el pedido que
+cubre cuenta con 0 días, y lo entregado de más sobre lo pedido no se asigna.
+
+En orden FIFO, los pedidos ya cumplidos de una clave son los primeros y las
+entregas posteriores no los cambian: `entregas_sobrantes` descuenta lo que
+consumieron y deja lo que se repartiría entre los pedidos siguientes, de modo
+que el histórico sólo vuelve a emparejar los pedidos pendientes.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS = ("cantidad_cumplida", "dias_entrega", "entrega_completa")
+# Cantidad por debajo de la cual un solape o un resto se considera error de redondeo
+TOLERANCIA = 1e-9
+
+
+def _codigos_comunes(a: pd.Series, b: pd.Series) -> tuple[np.ndarray, np.ndarray, int]:
+    """Códigos enteros de dos columnas en un diccionario común (-1 si falta)."""
+    if (isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype)
+            and a.cat.categories.equals(b.cat.categories)):
+        return a.cat.codes.to_numpy().astype(np.int64), b.cat.codes.to_numpy().astype(np.int64), len(a.cat.categories)
+    # Se normalizan los valores distintos, no cada línea
+    crudos, valores = pd.factorize(np.concatenate([a.to_numpy(dtype=object), b.to_numpy(dtype=object)]))
+    normalizados, unicos = pd.factorize(pd.Series(valores, dtype=object).astype(str).str.strip())
+    codigos = np.where(crudos >= 0, normalizados[np.maximum(crudos, 0)], -1).astype(np.int64)
+    return codigos[:len(a)], codigos[len(a):], len(unicos)
+
+
+def _claves(pedidos: pd.DataFrame, entregas: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Clave entera (cliente, producto) de cada línea; -1 si falta alguno de los dos."""
+    cliente_p, cliente_e, _ = _codigos_comunes(pedidos["codigo_cliente"], entregas["codigo_cliente"])
+    producto_p, producto_e, n_productos = _codigos_comunes(pedidos["codigo_producto"], entregas["codigo_producto"])
+    clave_p = np.where((cliente_p >= 0) & (producto_p >= 0), cliente_p * n_productos + producto_p, -1)
+    clave_e = np.where((cliente_e >= 0) & (producto_e >= 0), cliente_e * n_productos + producto_e, -1)
+    return clave_p, clave_e
+
+
+def _dias(fechas: pd.Series) -> np.ndarray:
+    """Días desde 1970-01-01; NaT queda como el mínimo de int64."""
+    return fechas.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+
+def _tramos(cantidades: np.ndarray, grupo: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Inicio y fin de cada cantidad en el acumulado de su grupo (`grupo` viene ordenado).
+
+    El acumulado empieza en 0 en cada grupo y cada tramo empieza exactamente
+    donde acaba el anterior, de modo que el redondeo sólo depende de la clave.
+    """
+    if not len(cantidades):
+        return np.zeros(0), np.zeros(0)
+    fin = pd.Series(cantidades).groupby(grupo, sort=False).cumsum().to_numpy(dtype=np.float64)
+    inicio = np.r_[0.0, fin[:-1]]
+    inicio[np.r_[True, grupo[1:] != grupo[:-1]]] = 0.0
+    return inicio, fin
+
+
+def emparejar_entregas(pedidos: pd.DataFrame, entregas: pd.DataFrame) -> pd.DataFrame:
+    """Cantidad cumplida, días de entrega y si está completa cada línea de pedido.
+
+    Devuelve un DataFrame con el índice de `pedidos` y las columnas de `COLUMNAS`;
+    `dias_entrega` es NaN en las líneas sin ninguna entrega asignada.
+    """
+    n = len(pedidos)
+    cumplida = np.zeros(n, dtype=np.float64)
+    dias_entrega = np.full(n, np.nan, dtype=np.float32)
+    if n and len(entregas):
+        clave_p, clave_e = _claves(pedidos, entregas)
+        dias_p, dias_e = _dias(pedidos["fecha_pedido"]), _dias(entregas["fecha_entrega"])
+        cantidad_p = np.clip(pedidos["cantidad"].to_numpy(dtype=np.float64), 0, None)
+        cantidad_e = np.clip(entregas["cantidad"].to_numpy(dtype=np.float64), 0, None)
+        nat = np.iinfo(np.int64).min
+
+        # Pedidos por (clave, fecha, fila), con su tramo en el acumulado de la clave
+        filas_p = np.flatnonzero((clave_p >= 0) & (dias_p != nat) & ~np.isnan(cantidad_p))
+        filas_p = filas_p[np.lexsort((filas_p, dias_p[filas_p], clave_p[filas_p]))]
+        claves, grupo_p = np.unique(clave_p[filas_p], return_inverse=True)
+        inicio_p, fin_p = _tramos(cantidad_p[filas_p], grupo_p)
+        total = fin_p[np.r_[grupo_p[1:] != grupo_p[:-1], True]] if len(grupo_p) else np.zeros(0)
+
+        # Entregas de claves con pedidos, en el mismo orden, recortadas al total pedido de su clave
+        grupo = np.minimum(np.searchsorted(claves, clave_e), max(len(claves) - 1, 0))
+        con_pedidos = claves[grupo] == clave_e if len(claves) else np.zeros(len(clave_e), dtype=bool)
+        filas_e = np.flatnonzero((dias_e != nat) & ~np.isnan(cantidad_e) & con_pedidos)
+        filas_e = filas_e[np.lexsort((filas_e, dias_e[filas_e], grupo[filas_e]))]
+        grupo = grupo[filas_e]
+        inicio_e, fin_e = _tramos(cantidad_e[filas_e], grupo)
+        inicio_e, fin_e = np.minimum(inicio_e, total[grupo]), np.minimum(fin_e, total[grupo])
+
+        # Cada entrega se solapa con los pedidos [desde, hasta] de su clave. Como complejos
+        # (grupo + posición·i) se ordenan por clave y después por posición, así que la
+        # búsqueda no sale de la clave ni compara acumulados de claves distintas
+        desde = np.searchsorted(grupo_p + 1j * fin_p, grupo + 1j * inicio_e, side="right")
+        hasta = np.searchsorted(grupo_p + 1j * inicio_p, grupo + 1j * fin_e, side="left") - 1
+        piezas = np.where(fin_e > inicio_e, np.maximum(hasta - desde + 1, 0), 0)
+        entrega = np.repeat(np.arange(len(filas_e)), piezas)
+        pedido = desde[entrega] + np.arange(len(entrega)) - np.repeat(np.cumsum(piezas) - piezas, piezas)
+        cantidad = np.minimum(fin_e[entrega], fin_p[pedido]) - np.maximum(inicio_e[entrega], inicio_p[pedido])
+        solapan = cantidad > TOLERANCIA
+        entrega, pedido, cantidad = entrega[solapan], pedido[solapan], cantidad[solapan]
+
+        cumplida[filas_p] = np.bincount(pedido, weights=cantidad, minlength=len(filas_p))
+        # `pedido` no decrece y las entregas de cada clave van por fecha: la última pieza es la más tardía
+        ultimas = np.r_[pedido[1:] != pedido[:-1], True] if len(pedido) else np.zeros(0, dtype=bool)
+        retraso = np.maximum(dias_e[filas_e[entrega[ultimas]]] - dias_p[filas_p[pedido[ultimas]]], 0)
+        dias_entrega[filas_p[pedido[ultimas]]] = retraso
+
+    cantidad_pedida = pedidos["cantidad"].to_numpy(dtype=np.float64)
+    return pd.DataFrame({
+        "cantidad_cumplida": cumplida,
+        "dias_entrega": dias_entrega,
+        "entrega_completa": (cantidad_pedida > 0) & (cumplida >= cantidad_pedida - TOLERANCIA),
+    }, index=pedidos.index)
+
+
+def entregas_sobrantes(pedidos: pd.DataFrame, entregas: pd.DataFrame, cerrados: np.ndarray) -> pd.DataFrame:
+    """Entregas, o la parte de ellas, que quedan tras cubrir los pedidos `cerrados`.
+
+    Los cerrados de cada clave deben ir primero en el orden FIFO (cumplidos o sin
+    cantidad): su cantidad se descuenta del principio de las entregas de la clave
+    por fecha. Emparejar el resto de pedidos con lo que queda da lo mismo que
+    emparejarlo todo. Las entregas que nunca se asignan (sin fecha, cantidad o
+    clave) no se devuelven.
+    """
+    clave_p, clave_e = _claves(pedidos, entregas)
+    nat = np.iinfo(np.int64).min
+    cantidad_p = np.clip(pedidos["cantidad"].to_numpy(dtype=np.float64), 0, None)
+    cantidad_e = np.clip(entregas["cantidad"].to_numpy(dtype=np.float64), 0, None)
+
+    # Cantidad consumida por clave: la de los pedidos cerrados que entran en el emparejamiento
+    consumen = cerrados & (clave_p >= 0) & (_dias(pedidos["fecha_pedido"]) != nat) & ~np.isnan(cantidad_p)
+    claves, grupo = np.unique(clave_p[consumen], return_inverse=True)
+    consumido = np.bincount(grupo, weights=cantidad_p[consumen], minlength=len(claves))
+
+    # Acumulado de las entregas de cada clave por fecha, como en `emparejar_entregas`
+    dias_e = _dias(entregas["fecha_entrega"])
+    filas_e = np.flatnonzero((clave_e >= 0) & (dias_e != nat) & ~np.isnan(cantidad_e))
+    filas_e = filas_e[np.lexsort((filas_e, dias_e[filas_e], clave_e[filas_e]))]
+    clave = clave_e[filas_e]
+    _, acumulado = _tramos(cantidad_e[filas_e], clave)
+
+    posicion = np.minimum(np.searchsorted(claves, clave), max(len(claves) - 1, 0))
+    descuento = np.where(claves[posicion] == clave, consumido[posicion], 0) if len(claves) else np.zeros(len(clave))
+    resto = np.minimum(cantidad_e[filas_e], acumulado - descuento)
+    quedan = resto > TOLERANCIA
+    return entregas.iloc[filas_e[quedan]].assign(cantidad=resto[quedan]).reset_index(drop=True)
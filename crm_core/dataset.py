@@ -0,0 +1,194 @@
+"""Dataset compartido por todas las sesiones de un proceso.
+
+Se construye una vez por versión de los datos y cada sesión recibe una vista:
+copias superficiales de los DataFrames que comparten los mismos bloques de
+memoria. Con Copy-on-Write activado en pandas, cualquier escritura desde una
+sesión materializa una copia privada y nunca toca el dataset compartido.
+
+Los resultados de cada sección del dashboard se memorizan por versión y
+combinación de filtros: volver a una sección o a unos filtros ya vistos no
+recalcula nada, y al publicarse otra versión se descartan con ella.
+"""
+from __future__ import annotations
+
+import dataclasses
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Mapping, Optional, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from .compactacion import etiqueta_mes
+from .busqueda import IndiceBusqueda
+from .cubo import CuboVentas
+from .espacial import CapasEspaciales
+from .filtrado_colaborativo import MotorRecomendacion
+from .filtros import IndiceFiltros
+from .indice_clientes import IndiceClientes
+from .pipeline import DatosCRM
+from .recomendaciones import TablasRecomendacion
+
+T = TypeVar("T")
+
+
+def activar_copy_on_write() -> None:
+    """Activa Copy-on-Write; sin él las vistas no están protegidas frente a escrituras."""
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _arrays(df: pd.DataFrame) -> list[np.ndarray]:
+    """Arrays de NumPy que respaldan cada columna (sin copiar)."""
+    arrays = []
+    for _, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            arrays.append(serie.cat.codes.to_numpy())
+        elif isinstance(serie.dtype, np.dtype):
+            arrays.append(serie.to_numpy(copy=False))
+    return arrays
+
+
+def bytes_frame(df: pd.DataFrame, profundo: bool = True) -> int:
+    """Memoria ocupada por un DataFrame, incluidos los objetos Python si `profundo`."""
+    return int(df.memory_usage(index=True, deep=profundo).sum())
+
+
+class DatasetCompartido:
+    """Versión inmutable de `DatosCRM` compartida entre sesiones."""
+
+    def __init__(self, datos: DatosCRM, version: str, capacidad: int = 256):
+        self._datos = datos
+        self.version = version
+        self.creado_en = time.time()
+        self._bases = [a for df in self._frames(datos).values() for a in _arrays(df)]
+        self.capacidad = capacidad
+        self._resultados: OrderedDict[tuple, object] = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    @staticmethod
+    def _frames(datos: DatosCRM) -> dict[str, pd.DataFrame]:
+        return {
+            campo.name: getattr(datos, campo.name)
+            for campo in dataclasses.fields(datos)
+            if isinstance(getattr(datos, campo.name), pd.DataFrame)
+        }
+
+    @property
+    def esta_vacio(self) -> bool:
+        return self._datos.esta_vacio
+
+    @functools.cached_property
+    def indice_filtros(self) -> IndiceFiltros:
+        """Índice de los filtros de la barra lateral, construido al primer uso.
+
+        El mes filtra por actividad real: clientes con pedidos en ese mes.
+        """
+        indice = IndiceFiltros(self._datos.clientes)
+        if not self.esta_vacio:
+            indice.indexar_pares("mes", *self.cubo.clientes_por_mes())
+        return indice
+
+    @functools.cached_property
+    def indice_busqueda(self) -> IndiceBusqueda:
+        """Búsqueda incremental de clientes por código, nombre, teléfono y dirección."""
+        return IndiceBusqueda(self._datos.clientes)
+
+    @functools.cached_property
+    def capas_espaciales(self) -> CapasEspaciales:
+        """Rejillas del mapa de densidad por filtros y zoom."""
+        return CapasEspaciales(self._datos.clientes, self.indice_filtros)
+
+    @functools.cached_property
+    def cubo(self) -> CuboVentas:
+        """Cubo mensual de ventas de la versión.
+
+        Con el histórico particionado parte de las celdas de los meses congelados
+        y sólo agrega las líneas que no están en ellas.
+        """
+        cubo = CuboVentas(self._datos.clientes, self.indice_clientes)
+        congelado = self._datos.congelado
+        if congelado is None:
+            return cubo.agregar(self._datos.pedidos, self._datos.entregas)
+        return cubo.agregar(
+            self._datos.pedidos[~congelado.pedidos], self._datos.entregas[~congelado.entregas], congelado.celdas
+        )
+
+    @functools.cached_property
+    def indice_clientes(self) -> IndiceClientes:
+        """Índice por código de cliente de clientes, pedidos y entregas."""
+        return IndiceClientes(self._datos.clientes, self._datos.pedidos, self._datos.entregas)
+
+    @functools.cached_property
+    def recomendaciones(self) -> TablasRecomendacion:
+        """Recomendados y oportunidades de venta por cliente."""
+        return TablasRecomendacion(self._datos.clientes, self._datos.pedidos, self.indice_clientes)
+
+    @functools.cached_property
+    def recomendador(self) -> MotorRecomendacion:
+        """Recomendador item-item entrenado con todos los pedidos de la versión."""
+        return MotorRecomendacion(self._datos.pedidos)
+
+    @functools.cached_property
+    def meses_pedido(self) -> list[str]:
+        """Meses con pedidos ('AAAA-MM'), en orden cronológico."""
+        pedidos = self._datos.pedidos
+        if pedidos.empty:
+            return []
+        return [etiqueta_mes(m) for m in np.unique(pedidos["mes_pedido"].to_numpy()) if m >= 0]
+
+    def memorizar(self, nombre: str, filtros: Mapping[str, Optional[Hashable]], calcular: Callable[[], T]) -> T:
+        """Resultado de `calcular()` para `nombre` y la combinación de filtros, calculado una vez.
+
+        Los resultados se comparten entre sesiones: quien los use no debe modificarlos.
+        """
+        clave = (nombre, tuple(sorted(filtros.items(), key=lambda item: item[0])))
+        with self._candado:
+            if clave in self._resultados:
+                self._resultados.move_to_end(clave)
+                self.aciertos += 1
+                return self._resultados[clave]
+        resultado = calcular()
+        with self._candado:
+            self.fallos += 1
+            self._resultados[clave] = resultado
+            if len(self._resultados) > self.capacidad:
+                self._resultados.popitem(last=False)
+        return resultado
+
+    def precalcular(self) -> "DatasetCompartido":
+        """Construye los índices antes de publicar la versión, fuera del camino de las peticiones."""
+        if not self.esta_vacio:
+            for nombre in ("cubo", "indice_filtros", "meses_pedido", "capas_espaciales", "indice_clientes", "recomendaciones", "recomendador", "indice_busqueda"):
+                getattr(self, nombre)
+        return self
+
+    def vista(self) -> DatosCRM:
+        """`DatosCRM` con copias superficiales: no duplica datos."""
+        vistas = {nombre: df.copy(deep=False) for nombre, df in self._frames(self._datos).items()}
+        return dataclasses.replace(self._datos, **vistas)
+
+    def bytes_compartidos(self) -> int:
+        """Memoria total del dataset, pagada una sola vez por proceso."""
+        return sum(bytes_frame(df) for df in self._frames(self._datos).values())
+
+    def bytes_propios(self, df: pd.DataFrame) -> int:
+        """Bytes de `df` que no comparte con el dataset.
+
+        Para columnas de texto cuenta sólo el array de referencias: las cadenas
+        siguen siendo las del dataset compartido.
+        """
+        total = 0
+        for array in _arrays(df):
+            if not any(np.may_share_memory(array, base) for base in self._bases):
+                total += array.nbytes
+        return total
+
+    def memoria_sesion(self, **frames: pd.DataFrame) -> dict[str, int]:
+        """Bytes propios de cada DataFrame de la sesión y su total."""
+        memoria = {nombre: self.bytes_propios(df) for nombre, df in frames.items()}
+        memoria["total"] = sum(memoria.values())
+        return memoria
@@ -0,0 +1,264 @@
+"""Descarga condicional del libro de Google Sheets con copia local en disco.
+
+El libro se guarda junto a sus validadores (ETag, Last-Modified y hash SHA-256
+del contenido). Cada revalidación envía los validadores al servidor; si responde
+304, o si los bytes descargados tienen el mismo hash, el libro se marca como
+no cambiado y el resto del pipeline puede reutilizar su resultado.
+
+Cada cuerpo descargado se guarda con su hash en el nombre y los metadatos
+apuntan a él: reemplazar los metadatos es lo único que publica una versión
+nueva, así que ningún lector ve bytes nuevos con el hash de la anterior.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Iterator, Mapping, Optional, Protocol
+
+from .configuracion import (
+    DIRECTORIO_CACHE,
+    REINTENTOS_DESCARGA,
+    TIMEOUT_DESCARGA,
+)
+
+URL_EXPORTACION = "https://docs.google.com/spreadsheets/d/{file_id}/export?format=xlsx"
+TAMANO_BLOQUE = 1 << 16
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class ErrorDescarga(Exception):
+    """No se pudo obtener el libro y no hay copia local utilizable."""
+
+
+class ErrorTransporte(ErrorDescarga):
+    """Fallo de red transitorio; la descarga puede reintentarse."""
+
+
+class RespuestaHTTP(Protocol):
+    estado: int
+    cabeceras: Mapping[str, str]
+
+    def bloques(self, tamano: int) -> Iterator[bytes]: ...
+
+    def cerrar(self) -> None: ...
+
+
+class Transporte(Protocol):
+    """Interfaz mínima de un cliente HTTP; permite sustituir `requests` en pruebas."""
+
+    def get(self, url: str, cabeceras: Mapping[str, str], timeout: float) -> RespuestaHTTP: ...
+
+
+class _RespuestaRequests:
+    def __init__(self, respuesta):
+        self._respuesta = respuesta
+        self.estado = respuesta.status_code
+        self.cabeceras = respuesta.headers
+
+    def bloques(self, tamano):
+        import requests
+
+        try:
+            yield from self._respuesta.iter_content(chunk_size=tamano)
+        except requests.RequestException as e:
+            raise ErrorTransporte(str(e)) from e
+
+    def cerrar(self):
+        self._respuesta.close()
+
+
+class TransporteRequests:
+    """Transporte por defecto basado en una `requests.Session` reutilizable."""
+
+    def __init__(self, sesion=None):
+        import requests
+
+        self._sesion = sesion or requests.Session()
+
+    def get(self, url, cabeceras, timeout):
+        import requests
+
+        try:
+            respuesta = self._sesion.get(url, headers=dict(cabeceras), timeout=timeout, stream=True)
+        except requests.RequestException as e:
+            raise ErrorTransporte(str(e)) from e
+        return _RespuestaRequests(respuesta)
+
+
+@dataclass(frozen=True)
+class LibroDescargado:
+    """Copia local del libro y metadatos de la última revalidación."""
+
+    ruta: str
+    sha256: str
+    etag: Optional[str]
+    ultima_modificacion: Optional[str]
+    descargado_en: float
+    cambiado: bool
+    obsoleto: bool = False
+
+
+def _ruta_meta(directorio: str, file_id: str) -> str:
+    return os.path.join(directorio, file_id + ".json")
+
+
+def _ruta_libro(directorio: str, file_id: str, meta: dict) -> str:
+    # Los metadatos anteriores al nombre por hash apuntan implícitamente a <file_id>.xlsx
+    return os.path.join(directorio, meta.get("libro", file_id + ".xlsx"))
+
+
+def _leer_metadatos(directorio: str, file_id: str) -> Optional[dict]:
+    try:
+        with open(_ruta_meta(directorio, file_id), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(_ruta_libro(directorio, file_id, meta)):
+        return None
+    return meta
+
+
+def _desde_meta(ruta_libro: str, meta: dict, cambiado: bool, obsoleto: bool = False) -> LibroDescargado:
+    return LibroDescargado(
+        ruta=ruta_libro,
+        sha256=meta["sha256"],
+        etag=meta.get("etag"),
+        ultima_modificacion=meta.get("ultima_modificacion"),
+        descargado_en=meta.get("descargado_en", 0.0),
+        cambiado=cambiado,
+        obsoleto=obsoleto,
+    )
+
+
+def _escribir_atomico(ruta: str, contenido: bytes) -> None:
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _volcar_cuerpo(respuesta: RespuestaHTTP, directorio: str, file_id: str) -> tuple[str, str]:
+    """Escribe el cuerpo por bloques y lo renombra a `<file_id>-<sha256>.xlsx`.
+
+    Devuelve (sha256, nombre). El archivo aún no es visible: lo publican los metadatos.
+    """
+    hasher = hashlib.sha256()
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for bloque in respuesta.bloques(TAMANO_BLOQUE):
+                if bloque:
+                    hasher.update(bloque)
+                    f.write(bloque)
+        sha256 = hasher.hexdigest()
+        nombre = f"{file_id}-{sha256}.xlsx"
+        os.replace(temporal, os.path.join(directorio, nombre))
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return sha256, nombre
+
+
+def _revalidar(transporte, url, directorio, file_id, meta, timeout):
+    """Un intento de petición condicional. Devuelve (sha256, nombre, cabeceras) o None si es 304."""
+    cabeceras = {}
+    if meta:
+        if meta.get("etag"):
+            cabeceras["If-None-Match"] = meta["etag"]
+        if meta.get("ultima_modificacion"):
+            cabeceras["If-Modified-Since"] = meta["ultima_modificacion"]
+
+    respuesta = transporte.get(url, cabeceras, timeout)
+    try:
+        if respuesta.estado == 304 and meta:
+            return None
+        if respuesta.estado in ESTADOS_REINTENTABLES:
+            raise ErrorTransporte(f"HTTP {respuesta.estado} al descargar {url}")
+        if respuesta.estado != 200:
+            raise ErrorDescarga(f"HTTP {respuesta.estado} al descargar {url}")
+        sha256, nombre = _volcar_cuerpo(respuesta, directorio, file_id)
+        return sha256, nombre, respuesta.cabeceras
+    finally:
+        respuesta.cerrar()
+
+
+def descargar_libro(
+    file_id: str,
+    directorio: str = DIRECTORIO_CACHE,
+    transporte: Optional[Transporte] = None,
+    url: Optional[str] = None,
+    timeout: float = TIMEOUT_DESCARGA,
+    reintentos: int = REINTENTOS_DESCARGA,
+    max_antiguedad: float = 0,
+) -> LibroDescargado:
+    """Revalida la copia local del libro y la descarga sólo si cambió.
+
+    Si otro proceso la revalidó hace menos de `max_antiguedad` segundos se usa
+    tal cual, sin petición HTTP. Los fallos transitorios se reintentan con espera
+    exponencial; los definitivos (403, 404) no. Si la revalidación falla y existe
+    copia local, se devuelve como obsoleta en lugar de dejar sin datos al panel.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    transporte = transporte or TransporteRequests()
+    url = url or URL_EXPORTACION.format(file_id=file_id)
+    meta = _leer_metadatos(directorio, file_id)
+    if meta and time.time() - meta.get("revalidado_en", 0) < max_antiguedad:
+        return _desde_meta(_ruta_libro(directorio, file_id, meta), meta, cambiado=False)
+
+    ultimo_error = None
+    for intento in range(reintentos + 1):
+        try:
+            resultado = _revalidar(transporte, url, directorio, file_id, meta, timeout)
+            ultimo_error = None
+            break
+        except ErrorTransporte as e:
+            ultimo_error = e
+            if intento < reintentos:
+                time.sleep(min(2 ** intento, 30) * 0.5)
+        except ErrorDescarga as e:
+            # Permiso retirado, libro borrado...: reintentar no cambia la respuesta
+            ultimo_error = e
+            break
+    if ultimo_error is not None:
+        if meta:
+            return _desde_meta(_ruta_libro(directorio, file_id, meta), meta, cambiado=False, obsoleto=True)
+        raise ErrorDescarga(f"No se pudo descargar el libro: {ultimo_error}") from ultimo_error
+
+    ahora = time.time()
+    if resultado is None:
+        # 304: la copia local sigue vigente
+        nuevo_meta = dict(meta, revalidado_en=ahora)
+        cambiado = False
+    else:
+        sha256, nombre, cabeceras = resultado
+        nuevo_meta = {
+            "sha256": sha256,
+            "libro": nombre,
+            "etag": cabeceras.get("ETag"),
+            "ultima_modificacion": cabeceras.get("Last-Modified"),
+            "descargado_en": ahora if not meta or meta.get("sha256") != sha256 else meta.get("descargado_en", ahora),
+            "revalidado_en": ahora,
+        }
+        cambiado = not meta or meta.get("sha256") != sha256
+
+    _escribir_atomico(_ruta_meta(directorio, file_id), json.dumps(nuevo_meta).encode("utf-8"))
+    ruta_libro = _ruta_libro(directorio, file_id, nuevo_meta)
+    if meta:
+        anterior = _ruta_libro(directorio, file_id, meta)
+        if anterior != ruta_libro:
+            try:
+                os.remove(anterior)
+            except OSError:
+                # Otro proceso ya lo retiró
+                pass
+    return _desde_meta(ruta_libro, nuevo_meta, cambiado=cambiado)
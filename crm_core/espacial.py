@@ -0,0 +1,143 @@
+"""Agregación espacial de clientes para el mapa de densidad.
+
+En lugar de enviar cada cliente al navegador, los clientes con coordenadas se
+agrupan en una rejilla de grados cuyo tamaño depende del zoom: a cada nivel
+le corresponden `CELDAS_POR_TESELA` celdas por tesela del mapa, así que el
+número de puntos dibujados se mantiene acotado al alejar la vista. Cada celda
+lleva la suma de monto, el número de clientes, el segmento predominante y el
+centroide de sus clientes. Con zoom alto sólo se envían las celdas de una
+ventana de `VENTANA_TESELAS` teselas alrededor del centro de los clientes
+filtrados, que es lo que cabe en pantalla; así el número de celdas queda
+acotado en todos los niveles. Las capas se guardan por (filtros, zoom).
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .compactacion import codigos_y_valores
+from .filtros import IndiceFiltros
+
+ZOOM_MINIMO = 5
+ZOOM_MAXIMO = 14
+CELDAS_POR_TESELA = 16
+VENTANA_TESELAS = 4
+
+
+def tamano_celda(zoom: int) -> float:
+    """Lado de la celda en grados para un nivel de zoom del mapa."""
+    return 360.0 / 2 ** zoom / CELDAS_POR_TESELA
+
+
+def _coordenada(clientes: pd.DataFrame, columna: str) -> np.ndarray:
+    if columna not in clientes.columns:
+        return np.full(len(clientes), np.nan)
+    return pd.to_numeric(clientes[columna], errors="coerce").to_numpy(dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class CapaMapa:
+    """Celdas a dibujar y el centro y zoom con que abrir el mapa."""
+
+    celdas: pd.DataFrame
+    lat: float
+    lon: float
+    zoom: int
+
+
+class CapasEspaciales:
+    """Celdas agregadas por nivel de zoom sobre los clientes filtrados."""
+
+    def __init__(self, clientes: pd.DataFrame, indice: IndiceFiltros, capacidad: int = 64):
+        self._indice = indice
+        self._lat = _coordenada(clientes, "lat")
+        self._lon = _coordenada(clientes, "lon")
+        # (0, 0) es el valor de relleno habitual de coordenadas desconocidas
+        self._validas = (
+            np.isfinite(self._lat) & np.isfinite(self._lon)
+            & (np.abs(self._lat) <= 90) & (np.abs(self._lon) <= 180)
+            & ~((self._lat == 0) & (self._lon == 0))
+        )
+        self._monto = (
+            clientes["monto_total"].to_numpy(dtype=np.float64) if "monto_total" in clientes.columns
+            else np.zeros(len(clientes))
+        )
+        if "segmento" in clientes.columns:
+            self._segmentos, self._nombres_segmento = codigos_y_valores(clientes["segmento"])
+        else:
+            self._segmentos, self._nombres_segmento = np.full(len(clientes), -1, dtype=np.int32), pd.Index([])
+
+        self.capacidad = capacidad
+        self._cache: OrderedDict[tuple, CapaMapa] = OrderedDict()
+        self._candado = threading.Lock()
+
+    @property
+    def hay_coordenadas(self) -> bool:
+        return bool(self._validas.any())
+
+    def sin_coordenadas(self, filtros: Mapping[str, Optional[Hashable]]) -> int:
+        """Clientes filtrados que no aparecen en el mapa por no tener coordenadas."""
+        filas = self._indice.filas(filtros)
+        return int(len(filas) - self._validas[filas].sum())
+
+    def capa(self, filtros: Mapping[str, Optional[Hashable]], zoom: int) -> CapaMapa:
+        """Celdas (lat, lon, monto_total, clientes, segmento) de los clientes filtrados."""
+        zoom = int(min(max(zoom, ZOOM_MINIMO), ZOOM_MAXIMO))
+        clave = (tuple(sorted(filtros.items(), key=lambda item: item[0])), zoom)
+        with self._candado:
+            capa = self._cache.get(clave)
+            if capa is not None:
+                self._cache.move_to_end(clave)
+        if capa is None:
+            capa = self._agregar(filtros, zoom)
+            with self._candado:
+                self._cache[clave] = capa
+                if len(self._cache) > self.capacidad:
+                    self._cache.popitem(last=False)
+        return CapaMapa(capa.celdas.copy(deep=False), capa.lat, capa.lon, capa.zoom)
+
+    def _agregar(self, filtros: Mapping[str, Optional[Hashable]], zoom: int) -> CapaMapa:
+        filas = self._indice.filas(filtros)
+        filas = filas[self._validas[filas]]
+        lat, lon = self._lat[filas], self._lon[filas]
+        centro_lat = float(np.median(lat)) if len(filas) else 0.0
+        centro_lon = float(np.median(lon)) if len(filas) else 0.0
+
+        # Sólo lo que cabe en pantalla alrededor del centro
+        medio = VENTANA_TESELAS * 360.0 / 2 ** zoom / 2
+        visibles = (np.abs(lat - centro_lat) <= medio) & (np.abs(lon - centro_lon) <= medio)
+        if not visibles.all():
+            filas, lat, lon = filas[visibles], lat[visibles], lon[visibles]
+
+        lado = tamano_celda(zoom)
+        fila_celda = np.floor((lat + 90) / lado).astype(np.int64)
+        columna_celda = np.floor((lon + 180) / lado).astype(np.int64)
+        _, celda = np.unique(fila_celda * (int(360 / lado) + 1) + columna_celda, return_inverse=True)
+        celda = celda.ravel()
+        n_celdas = int(celda.max()) + 1 if len(celda) else 0
+
+        clientes = np.bincount(celda, minlength=n_celdas)
+        segmentos = self._segmentos[filas]
+        n_segmentos = len(self._nombres_segmento)
+        predominante = np.full(n_celdas, -1, dtype=np.int32)
+        con_segmento = segmentos >= 0
+        if n_segmentos and con_segmento.any():
+            conteos = np.bincount(
+                celda[con_segmento] * n_segmentos + segmentos[con_segmento], minlength=n_celdas * n_segmentos
+            ).reshape(n_celdas, n_segmentos)
+            predominante = np.where(conteos.any(axis=1), conteos.argmax(axis=1), -1)
+        nombres = np.append(np.asarray(self._nombres_segmento, dtype=object), "N/D")
+
+        celdas = pd.DataFrame({
+            "lat": np.bincount(celda, weights=lat, minlength=n_celdas) / np.maximum(clientes, 1),
+            "lon": np.bincount(celda, weights=lon, minlength=n_celdas) / np.maximum(clientes, 1),
+            "monto_total": np.bincount(celda, weights=self._monto[filas], minlength=n_celdas),
+            "clientes": clientes,
+            "segmento": nombres[predominante],
+        })
+        return CapaMapa(celdas, centro_lat, centro_lon, zoom)
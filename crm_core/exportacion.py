@@ -0,0 +1,220 @@
+"""Exportación por bloques de la lista filtrada de clientes para campañas.
+
+La vista filtrada se recorre en bloques de `TAMANO_BLOQUE` filas: cada bloque
+toma sólo sus filas del dataset compartido, añade el producto recomendado y
+se escribe en el formato pedido antes de pasar al siguiente, de modo que la
+memoria no crece con el número de filas. XLSX se escribe con xlsxwriter en
+modo `constant_memory` (fila a fila, sin guardar la hoja) y Parquet con un
+`ParquetWriter` que añade un grupo de filas por bloque.
+
+Los archivos se generan en un hilo aparte (`GestorExportaciones`): la
+ejecución del script sólo encola el trabajo y consulta su progreso. Un mismo
+corte y formato de una misma versión se genera una sola vez y lo comparten
+todas las sesiones.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Iterable, Iterator, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .configuracion import DIRECTORIO_CACHE
+
+TAMANO_BLOQUE = 20_000
+COLUMNAS = (
+    "codigo_cliente", "nombre", "telefono", "direccion", "zona", "tipo_negocio", "segmento",
+    "frecuencia_compra", "dias_sin_compra", "proxima_compra", "ticket_promedio", "valor_cliente",
+    "efectividad_entrega", "monto_total", "producto_recomendado",
+)
+# Formato -> (extensión, tipo MIME)
+FORMATOS = {
+    "csv": (".csv", "text/csv"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+EXPORTACIONES_CONSERVADAS = 20
+
+
+def bloques_exportacion(
+    clientes: pd.DataFrame,
+    filas: np.ndarray,
+    recomendar: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+    tamano: int = TAMANO_BLOQUE,
+    completar: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Bloques de `COLUMNAS` de las `filas` indicadas, listos para escribir.
+
+    Las categóricas pasan a texto para que todos los bloques tengan el mismo
+    esquema. `completar` recibe cada bloque y lo devuelve con columnas añadidas.
+    """
+    columnas = [c for c in COLUMNAS if c in clientes.columns]
+    for inicio in range(0, len(filas), tamano):
+        bloque = clientes.take(filas[inicio:inicio + tamano])[columnas]
+        for columna in columnas:
+            if isinstance(bloque[columna].dtype, pd.CategoricalDtype) or columna in ("codigo_cliente", "telefono"):
+                serie = bloque[columna]
+                bloque[columna] = serie.astype(str).where(serie.notna(), None)
+        if recomendar is not None:
+            bloque["producto_recomendado"] = recomendar(bloque).to_numpy()
+        bloque = bloque.reset_index(drop=True)
+        yield completar(bloque) if completar is not None else bloque
+
+
+def escribir_csv(bloques: Iterable[pd.DataFrame], ruta: str, progreso: Callable[[int], None] = lambda n: None) -> None:
+    with open(ruta, "w", encoding="utf-8-sig", newline="") as f:
+        for i, bloque in enumerate(bloques):
+            bloque.to_csv(f, index=False, header=i == 0, date_format="%Y-%m-%d")
+            progreso(len(bloque))
+
+
+def escribir_xlsx(bloques: Iterable[pd.DataFrame], ruta: str, progreso: Callable[[int], None] = lambda n: None) -> None:
+    import xlsxwriter
+
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True, "default_date_format": "dd/mm/yyyy"})
+    try:
+        hoja = libro.add_worksheet("Clientes")
+        encabezado = libro.add_format({"bold": True})
+        fila = 0
+        for bloque in bloques:
+            if fila == 0:
+                hoja.write_row(0, 0, list(bloque.columns), encabezado)
+                hoja.freeze_panes(1, 0)
+                fila = 1
+            # En modo constant_memory las filas se escriben en orden y una sola vez; los nulos quedan en blanco
+            valores = bloque.astype(object).where(bloque.notna(), None).to_numpy()
+            for valores_fila in valores:
+                hoja.write_row(fila, 0, valores_fila)
+                fila += 1
+            progreso(len(bloque))
+    finally:
+        libro.close()
+
+
+def escribir_parquet(bloques: Iterable[pd.DataFrame], ruta: str, progreso: Callable[[int], None] = lambda n: None) -> None:
+    escritor = None
+    try:
+        for bloque in bloques:
+            tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, tabla.schema)
+            escritor.write_table(tabla.cast(escritor.schema))
+            progreso(len(bloque))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+ESCRITORES = {"csv": escribir_csv, "xlsx": escribir_xlsx, "parquet": escribir_parquet}
+
+
+@dataclass
+class TrabajoExportacion:
+    """Estado de una exportación: pendiente, en_curso, listo o error."""
+
+    clave: str
+    formato: str
+    total: int
+    ruta: str
+    nombre: str = "clientes_filtrados"
+    estado: str = "pendiente"
+    escritas: int = 0
+    error: Optional[str] = None
+    creado_en: float = field(default_factory=time.time)
+    terminado_en: Optional[float] = None
+
+    @property
+    def progreso(self) -> float:
+        return 1.0 if self.estado == "listo" else self.escritas / max(self.total, 1)
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in ("listo", "error")
+
+    @property
+    def nombre_archivo(self) -> str:
+        return self.nombre + FORMATOS[self.formato][0]
+
+    @property
+    def mime(self) -> str:
+        return FORMATOS[self.formato][1]
+
+    def leer(self) -> bytes:
+        with open(self.ruta, "rb") as f:
+            return f.read()
+
+
+class GestorExportaciones:
+    """Cola de exportaciones en hilos propios, compartida por todas las sesiones del proceso."""
+
+    def __init__(self, directorio: str = DIRECTORIO_CACHE, hilos: int = 2):
+        self.directorio = os.path.join(directorio, "exportaciones")
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="crm-exportacion")
+        self._trabajos: dict[str, TrabajoExportacion] = {}
+        self._candado = threading.Lock()
+
+    @staticmethod
+    def clave(version: str, filtros: Mapping[str, Optional[Hashable]], formato: str) -> str:
+        texto = repr((version, tuple(sorted(filtros.items(), key=lambda item: item[0])), formato))
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:24]
+
+    def trabajo(self, clave: str) -> Optional[TrabajoExportacion]:
+        return self._trabajos.get(clave)
+
+    def solicitar(
+        self,
+        clave: str,
+        formato: str,
+        total: int,
+        bloques: Callable[[], Iterable[pd.DataFrame]],
+        nombre: str = "clientes_filtrados",
+    ) -> TrabajoExportacion:
+        """Encola la exportación si no existe ya (o si la anterior falló) y devuelve su trabajo."""
+        with self._candado:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None and trabajo.estado != "error":
+                return trabajo
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = os.path.join(self.directorio, clave + FORMATOS[formato][0])
+            trabajo = TrabajoExportacion(clave=clave, formato=formato, total=total, ruta=ruta, nombre=nombre)
+            self._trabajos[clave] = trabajo
+            self._limpiar()
+        self._ejecutor.submit(self._ejecutar, trabajo, bloques)
+        return trabajo
+
+    def _ejecutar(self, trabajo: TrabajoExportacion, bloques: Callable[[], Iterable[pd.DataFrame]]) -> None:
+        trabajo.estado = "en_curso"
+
+        def progreso(n: int) -> None:
+            trabajo.escritas += n
+
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        os.close(fd)
+        try:
+            ESCRITORES[trabajo.formato](bloques(), temporal, progreso)
+            os.replace(temporal, trabajo.ruta)
+            trabajo.estado = "listo"
+        except Exception as e:
+            trabajo.error = str(e)
+            trabajo.estado = "error"
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        finally:
+            trabajo.terminado_en = time.time()
+
+    def _limpiar(self) -> None:
+        """Olvida (y borra) los trabajos terminados más antiguos."""
+        terminados = sorted((t for t in self._trabajos.values() if t.terminado), key=lambda t: t.creado_en)
+        for trabajo in terminados[:max(len(self._trabajos) - EXPORTACIONES_CONSERVADAS, 0)]:
+            del self._trabajos[trabajo.clave]
+            if os.path.exists(trabajo.ruta):
+                os.remove(trabajo.ruta)
@@ -0,0 +1,178 @@
+"""Recomendador item-item sobre la matriz dispersa cliente×producto.
+
+La matriz de compras R es binaria (el cliente pidió el producto alguna vez).
+Se mantiene la coocurrencia G = RᵀR, de la que sale la similitud coseno
+entre productos, sim(i, j) = G[i, j] / sqrt(G[i, i] · G[j, j]), y se
+conservan sólo los `vecinos` más similares de cada producto. El puntaje de un
+producto para un cliente es la suma de sus similitudes con lo que el cliente
+ya compra.
+
+Las líneas nuevas se incorporan sin reconstruir: G se corrige con las filas
+de los clientes afectados (antes y después) y sólo se recalculan los vecinos
+de los productos cuya similitud cambió.
+"""
+from __future__ import annotations
+
+from typing import Hashable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .indice_clientes import normalizar_codigo
+
+VECINOS = 50
+
+
+def _codigos_texto(serie: pd.Series) -> np.ndarray:
+    return serie.astype(str).str.strip().to_numpy(dtype=object)
+
+
+class MotorRecomendacion:
+    """Similitud coseno item-item con poda top-k y actualización incremental."""
+
+    def __init__(self, pedidos: pd.DataFrame, vecinos: int = VECINOS):
+        self.vecinos = vecinos
+        self._clientes: dict[str, int] = {}
+        self._productos: dict[Hashable, int] = {}
+        self._nombres: list = []
+        self._compras = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._coocurrencia = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._similitud = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.actualizar(pedidos)
+
+    @property
+    def forma(self) -> tuple[int, int]:
+        """(clientes, productos) de la matriz de compras."""
+        return self._compras.shape
+
+    def _claves(self, valores: Iterable, mapa: dict, nombres: Optional[list] = None) -> np.ndarray:
+        """Clave entera de cada valor; los valores nuevos se añaden al final."""
+        unicos, inversa = np.unique(np.asarray(valores, dtype=object), return_inverse=True)
+        claves = np.empty(len(unicos), dtype=np.int32)
+        for i, valor in enumerate(unicos):
+            clave = mapa.get(valor)
+            if clave is None:
+                clave = mapa[valor] = len(mapa)
+                if nombres is not None:
+                    nombres.append(valor)
+            claves[i] = clave
+        return claves[inversa.ravel()]
+
+    def actualizar(self, lineas: pd.DataFrame) -> np.ndarray:
+        """Incorpora líneas de pedido (codigo_cliente, producto); devuelve los productos recalculados."""
+        lineas = lineas.dropna(subset=["codigo_cliente", "producto"]) if len(lineas) else lineas
+        if not len(lineas):
+            return np.empty(0, dtype=np.int32)
+        productos = lineas["producto"]
+        if isinstance(productos.dtype, pd.CategoricalDtype):
+            productos = productos.astype(object)
+        filas = self._claves(_codigos_texto(lineas["codigo_cliente"]), self._clientes)
+        columnas = self._claves(productos.to_numpy(dtype=object), self._productos, self._nombres)
+        n_clientes, n_productos = len(self._clientes), len(self._productos)
+
+        anteriores = self._redimensionar(self._compras, (n_clientes, n_productos))
+        nuevas = sparse.csr_matrix(
+            (np.ones(len(filas), dtype=np.int32), (filas, columnas)), shape=(n_clientes, n_productos)
+        )
+        compras = anteriores + nuevas
+        compras.data[:] = 1
+        self._compras = compras
+
+        # G cambia sólo por las filas de los clientes afectados
+        afectados = np.unique(filas)
+        antes, despues = anteriores[afectados], compras[afectados]
+        delta = (despues.T @ despues - antes.T @ antes).tocsr()
+        delta.eliminate_zeros()
+        self._coocurrencia = (self._redimensionar(self._coocurrencia, (n_productos, n_productos)) + delta).tocsr()
+
+        # Cambian los vecinos de los productos con G[i, j] distinto y, como cambió
+        # la norma de los productos de la diagonal, los de todos sus coocurrentes
+        diagonal = delta.diagonal().nonzero()[0]
+        cambiados = np.union1d(np.unique(delta.indices), self._coocurrencia[diagonal].indices)
+        self._similitud = self._redimensionar(self._similitud, (n_productos, n_productos))
+        self._recalcular_vecinos(cambiados.astype(np.int32))
+        return cambiados
+
+    @staticmethod
+    def _redimensionar(matriz: sparse.csr_matrix, forma: tuple[int, int]) -> sparse.csr_matrix:
+        if matriz.shape == forma:
+            return matriz
+        matriz = matriz.tocoo()
+        return sparse.csr_matrix((matriz.data, (matriz.row, matriz.col)), shape=forma, dtype=matriz.dtype)
+
+    def _recalcular_vecinos(self, productos: np.ndarray) -> None:
+        """Sustituye las filas `productos` de la similitud podada."""
+        if not len(productos):
+            return
+        # Las filas se escriben en orden: `productos` debe ir ordenado
+        productos = np.sort(productos)
+        g = self._coocurrencia
+        normas = np.sqrt(g.diagonal().astype(np.float64))
+        indptr = np.zeros(g.shape[0] + 1, dtype=np.int64)
+        columnas, valores = [], []
+        for producto in productos:
+            inicio, fin = g.indptr[producto], g.indptr[producto + 1]
+            vecinos = g.indices[inicio:fin]
+            similitud = g.data[inicio:fin] / (normas[producto] * normas[vecinos])
+            otros = vecinos != producto
+            vecinos, similitud = vecinos[otros], similitud[otros]
+            if len(vecinos) > self.vecinos:
+                top = np.argpartition(-similitud, self.vecinos - 1)[: self.vecinos]
+                vecinos, similitud = vecinos[top], similitud[top]
+            columnas.append(vecinos)
+            valores.append(similitud.astype(np.float32))
+            indptr[producto + 1] = len(vecinos)
+        nuevas = sparse.csr_matrix(
+            (np.concatenate(valores), np.concatenate(columnas), np.cumsum(indptr)), shape=g.shape
+        )
+
+        conservar = np.ones(g.shape[0], dtype=np.float32)
+        conservar[productos] = 0
+        self._similitud = (sparse.diags(conservar, format="csr") @ self._similitud + nuevas).tocsr()
+        self._similitud.eliminate_zeros()
+
+    def puntajes(self, codigo: Hashable) -> Optional[np.ndarray]:
+        """Puntaje de cada producto para el cliente; None si no tiene compras."""
+        fila = self._clientes.get(normalizar_codigo(codigo))
+        if fila is None:
+            return None
+        comprados = self._compras[fila].indices
+        if not len(comprados):
+            return None
+        puntajes = np.asarray(self._similitud[comprados].sum(axis=0)).ravel()
+        puntajes[comprados] = 0
+        return puntajes
+
+    def recomendar(self, codigo: Hashable, n: int = 5) -> pd.DataFrame:
+        """Los `n` productos no comprados con mayor puntaje (columnas producto, afinidad)."""
+        puntajes = self.puntajes(codigo)
+        if puntajes is None:
+            return pd.DataFrame({"producto": pd.Series([], dtype=object), "afinidad": pd.Series([], dtype=float)})
+        candidatos = np.flatnonzero(puntajes > 0)
+        if len(candidatos) > n:
+            candidatos = candidatos[np.argpartition(-puntajes[candidatos], n - 1)[:n]]
+        candidatos = candidatos[np.argsort(-puntajes[candidatos], kind="stable")]
+        return pd.DataFrame({
+            "producto": [self._nombres[i] for i in candidatos],
+            "afinidad": puntajes[candidatos].round(3),
+        })
+
+    def principales(self, codigos: pd.Series) -> pd.Series:
+        """Primer producto de `recomendar` para cada código, calculado por lotes (None si no hay)."""
+        filas = pd.Series(_codigos_texto(codigos)).map(self._clientes).to_numpy(dtype=np.float64)
+        conocidos = np.flatnonzero(~np.isnan(filas))
+        resultado = np.full(len(filas), -1, dtype=np.int64)
+        if len(conocidos) and self._similitud.nnz:
+            compras = self._compras[filas[conocidos].astype(np.int64)]
+            puntajes = (compras.astype(np.float32) @ self._similitud).tocsr()
+            # Sin lo ya comprado ni puntajes nulos; a igualdad de puntaje, el primer producto
+            puntajes = (puntajes - puntajes.multiply(compras)).tocsr()
+            puntajes.data[puntajes.data < 0] = 0
+            puntajes.eliminate_zeros()
+            puntajes.sort_indices()
+            con_puntaje = np.diff(puntajes.indptr) > 0
+            mejores = np.asarray(puntajes.argmax(axis=1)).ravel()
+            resultado[conocidos[con_puntaje]] = mejores[con_puntaje]
+        nombres = np.asarray(self._nombres + [None], dtype=object)
+        return pd.Series(nombres[resultado], dtype=object)
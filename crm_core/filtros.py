@@ -0,0 +1,119 @@
+"""Índice de filtros de la barra lateral (zona, segmento, mes).
+
+Se construye una vez por versión del dataset. Para cada columna guarda el
+código entero de cada fila y, por cada valor, la lista ordenada de filas que
+lo tienen (en formato CSR: un único array de filas y sus offsets). Un filtro
+combinado parte de la lista más corta y descarta las filas cuyos códigos no
+coinciden en las demás columnas, así que su coste depende del tamaño del
+resultado y no del total de clientes. Los resultados materializados se
+guardan en una caché LRU indexada por la tupla de filtros.
+
+Las columnas multivalor (p. ej. los meses en que cada cliente hizo pedidos)
+se indexan a partir de pares (valor, fila) y se combinan intersecando listas.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Hashable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+# El mes no es una columna: se indexa con `indexar_pares` desde el cubo de ventas
+COLUMNAS_FILTRO = ("zona", "segmento")
+
+
+class IndiceFiltros:
+    """Listas de filas por valor y caché LRU de vistas filtradas."""
+
+    def __init__(self, df: pd.DataFrame, columnas=COLUMNAS_FILTRO, capacidad: int = 128):
+        self._df = df
+        self._n = len(df)
+        self._codigos: dict[str, np.ndarray] = {}
+        self._valores: dict[str, dict[Hashable, int]] = {}
+        self._offsets: dict[str, np.ndarray] = {}
+        self._filas: dict[str, np.ndarray] = {}
+        for columna in columnas:
+            if columna in df.columns:
+                self._indexar(columna, df[columna])
+
+        self.capacidad = capacidad
+        self._cache: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _indexar(self, columna: str, serie: pd.Series) -> None:
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            valores = serie.cat.categories
+        else:
+            codigos, valores = pd.factorize(serie, sort=True)
+        codigos = codigos.astype(np.int32)
+        conteos = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+        orden = np.argsort(codigos, kind="stable")
+        # Los nulos (-1) quedan al principio del orden y no pertenecen a ningún valor
+        nulos = len(codigos) - int(conteos.sum())
+
+        self._codigos[columna] = codigos
+        self._valores[columna] = {valor: i for i, valor in enumerate(valores) if conteos[i] > 0}
+        self._offsets[columna] = np.concatenate([[0], np.cumsum(conteos)])
+        self._filas[columna] = orden[nulos:].astype(np.int32)
+
+    def indexar_pares(self, columna: str, valores: np.ndarray, filas: np.ndarray) -> None:
+        """Indexa una columna multivalor dada como pares únicos (valor, fila)."""
+        codigos, unicos = pd.factorize(valores, sort=True)
+        orden = np.lexsort((filas, codigos))
+        conteos = np.bincount(codigos, minlength=len(unicos))
+        self._valores[columna] = {valor: i for i, valor in enumerate(unicos)}
+        self._offsets[columna] = np.concatenate([[0], np.cumsum(conteos)])
+        self._filas[columna] = np.asarray(filas)[orden].astype(np.int32)
+        with self._candado:
+            self._cache.clear()
+
+    def opciones(self, columna: str) -> list:
+        """Valores presentes en la columna, en el orden del índice."""
+        return list(self._valores.get(columna, {}))
+
+    def filas(self, filtros: Mapping[str, Optional[Hashable]]) -> np.ndarray:
+        """Posiciones (ordenadas) de las filas que cumplen todos los filtros; None = sin filtro."""
+        activos = []
+        for columna, valor in filtros.items():
+            if valor is None:
+                continue
+            codigo = self._valores[columna].get(valor)
+            if codigo is None:
+                return np.empty(0, dtype=np.int32)
+            offsets = self._offsets[columna]
+            activos.append((columna, codigo, self._filas[columna][offsets[codigo]:offsets[codigo + 1]]))
+        if not activos:
+            return np.arange(self._n, dtype=np.int32)
+
+        activos.sort(key=lambda activo: len(activo[2]))
+        filas = activos[0][2]
+        for columna, codigo, lista in activos[1:]:
+            if columna in self._codigos:
+                filas = filas[self._codigos[columna][filas] == codigo]
+            else:
+                filas = np.intersect1d(filas, lista, assume_unique=True)
+        return filas
+
+    def filtrar(self, filtros: Mapping[str, Optional[Hashable]]) -> pd.DataFrame:
+        """Vista filtrada del DataFrame; se materializa una vez por combinación de filtros."""
+        clave = tuple(sorted(filtros.items(), key=lambda item: item[0]))
+        with self._candado:
+            resultado = self._cache.get(clave)
+            if resultado is not None:
+                self._cache.move_to_end(clave)
+                self.aciertos += 1
+        if resultado is None:
+            filas = self.filas(filtros)
+            resultado = self._df if len(filas) == self._n else self._df.take(filas)
+            with self._candado:
+                self.fallos += 1
+                self._cache[clave] = resultado
+                if len(self._cache) > self.capacidad:
+                    self._cache.popitem(last=False)
+        # Copia superficial: cada sesión recibe su propio objeto sobre los mismos datos
+        return resultado.copy(deep=False)
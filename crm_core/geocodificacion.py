@@ -0,0 +1,321 @@
+"""Geocodificación por lotes y sin conexión de `clientes["direccion"]`.
+
+Las direcciones se normalizan (minúsculas, sin acentos ni números de casa,
+abreviaturas expandidas) y se parten en segmentos por comas. Cada segmento se
+compara con los nombres del nomenclátor local mediante trigramas: el producto
+de las matrices dispersas segmento×trigrama y lugar×trigrama da los trigramas
+compartidos de todos los pares a la vez, y de ahí el coeficiente de Dice. De
+los lugares que superan `UMBRAL` se elige el más específico (calle > sector >
+municipio > provincia); una calle sólo vale si su lugar padre también aparece
+en la dirección.
+
+El nomenclátor es un CSV con columnas nombre, tipo, padre, lat, lon. Los
+resultados se guardan en una caché persistente indexada por dirección
+normalizada, así cada refresco procesa sólo direcciones nuevas o cambiadas;
+la caché se descarta si cambia el nomenclátor.
+"""
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from scipy import sparse
+
+from .configuracion import DIRECTORIO_CACHE, RUTA_NOMENCLATOR
+
+UMBRAL = 0.75
+NIVELES = ("provincia", "municipio", "sector", "calle")
+TAMANO_LOTE = 5000
+# Por debajo de este número de direcciones nuevas no compensa arrancar procesos
+MINIMO_PARALELO = 20000
+
+_NUMERO_CASA = r"(#|\bno\b\.?|\bnum(?:ero)?\b\.?)\s*\d+\s*[a-z]?\b"
+_ABREVIATURAS = (
+    (r"\bc/\s*", "calle "),
+    (r"\bav(?:e|da)?\b\.?", "avenida"),
+    (r"\bens\b\.?", "ensanche"),
+    (r"\bres\b\.?", "residencial"),
+    (r"\burb\b\.?", "urbanizacion"),
+    (r"\bsto\b\.?", "santo"),
+    (r"\bdgo\b\.?", "domingo"),
+    (r"\bkm\b\.?", "kilometro"),
+)
+_PALABRAS_VACIAS = r"\b(de|del|la|las|el|los|y|al|a|sector|barrio|esquina|frente|entre)\b"
+
+_COLUMNAS = ("lat", "lon", "precision_geo", "lugar_geo", "puntaje_geo")
+
+
+def normalizar_direcciones(direcciones: pd.Series) -> pd.Series:
+    """Forma canónica de cada dirección; las comas separan segmentos."""
+    texto = (
+        direcciones.fillna("").astype(str).str.lower()
+        .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.replace(_NUMERO_CASA, " ", regex=True)
+    )
+    for patron, reemplazo in _ABREVIATURAS:
+        texto = texto.str.replace(patron, reemplazo, regex=True)
+    return (
+        texto.str.replace(r"[^a-z0-9,;]+", " ", regex=True)
+        .str.replace(_PALABRAS_VACIAS, " ", regex=True)
+        .str.replace(r"\s*[,;][\s,;]*", ",", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip(" ,")
+    )
+
+
+def _segmentos(direccion: str) -> list[str]:
+    """Partes separadas por comas y, en partes largas, ventanas de 2 y 3 palabras."""
+    segmentos = []
+    for parte in direccion.split(","):
+        palabras = parte.split()
+        if not palabras:
+            continue
+        segmentos.append(" ".join(palabras))
+        if len(palabras) > 3:
+            for ancho in (2, 3):
+                segmentos.extend(" ".join(palabras[i:i + ancho]) for i in range(len(palabras) - ancho + 1))
+    return segmentos
+
+
+def _trigramas(texto: str) -> set[str]:
+    texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class Nomenclator:
+    """Índice de trigramas sobre los nombres de lugares del nomenclátor."""
+
+    def __init__(self, lugares: pd.DataFrame, huella: str = ""):
+        self.huella = huella
+        lugares = lugares.dropna(subset=["nombre", "lat", "lon"]).reset_index(drop=True)
+        self.nombres = lugares["nombre"].astype(str).to_numpy(dtype=object)
+        normalizados = normalizar_direcciones(lugares["nombre"]).str.replace(",", " ").to_numpy(dtype=object)
+        tipos = lugares["tipo"].astype(str).str.strip().str.lower() if "tipo" in lugares.columns else None
+        self.niveles = (
+            tipos.map({tipo: i for i, tipo in enumerate(NIVELES)}).fillna(0).to_numpy(dtype=np.int8)
+            if tipos is not None else np.zeros(len(lugares), dtype=np.int8)
+        )
+        self.lat = pd.to_numeric(lugares["lat"], errors="coerce").to_numpy(dtype=np.float64)
+        self.lon = pd.to_numeric(lugares["lon"], errors="coerce").to_numpy(dtype=np.float64)
+
+        # Padre: el lugar menos específico con ese nombre
+        self.padres = np.full(len(lugares), -1, dtype=np.int64)
+        if "padre" in lugares.columns:
+            por_nombre: dict[str, int] = {}
+            for i in np.argsort(self.niveles, kind="stable"):
+                por_nombre.setdefault(normalizados[i], int(i))
+            padres = normalizar_direcciones(lugares["padre"]).str.replace(",", " ")
+            self.padres = np.array([por_nombre.get(p, -1) if p else -1 for p in padres], dtype=np.int64)
+
+        self._vocabulario: dict[str, int] = {}
+        self._matriz, self._longitudes = self._matriz_trigramas(normalizados, ampliar=True)
+
+    @classmethod
+    def cargar(cls, ruta: str = RUTA_NOMENCLATOR) -> Optional["Nomenclator"]:
+        """Lee el CSV del nomenclátor; None si no existe."""
+        try:
+            with open(ruta, "rb") as f:
+                contenido = f.read()
+        except OSError:
+            return None
+        lugares = pd.read_csv(ruta, dtype={"nombre": str, "tipo": str, "padre": str})
+        return cls(lugares, huella=hashlib.sha256(contenido).hexdigest())
+
+    def __len__(self) -> int:
+        return len(self.nombres)
+
+    def _matriz_trigramas(self, textos: Sequence[str], ampliar: bool = False):
+        """Matriz binaria texto×trigrama y número de trigramas de cada texto."""
+        filas, columnas = [], []
+        longitudes = np.empty(len(textos), dtype=np.float64)
+        for fila, texto in enumerate(textos):
+            trigramas = _trigramas(texto)
+            longitudes[fila] = len(trigramas)
+            for trigrama in trigramas:
+                columna = self._vocabulario.get(trigrama)
+                if columna is None:
+                    if not ampliar:
+                        continue
+                    columna = self._vocabulario[trigrama] = len(self._vocabulario)
+                filas.append(fila)
+                columnas.append(columna)
+        matriz = sparse.csr_matrix(
+            (np.ones(len(filas), dtype=np.float32), (filas, columnas)),
+            shape=(len(textos), len(self._vocabulario)),
+        )
+        return matriz, longitudes
+
+    def geocodificar(self, direcciones: Sequence[str]) -> pd.DataFrame:
+        """Mejor lugar de cada dirección normalizada (columnas de `_COLUMNAS`)."""
+        textos, origen = [], []
+        for i, direccion in enumerate(direcciones):
+            for segmento in _segmentos(direccion):
+                textos.append(segmento)
+                origen.append(i)
+        origen = np.asarray(origen, dtype=np.int64)
+        consultas, longitudes = self._matriz_trigramas(textos)
+
+        compartidos = (consultas @ self._matriz.T).tocoo()
+        dice = 2 * compartidos.data / (longitudes[compartidos.row] + self._longitudes[compartidos.col])
+        aceptados = dice >= UMBRAL
+        direccion = origen[compartidos.row[aceptados]]
+        lugar = compartidos.col[aceptados].astype(np.int64)
+        dice = dice[aceptados]
+
+        # Mejor puntaje por (dirección, lugar)
+        n_lugares = len(self)
+        clave = direccion * n_lugares + lugar
+        orden = np.lexsort((-dice, clave))
+        clave, dice = clave[orden], dice[orden]
+        primeros = np.concatenate([[True], clave[1:] != clave[:-1]]) if len(clave) else np.empty(0, dtype=bool)
+        clave, dice = clave[primeros], dice[primeros]
+        direccion, lugar = np.divmod(clave, n_lugares)
+
+        # Una calle exige que su padre (sector o municipio) también esté en la dirección
+        padre = self.padres[lugar]
+        con_padre = (padre >= 0) & np.isin(direccion * n_lugares + padre, clave)
+        validos = (self.niveles[lugar] != NIVELES.index("calle")) | con_padre
+        direccion, lugar, puntaje = direccion[validos], lugar[validos], (dice + 0.1 * con_padre)[validos]
+
+        # Por dirección: el lugar más específico y, dentro del nivel, el de mayor puntaje
+        orden = np.lexsort((-puntaje, -self.niveles[lugar], direccion))
+        direccion, lugar, puntaje = direccion[orden], lugar[orden], puntaje[orden]
+        mejores = np.concatenate([[True], direccion[1:] != direccion[:-1]]) if len(direccion) else np.empty(0, dtype=bool)
+        direccion, lugar, puntaje = direccion[mejores], lugar[mejores], puntaje[mejores]
+
+        n = len(direcciones)
+        resultado = pd.DataFrame({
+            "lat": np.full(n, np.nan),
+            "lon": np.full(n, np.nan),
+            "precision_geo": pd.Series([None] * n, dtype=object),
+            "lugar_geo": pd.Series([None] * n, dtype=object),
+            "puntaje_geo": np.zeros(n),
+        })
+        resultado.loc[direccion, "lat"] = self.lat[lugar]
+        resultado.loc[direccion, "lon"] = self.lon[lugar]
+        resultado.loc[direccion, "precision_geo"] = np.asarray(NIVELES, dtype=object)[self.niveles[lugar]]
+        resultado.loc[direccion, "lugar_geo"] = self.nombres[lugar]
+        resultado.loc[direccion, "puntaje_geo"] = np.minimum(puntaje, 1.0)
+        return resultado
+
+
+_NOMENCLATOR_PROCESO: Optional[Nomenclator] = None
+
+
+def _iniciar_proceso(nomenclator: Nomenclator) -> None:
+    global _NOMENCLATOR_PROCESO
+    _NOMENCLATOR_PROCESO = nomenclator
+
+
+def _geocodificar_lote(direcciones: list[str]) -> pd.DataFrame:
+    return _NOMENCLATOR_PROCESO.geocodificar(direcciones)
+
+
+def geocodificar_direcciones(
+    nomenclator: Nomenclator,
+    direcciones: Sequence[str],
+    paralelo: Optional[bool] = None,
+) -> pd.DataFrame:
+    """Geocodifica direcciones normalizadas en lotes, en varios procesos si compensa."""
+    lotes = [list(direcciones[i:i + TAMANO_LOTE]) for i in range(0, len(direcciones), TAMANO_LOTE)]
+    if not lotes:
+        return pd.DataFrame(columns=list(_COLUMNAS))
+    if paralelo is None:
+        paralelo = len(direcciones) >= MINIMO_PARALELO and (os.cpu_count() or 1) > 1
+    if paralelo and len(lotes) > 1:
+        metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context(metodo),
+            initializer=_iniciar_proceso,
+            initargs=(nomenclator,),
+        ) as pool:
+            partes = list(pool.map(_geocodificar_lote, lotes))
+    else:
+        partes = [nomenclator.geocodificar(lote) for lote in lotes]
+    return pd.concat(partes, ignore_index=True)
+
+
+def _ruta_cache(directorio: str) -> str:
+    return os.path.join(directorio, "geocodificacion.arrow")
+
+
+def leer_cache(huella: str, directorio: str = DIRECTORIO_CACHE) -> pd.DataFrame:
+    """Resultados guardados, indexados por dirección normalizada; vacío si cambió el nomenclátor."""
+    vacia = pd.DataFrame(columns=list(_COLUMNAS), index=pd.Index([], name="direccion"))
+    try:
+        tabla = feather.read_table(_ruta_cache(directorio))
+    except (OSError, pa.ArrowInvalid):
+        return vacia
+    if (tabla.schema.metadata or {}).get(b"huella", b"").decode() != huella:
+        return vacia
+    return tabla.to_pandas().set_index("direccion")
+
+
+def escribir_cache(cache: pd.DataFrame, huella: str, directorio: str = DIRECTORIO_CACHE) -> None:
+    os.makedirs(directorio, exist_ok=True)
+    tabla = pa.Table.from_pandas(cache.reset_index(), preserve_index=False)
+    tabla = tabla.replace_schema_metadata({**(tabla.schema.metadata or {}), b"huella": huella.encode()})
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    os.close(fd)
+    feather.write_feather(tabla, temporal)
+    os.replace(temporal, _ruta_cache(directorio))
+
+
+def geocodificar_clientes(
+    clientes: pd.DataFrame,
+    ruta_nomenclator: str = RUTA_NOMENCLATOR,
+    directorio: str = DIRECTORIO_CACHE,
+    paralelo: Optional[bool] = None,
+    mostrar_resumen: bool = True,
+) -> pd.DataFrame:
+    """Añade lat/lon a partir de la dirección; las coordenadas que ya trae el libro se respetan.
+
+    Sin nomenclátor devuelve los clientes sin cambios.
+    """
+    nomenclator = Nomenclator.cargar(ruta_nomenclator)
+    if nomenclator is None or "direccion" not in clientes.columns:
+        return clientes
+
+    inicio = time.perf_counter()
+    # Se normaliza cada dirección distinta una sola vez
+    codigos, crudas = pd.factorize(clientes["direccion"].fillna("").astype(str))
+    normalizadas = pd.Series(normalizar_direcciones(pd.Series(crudas)).to_numpy()[codigos], index=clientes.index)
+    cache = leer_cache(nomenclator.huella, directorio)
+    nuevas = pd.Index(pd.unique(normalizadas)).difference(cache.index)
+    if len(nuevas):
+        resultados = geocodificar_direcciones(nomenclator, list(nuevas), paralelo)
+        resultados.index = pd.Index(nuevas, name="direccion")
+        cache = pd.concat([cache, resultados]) if len(cache) else resultados
+        escribir_cache(cache, nomenclator.huella, directorio)
+
+    encontrados = cache.reindex(normalizadas.to_numpy())
+    originales, clientes = clientes, clientes.copy()
+    for columna in _COLUMNAS:
+        valores = encontrados[columna].to_numpy()
+        clientes[columna] = valores
+    # Coordenadas que ya vienen en el libro
+    if {"lat", "lon"} <= set(originales.columns):
+        lat = pd.to_numeric(originales["lat"], errors="coerce")
+        lon = pd.to_numeric(originales["lon"], errors="coerce")
+        del_libro = (lat.notna() & lon.notna()).to_numpy()
+        clientes.loc[del_libro, "lat"] = lat[del_libro]
+        clientes.loc[del_libro, "lon"] = lon[del_libro]
+        clientes.loc[del_libro, "precision_geo"] = "libro"
+        clientes.loc[del_libro, "puntaje_geo"] = 1.0
+    if mostrar_resumen:
+        con_coordenadas = clientes["lat"].notna().mean() if len(clientes) else 0.0
+        print(
+            f"[geocodificación] {normalizadas.nunique():,} direcciones, {len(nuevas):,} nuevas, "
+            f"{con_coordenadas:.0%} con coordenadas, {time.perf_counter() - inicio:.2f} s",
+            flush=True,
+        )
+    return clientes
@@ -0,0 +1,207 @@
+"""Guiones de venta y textos promocionales para muchos clientes a la vez.
+
+Las plantillas de la Guía de Ventas (una por segmento) y del texto
+promocional se rellenan columna a columna con las funciones de texto de
+Arrow, sin recorrer los clientes en Python: cada campo de la plantilla es un
+array y la plantilla entera es una concatenación elemento a elemento. Los
+productos de cada cliente salen de las tablas precalculadas de la versión
+(`productos_guion`). Como las funciones de Arrow liberan el GIL, las filas se
+reparten en partes que se rellenan en paralelo en varios hilos.
+"""
+from __future__ import annotations
+
+import os
+import string
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .filtrado_colaborativo import MotorRecomendacion
+from .indice_clientes import IndiceClientes
+from .recomendaciones import TablasRecomendacion
+
+# Un guion por segmento; el de Inactivo vale también para clientes sin segmento
+GUIONES = {
+    "Activo": (
+        "{saludo}, siempre es un placer atenderle. "
+        "Como veo que frecuenta nuestro colmado, quería comentarle sobre **{producto_recomendado}** "
+        "que está teniendo mucha aceptación. ¿Le interesaría probar una muestra o llevar una cantidad pequeña "
+        "con un **5% de descuento** por ser cliente preferencial?"
+    ),
+    "Disminuido": (
+        "{saludo}, ¡cuánto tiempo sin atenderle! "
+        "Hemos notado que antes solía comprar **{producto_mas_comprado}** con frecuencia. "
+        "Tenemos una **oferta especial** solo para usted este mes. ¿Quiere que le aparte algunas unidades "
+        "con un **10% de descuento** para que vuelva a disfrutar de nuestros productos?"
+    ),
+    "Inactivo": (
+        "{saludo}, espero que esté bien. "
+        "Nos hacía falta su visita y queríamos ofrecerle un **descuento especial del 15%** "
+        "en su próxima compra más **entrega gratuita**. ¿Qué productos necesita actualmente "
+        "para su negocio? Tenemos disponibilidad de **{producto_recomendado}** "
+        "que podría interesarle."
+    ),
+}
+PROMOCION = (
+    "{saludo}: ¡Tenemos una oferta especial para usted! 🎉\n"
+    "**{descuento}% DE DESCUENTO** en {producto_promocion}\n"
+    "⏰ Solo hasta el {validez}\n"
+    "📞 Responda a este mensaje con 'SI' para apartar su pedido\n"
+    "🚚 Oferta incluye entrega gratuita*\n"
+    "\n"
+    "*Válido para pedidos mayores a RD$2,000. Aplican términos y condiciones."
+)
+SALUDO_SIN_NOMBRE = "Estimado cliente"
+PRODUCTO_SIN_HISTORIAL = "nuestros productos más vendidos"
+# Filas mínimas por parte al repartir entre hilos
+FILAS_POR_PARTE = 5_000
+
+Campo = Union[pa.Array, pa.Scalar, str]
+
+
+def _texto(serie: pd.Series) -> pa.Array:
+    """Columna como array de texto de Arrow; los nulos se conservan.
+
+    Las categóricas convierten sólo sus categorías y las columnas de texto
+    pasan directamente; el resto se convierte valor a valor.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        return _texto(pd.Series(serie.cat.categories)).take(pa.array(codigos, mask=codigos < 0))
+    if pd.api.types.is_string_dtype(serie.dtype) and not pd.api.types.is_object_dtype(serie.dtype):
+        texto = pa.array(serie, from_pandas=True)
+        if isinstance(texto, pa.ChunkedArray):
+            texto = texto.combine_chunks()
+        return texto.cast(pa.string())
+    valores = serie.astype(object).to_numpy()
+    nulos = pd.isna(valores)
+    return pa.array(np.where(nulos, None, valores.astype(str)), type=pa.string())
+
+
+def _serie(texto: pa.Array, index: pd.Index) -> pd.Series:
+    """Serie respaldada por el array de Arrow, sin pasar por objetos Python."""
+    return pd.Series(texto.to_pandas(types_mapper=pd.ArrowDtype).array, index=index)
+
+
+def rellenar(plantilla: str, campos: Mapping[str, Campo], negritas: bool = True) -> pa.Array:
+    """Plantilla `str.format` rellenada fila a fila con arrays (o escalares) de texto.
+
+    Sin `negritas` se quitan las marcas `**` de Markdown del texto fijo.
+    """
+    partes: list[Campo] = []
+    for literal, nombre, _, _ in string.Formatter().parse(plantilla):
+        if literal:
+            partes.append(literal if negritas else literal.replace("**", ""))
+        if nombre is not None:
+            partes.append(campos[nombre])
+    return pc.binary_join_element_wise(*partes, "")
+
+
+def saludos(nombres: pa.Array) -> pa.Array:
+    """'Don/Dña' con el primer nombre de cada cliente; `SALUDO_SIN_NOMBRE` si no lo hay."""
+    limpios = pc.utf8_trim_whitespace(pc.fill_null(nombres, ""))
+    primeros = pc.replace_substring_regex(limpios, pattern=r"(?s)\s.*$", replacement="")
+    return pc.if_else(
+        pc.greater(pc.utf8_length(primeros), 0),
+        pc.binary_join_element_wise("Don/Dña ", primeros, ""),
+        SALUDO_SIN_NOMBRE,
+    )
+
+
+def productos_guion(
+    codigos: pd.Series,
+    indice: IndiceClientes,
+    recomendaciones: TablasRecomendacion,
+    recomendador: Optional[MotorRecomendacion] = None,
+) -> pd.DataFrame:
+    """Producto más comprado y producto recomendado de cada código, como en la vista 360.
+
+    El recomendado es el primero del recomendador item-item y, si no tiene,
+    el más vendido de la celda del cliente.
+    """
+    claves = indice.claves_de(codigos)
+    recomendado = recomendaciones.recomendado_principal(claves)
+    if recomendador is not None:
+        recomendado = recomendador.principales(codigos).where(lambda s: s.notna(), recomendado)
+    return pd.DataFrame({
+        "producto_mas_comprado": recomendaciones.mas_comprado(claves).to_numpy(),
+        "producto_recomendado": recomendado.to_numpy(),
+    })
+
+
+def _rellenar_parte(
+    parte: pd.DataFrame,
+    descuento: Optional[float],
+    validez: Optional[date],
+    producto_promocion: Optional[str],
+    negritas: bool,
+) -> pd.DataFrame:
+    mas_comprado = _texto(parte["producto_mas_comprado"])
+    recomendado = _texto(parte["producto_recomendado"])
+    # Sin historial vale el otro producto del cliente, y sin ninguno una frase genérica
+    campos = {
+        "saludo": saludos(_texto(parte["nombre"])),
+        "producto_mas_comprado": pc.coalesce(mas_comprado, recomendado, PRODUCTO_SIN_HISTORIAL),
+        "producto_recomendado": pc.coalesce(recomendado, mas_comprado, PRODUCTO_SIN_HISTORIAL),
+    }
+    segmentos = _texto(parte["segmento"])
+    guion = rellenar(GUIONES["Inactivo"], campos, negritas)
+    for segmento in ("Disminuido", "Activo"):
+        guion = pc.if_else(
+            pc.fill_null(pc.equal(segmentos, segmento), False), rellenar(GUIONES[segmento], campos, negritas), guion
+        )
+    resultado = pd.DataFrame({"guion": _serie(guion, parte.index)})
+    if descuento is not None and validez is not None:
+        campos["descuento"] = f"{descuento:g}"
+        campos["validez"] = validez.strftime("%d/%m/%Y")
+        campos["producto_promocion"] = producto_promocion or campos["producto_recomendado"]
+        resultado["texto_promocional"] = _serie(rellenar(PROMOCION, campos, negritas), parte.index)
+    return resultado
+
+
+def generar_guiones(
+    clientes: pd.DataFrame,
+    descuento: Optional[float] = None,
+    validez: Optional[date] = None,
+    producto_promocion: Optional[str] = None,
+    negritas: bool = False,
+    hilos: Optional[int] = None,
+) -> pd.DataFrame:
+    """Guion de venta (y texto promocional si hay `descuento` y `validez`) de cada fila.
+
+    `clientes` necesita nombre, segmento, producto_mas_comprado y
+    producto_recomendado. La promoción es del `producto_promocion` para todos
+    o, sin él, del producto recomendado de cada cliente. El resultado conserva
+    el índice de `clientes`.
+    """
+    hilos = hilos or os.cpu_count() or 1
+    n_partes = max(min(hilos, len(clientes) // FILAS_POR_PARTE), 1)
+    args = (descuento, validez, producto_promocion, negritas)
+    if n_partes == 1:
+        return _rellenar_parte(clientes, *args)
+    limites = np.linspace(0, len(clientes), n_partes + 1).astype(int)
+    partes = [clientes.iloc[inicio:fin] for inicio, fin in zip(limites[:-1], limites[1:])]
+    with ThreadPoolExecutor(max_workers=n_partes, thread_name_prefix="crm-guiones") as ejecutor:
+        return pd.concat(list(ejecutor.map(lambda parte: _rellenar_parte(parte, *args), partes)))
+
+
+def anadir_guiones(
+    bloque: pd.DataFrame,
+    indice: IndiceClientes,
+    recomendaciones: TablasRecomendacion,
+    recomendador: Optional[MotorRecomendacion] = None,
+    **promocion,
+) -> pd.DataFrame:
+    """`bloque` de clientes con su guion y, si se pide `promocion`, su texto promocional.
+
+    Pensada como `completar` de `bloques_exportacion`.
+    """
+    productos = productos_guion(bloque["codigo_cliente"], indice, recomendaciones, recomendador)
+    productos.index = bloque.index
+    textos = generar_guiones(pd.concat([bloque[["nombre", "segmento"]], productos], axis=1), **promocion)
+    return pd.concat([bloque, textos], axis=1)
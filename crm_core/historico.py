@@ -0,0 +1,665 @@
+"""Histórico de varias fuentes con los meses cerrados congelados en Parquet.
+
+Las fuentes (libros de Google Drive y ficheros .xlsx o .csv locales) se
+materializan a la vez en hilos y sólo las que cambiaron desde la última carga
+se vuelven a analizar, repartidas en un pool de procesos. Los meses cerrados
+de cada fuente se congelan en particiones Parquet inmutables (pedidos por
+`mes_pedido`, entregas por `mes_entrega`), cada una con su `ResumenClientes`;
+de una fuente sólo se guardan aparte las filas del mes abierto. Así un
+refresco vuelve a leer las particiones ya escritas, no los libros, y las
+métricas por cliente combinan el resumen acumulado de los meses cerrados con
+el de las filas abiertas en lugar de recalcularse sobre todo el histórico. La
+cadencia de compra sigue el mismo camino: el `ModeloCadencia` de los meses
+congelados se guarda con el acumulado y sólo recibe las líneas de los meses
+que se acaban de cerrar y las del mes abierto; el cubo de ventas, igual, con
+sus celdas por cliente (`cubo.celdas_por_cliente`). Los pedidos congelados aún
+no cumplidos del todo quedan fuera de esas celdas, porque una entrega posterior
+puede completarlos, y el cubo de cada versión los agrega como líneas. El
+emparejamiento de entregas guarda el de los pedidos congelados y las entregas
+congeladas que no consumieron los ya cumplidos
+(`cumplimiento.entregas_sobrantes`): cada carga sólo empareja los pedidos
+pendientes y los abiertos con esas sobrantes y las entregas abiertas.
+
+Cada fuente analizada pasa por `validacion` antes de congelar nada: las
+particiones sólo contienen filas válidas y la cuarentena de la fuente se
+guarda con sus filas abiertas. Al volver a analizar una fuente no se validan
+las filas de sus meses ya congelados (se descartarían igualmente); sus
+incidencias se conservan de la cuarentena anterior.
+
+Las particiones no se reescriben: las filas de un mes ya congelado que vuelvan
+a llegar en la misma fuente se descartan, de modo que las correcciones de meses
+cerrados no se recogen. Una fuente nueva sí aporta sus propios meses cerrados.
+
+Estructura bajo `DIRECTORIO_CACHE/historico`::
+
+    manifiesto.json                      huella y meses congelados de cada fuente
+    pedido/2024-05/<fuente>.parquet      filas de un mes cerrado de una fuente
+    resumen/pedido/2024-05/<fuente>-cliente.parquet, -mes.parquet
+    acumulado/<clave>-cliente.parquet    resumen de todas las particiones (y -mes, -cadencia, -eventos,
+                                         -cubo, -sin-cerrar, -cumplimiento y -sobrantes)
+    fuentes/<fuente>/pedido.parquet      filas abiertas (clientes y cuarentena) de la fuente
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .agregacion import ResumenClientes, meses_desde_epoch
+from .cadencia import ModeloCadencia
+from .compactacion import etiqueta_mes
+from .configuracion import DIAS_CIERRE, DIRECTORIO_CACHE, FUENTES, UMBRAL_PARALELO
+from .cubo import CeldasCongeladas, celdas_por_cliente
+from .cumplimiento import COLUMNAS as COLUMNAS_CUMPLIMIENTO, emparejar_entregas, entregas_sobrantes
+from .descarga import descargar_libro
+from .ingesta import FECHAS, HOJAS, HojasCRM, hoja_vacia, leer_csv, leer_hoja, resolver_motor
+from .pipeline import preparar_entregas, preparar_pedidos
+from .validacion import COLUMNAS_CUARENTENA, PRIMERA_FILA, cuarentena_vacia, validar_hoja
+
+# Se incrementa cuando cambia el formato de las particiones, del acumulado o del manifiesto
+FORMATO = 4
+EXTENSIONES = (".xlsx", ".csv")
+# Hoja de un CSV según el principio de su nombre
+PREFIJOS_CSV = {"pedido": "pedido", "entrega": "entregado", "cliente": "clientes"}
+# Hojas que se congelan por mes (los clientes no tienen fecha)
+HOJAS_MENSUALES = ("pedido", "entregado")
+ACUMULADOS_CONSERVADOS = 2
+# Ficheros de cada acumulado, además de su <clave>.json
+SUFIJOS_ACUMULADO = (
+    "-cliente.parquet", "-mes.parquet", "-cadencia.parquet", "-eventos.parquet", "-cubo.parquet", "-sin-cerrar.parquet",
+    "-cumplimiento.parquet", "-sobrantes.parquet",
+)
+# Clave con la que la cuarentena de una fuente se guarda junto a sus hojas
+CUARENTENA = "cuarentena"
+
+
+@dataclass(frozen=True)
+class Fuente:
+    """Un libro de Google Drive (por su id) o un fichero .xlsx/.csv local."""
+
+    ubicacion: str
+
+    @property
+    def es_local(self) -> bool:
+        return os.path.splitext(self.ubicacion)[1].lower() in EXTENSIONES
+
+    @property
+    def identificador(self) -> str:
+        """Nombre estable y apto para ficheros de la fuente."""
+        return hashlib.sha1(self.ubicacion.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class FuenteMaterializada:
+    """Una fuente con su copia local y una huella que cambia si cambia el contenido."""
+
+    fuente: Fuente
+    ruta: str
+    huella: str
+    descargado_en: float
+    obsoleto: bool = False
+
+
+@dataclass
+class Acumulado:
+    """Lo calculado sobre un conjunto de particiones congeladas, guardado junto al manifiesto."""
+
+    resumen: ResumenClientes
+    cadencia: ModeloCadencia
+    # Celdas por cliente del cubo y, fuera de ellas, posiciones de los pedidos
+    # congelados (en el orden de las particiones) aún no cumplidos del todo
+    celdas: pd.DataFrame
+    sin_cerrar: np.ndarray
+    # Emparejamiento de los pedidos congelados con las entregas congeladas y lo
+    # que queda de éstas tras cubrir los pedidos cerrados
+    cumplimiento: pd.DataFrame
+    sobrantes: pd.DataFrame
+
+
+def _emparejar_pendientes(
+    anterior: pd.DataFrame, pedidos: pd.DataFrame, pendientes: np.ndarray, entregas: pd.DataFrame
+) -> pd.DataFrame:
+    """Cumplimiento de `pedidos`: el de `anterior` para sus primeras filas y, en las
+    posiciones `pendientes`, el de emparejarlas con `entregas`."""
+    n, previas = len(pedidos), len(anterior)
+    cumplida = np.zeros(n, dtype=np.float64)
+    dias_entrega = np.full(n, np.nan, dtype=np.float32)
+    completa = np.zeros(n, dtype=bool)
+    cumplida[:previas] = anterior["cantidad_cumplida"].to_numpy()
+    dias_entrega[:previas] = anterior["dias_entrega"].to_numpy()
+    completa[:previas] = anterior["entrega_completa"].to_numpy()
+    nuevo = emparejar_entregas(pedidos.take(pendientes), entregas)
+    cumplida[pendientes] = nuevo["cantidad_cumplida"].to_numpy()
+    dias_entrega[pendientes] = nuevo["dias_entrega"].to_numpy()
+    completa[pendientes] = nuevo["entrega_completa"].to_numpy()
+    return pd.DataFrame(
+        {"cantidad_cumplida": cumplida, "dias_entrega": dias_entrega, "entrega_completa": completa},
+        index=pedidos.index,
+    )[list(COLUMNAS_CUMPLIMIENTO)]
+
+
+def fuentes_configuradas(texto: str = FUENTES) -> list[Fuente]:
+    """Fuentes de `CRM_FUENTES`, separadas por ';'."""
+    return [Fuente(parte.strip()) for parte in texto.split(";") if parte.strip()]
+
+
+def hoja_csv(ruta: str) -> str:
+    """Hoja que contiene un CSV según su nombre (pedido_2024.csv, entregas.csv, clientes.csv)."""
+    nombre = os.path.basename(ruta).lower()
+    for prefijo, hoja in PREFIJOS_CSV.items():
+        if nombre.startswith(prefijo):
+            return hoja
+    raise ValueError(f"No se reconoce la hoja del CSV {ruta}: el nombre debe empezar por {', '.join(PREFIJOS_CSV)}")
+
+
+def _materializar(fuente: Fuente, max_antiguedad: float) -> FuenteMaterializada:
+    if fuente.es_local:
+        estado = os.stat(fuente.ubicacion)
+        return FuenteMaterializada(
+            fuente=fuente,
+            ruta=fuente.ubicacion,
+            huella=f"{estado.st_size}-{estado.st_mtime_ns}",
+            # Un fichero local está al día en cuanto se comprueba
+            descargado_en=time.time(),
+        )
+    libro = descargar_libro(fuente.ubicacion, max_antiguedad=max_antiguedad)
+    return FuenteMaterializada(
+        fuente=fuente,
+        ruta=libro.ruta,
+        huella=libro.sha256,
+        descargado_en=libro.descargado_en,
+        obsoleto=libro.obsoleto,
+    )
+
+
+def materializar_fuentes(fuentes: Sequence[Fuente], max_antiguedad: float = 0) -> list[FuenteMaterializada]:
+    """Revalida (o descarga) todas las fuentes a la vez, una por hilo, conservando el orden."""
+    if len(fuentes) <= 1:
+        return [_materializar(fuente, max_antiguedad) for fuente in fuentes]
+    with ThreadPoolExecutor(max_workers=min(len(fuentes), 8), thread_name_prefix="crm-fuentes") as ejecutor:
+        return list(ejecutor.map(lambda fuente: _materializar(fuente, max_antiguedad), fuentes))
+
+
+def huella_conjunta(materializadas: Iterable[FuenteMaterializada]) -> str:
+    """Huella del conjunto de fuentes, en su orden (el orden decide qué clientes prevalecen)."""
+    texto = "\n".join(f"{m.fuente.ubicacion}\t{m.huella}" for m in materializadas)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def mes_cierre(hoy: date, dias_cierre: int = DIAS_CIERRE) -> int:
+    """Código del primer mes abierto: los anteriores se pueden congelar.
+
+    Un mes se cierra `dias_cierre` días después de terminar, para dejar margen a
+    los pedidos y entregas que se registran con retraso.
+    """
+    referencia = pd.Timestamp(hoy) - pd.Timedelta(days=dias_cierre)
+    return (referencia.year - 1970) * 12 + referencia.month - 1
+
+
+def _hojas_de(ruta: str, motor: str) -> list[str]:
+    if ruta.lower().endswith(".csv"):
+        return [hoja_csv(ruta)]
+    with pd.ExcelFile(ruta, engine=motor) as libro:
+        return [hoja for hoja in HOJAS if hoja in libro.sheet_names]
+
+
+def _leer(ruta: str, hoja: str, motor: str) -> tuple[pd.DataFrame, float]:
+    return leer_csv(ruta, hoja) if ruta.lower().endswith(".csv") else leer_hoja(ruta, hoja, motor)
+
+
+def leer_fuentes(
+    rutas: Sequence[str],
+    motor: Optional[str] = None,
+    paralelo: Optional[bool] = None,
+) -> list[dict[str, pd.DataFrame]]:
+    """Lee las hojas presentes en cada ruta; una tarea por (fuente, hoja).
+
+    Como en `leer_libro`, con `paralelo=None` se usa el pool de procesos sólo si
+    hay más de una tarea, más de un núcleo y los ficheros suman `UMBRAL_PARALELO`.
+    """
+    motor = resolver_motor(motor)
+    tareas = [(i, ruta, hoja) for i, ruta in enumerate(rutas) for hoja in _hojas_de(ruta, motor)]
+    if paralelo is None:
+        paralelo = (
+            len(tareas) > 1 and (os.cpu_count() or 1) > 1
+            and sum(os.path.getsize(ruta) for ruta in rutas) >= UMBRAL_PARALELO
+        )
+
+    resultado: list[dict[str, pd.DataFrame]] = [{} for _ in rutas]
+    if paralelo:
+        # fork evita reimportar el script principal (Streamlit) en cada proceso
+        metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        contexto = multiprocessing.get_context(metodo)
+        with ProcessPoolExecutor(max_workers=min(len(tareas), os.cpu_count() or 1), mp_context=contexto) as pool:
+            futuros = [(i, hoja, pool.submit(_leer, ruta, hoja, motor)) for i, ruta, hoja in tareas]
+            for i, hoja, futuro in futuros:
+                resultado[i][hoja] = futuro.result()[0]
+    else:
+        for i, ruta, hoja in tareas:
+            resultado[i][hoja] = _leer(ruta, hoja, motor)[0]
+    return resultado
+
+
+def _escribir_parquet(df: pd.DataFrame, ruta: str) -> None:
+    """Escribe con renombrado atómico: un lector nunca ve un fichero a medias."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(temporal, index=False)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _escribir_json(contenido: dict, ruta: str) -> None:
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(contenido, f)
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta: str) -> Optional[dict]:
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class HistoricoParticionado:
+    """Almacén de particiones mensuales y filas abiertas de varias fuentes.
+
+    `cargar(materializadas, hoy)` devuelve las hojas completas (particiones más
+    filas abiertas) con sus agregados y su cadencia por cliente, listas para
+    `ejecutar_pipeline`.
+    """
+
+    def __init__(
+        self,
+        directorio: str = os.path.join(DIRECTORIO_CACHE, "historico"),
+        dias_cierre: int = DIAS_CIERRE,
+        motor: Optional[str] = None,
+        paralelo: Optional[bool] = None,
+    ):
+        self.directorio = directorio
+        self.dias_cierre = dias_cierre
+        self.motor = motor
+        self.paralelo = paralelo
+
+    # Rutas -------------------------------------------------------------
+
+    def _ruta(self, *partes: str) -> str:
+        return os.path.join(self.directorio, *partes)
+
+    def _particion(self, hoja: str, mes: int, fuente: str) -> str:
+        return self._ruta(hoja, etiqueta_mes(mes), fuente + ".parquet")
+
+    def _resumen(self, hoja: str, mes: int, fuente: str) -> tuple[str, str]:
+        base = self._ruta("resumen", hoja, etiqueta_mes(mes), fuente)
+        return base + "-cliente.parquet", base + "-mes.parquet"
+
+    def _abiertas(self, fuente: str, hoja: str) -> str:
+        return self._ruta("fuentes", fuente, hoja + ".parquet")
+
+    def leer_manifiesto(self) -> dict:
+        manifiesto = _leer_json(self._ruta("manifiesto.json"))
+        if not manifiesto or manifiesto.get("formato") != FORMATO:
+            return {"formato": FORMATO, "fuentes": {}, "acumulado": None}
+        return manifiesto
+
+    # Congelado ---------------------------------------------------------
+
+    def _congelar(self, hoja: str, df: pd.DataFrame, fuente: str, congelados: list[int], cierre: int) -> tuple[pd.DataFrame, list[int]]:
+        """Escribe las particiones de los meses cerrados aún no congelados.
+
+        Devuelve las filas que siguen abiertas y los meses congelados ahora.
+        """
+        meses = meses_desde_epoch(df[FECHAS[hoja][0]])
+        cerrado = (meses >= 0) & (meses < cierre)
+        nuevos = np.unique(meses[cerrado & ~np.isin(meses, congelados)])
+        vacia = hoja_vacia("entregado" if hoja == "pedido" else "pedido")
+
+        def escribir(mes: int) -> None:
+            particion = df[meses == mes].reset_index(drop=True)
+            _escribir_parquet(particion, self._particion(hoja, mes, fuente))
+            resumen = (ResumenClientes.de_tablas(particion, vacia) if hoja == "pedido"
+                       else ResumenClientes.de_tablas(vacia, particion))
+            ruta_cliente, ruta_mes = self._resumen(hoja, mes, fuente)
+            _escribir_parquet(resumen.por_cliente, ruta_cliente)
+            _escribir_parquet(resumen.por_mes, ruta_mes)
+
+        with ThreadPoolExecutor(thread_name_prefix="crm-historico") as ejecutor:
+            list(ejecutor.map(escribir, [int(mes) for mes in nuevos]))
+        return df[~cerrado].reset_index(drop=True), [int(m) for m in nuevos]
+
+    # Validación --------------------------------------------------------
+
+    @staticmethod
+    def _validar(
+        hojas: dict[str, pd.DataFrame],
+        ubicacion: str,
+        congelados: dict[str, list[int]],
+        anterior: Optional[pd.DataFrame],
+    ) -> None:
+        """Valida las hojas recién leídas de una fuente, salvo las filas de sus meses ya congelados.
+
+        Esas filas se descartarían al congelar: se apartan antes de validar y de
+        la cuarentena `anterior` de la fuente se conservan sus incidencias. Cada
+        incidencia lleva el mes de su fila (`mes`, -1 si no se conoce) para poder
+        separarlas la próxima vez.
+        """
+        cuarentena = [cuarentena_vacia().assign(mes=pd.Series(dtype=np.int64))]
+        for hoja in list(hojas):
+            df = hojas[hoja]
+            fechas = df[FECHAS[hoja][0]] if FECHAS[hoja] and FECHAS[hoja][0] in df.columns else None
+            # Con la columna sin tipar (celdas que no son fecha) se valida entera
+            meses = meses_desde_epoch(fechas) if fechas is not None and pd.api.types.is_datetime64_any_dtype(fechas) else None
+            omitir = np.isin(meses, congelados.get(hoja, [])) if meses is not None else np.zeros(len(df), dtype=bool)
+            posiciones = np.flatnonzero(~omitir)
+            if omitir.any():
+                df = df.take(posiciones).reset_index(drop=True)
+                if anterior is not None:
+                    cuarentena.append(anterior[
+                        (anterior["hoja"] == hoja).to_numpy() & np.isin(anterior["mes"].to_numpy(), congelados[hoja])
+                    ])
+            hojas[hoja], apartadas = validar_hoja(df, hoja, ubicacion, filas=posiciones + PRIMERA_FILA)
+            mes = meses[apartadas["fila"].to_numpy() - PRIMERA_FILA] if meses is not None else -1
+            cuarentena.append(apartadas.assign(mes=mes))
+        hojas[CUARENTENA] = pd.concat(cuarentena, ignore_index=True)
+
+    # Resumen acumulado -------------------------------------------------
+
+    def _leer_resumen(self, clave: str) -> ResumenClientes:
+        hoja, mes, fuente = clave.split("/")
+        base = self._ruta("resumen", hoja, mes, fuente)
+        return ResumenClientes(pd.read_parquet(base + "-cliente.parquet"), pd.read_parquet(base + "-mes.parquet"))
+
+    @staticmethod
+    def _nombre_acumulado(claves: list[str]) -> str:
+        return hashlib.sha256("\n".join(claves).encode("utf-8")).hexdigest()[:16]
+
+    def _acumulado_vigente(self, claves: list[str], anterior: Optional[str]) -> bool:
+        """El acumulado anterior cubre exactamente las particiones `claves`."""
+        nombre = self._nombre_acumulado(claves)
+        return nombre == anterior and os.path.exists(self._ruta("acumulado", nombre + ".json"))
+
+    def _leer_acumulado(self, nombre: str) -> Acumulado:
+        base = self._ruta("acumulado", nombre)
+        return Acumulado(
+            resumen=ResumenClientes(pd.read_parquet(base + "-cliente.parquet"), pd.read_parquet(base + "-mes.parquet")),
+            cadencia=ModeloCadencia.desde_estado(
+                pd.read_parquet(base + "-cadencia.parquet"), pd.read_parquet(base + "-eventos.parquet")
+            ),
+            celdas=pd.read_parquet(base + "-cubo.parquet"),
+            sin_cerrar=pd.read_parquet(base + "-sin-cerrar.parquet")["fila"].to_numpy(dtype=np.int64),
+            cumplimiento=pd.read_parquet(base + "-cumplimiento.parquet"),
+            sobrantes=pd.read_parquet(base + "-sobrantes.parquet"),
+        )
+
+    def _acumulado(
+        self,
+        claves: list[str],
+        anterior: Optional[str],
+        particiones: dict[str, pd.DataFrame],
+        pedidos: pd.DataFrame,
+        entregas: pd.DataFrame,
+    ) -> tuple[Optional[Acumulado], Optional[str]]:
+        """Resumen, cadencia, cubo y emparejamiento de las particiones `claves`, partiendo del acumulado anterior.
+
+        Si el anterior cubre un subconjunto de las claves sólo se le suman los
+        resúmenes de las particiones nuevas y el modelo de cadencia recibe sus
+        pedidos; si no (una fuente dejó de usarse), el resumen combina los de
+        todas las particiones y la cadencia se rehace con las líneas de
+        `particiones`, ya leídas por `cargar`.
+
+        Las celdas del cubo y el emparejamiento se amplían sólo si además las
+        particiones nuevas son de meses posteriores a todas las anteriores: así
+        sus líneas quedan detrás de las ya acumuladas y el orden FIFO de las
+        entregas no cambia. Se emparejan los pedidos antes sin cerrar y los
+        nuevos con las entregas sobrantes y las nuevas, y las celdas reciben
+        los que quedan cumplidos y las entregas nuevas. `pedidos` y `entregas`
+        son las líneas congeladas en el orden de las claves.
+        """
+        if not claves:
+            return None, None
+        nombre = self._nombre_acumulado(claves)
+        base = self._ruta("acumulado", nombre)
+        if self._acumulado_vigente(claves, anterior):
+            return self._leer_acumulado(nombre), nombre
+
+        partes: list[ResumenClientes] = []
+        cadencia = ModeloCadencia()
+        celdas, sin_cerrar = None, np.empty(0, dtype=np.int64)
+        cumplimiento, sobrantes = emparejar_entregas(pedidos.iloc[:0], entregas.iloc[:0]), entregas.iloc[:0]
+        filas = {"pedido": 0, "entregado": 0}
+        pendientes = claves
+        previas = _leer_json(self._ruta("acumulado", f"{anterior}.json")) if anterior else None
+        if previas is not None and set(previas["claves"]) <= set(claves):
+            previo = self._leer_acumulado(anterior)
+            partes.append(previo.resumen)
+            cadencia = previo.cadencia
+            pendientes = sorted(set(claves) - set(previas["claves"]))
+            ultimo = max(clave.split("/")[1] for clave in previas["claves"])
+            if all(clave.split("/")[1] > ultimo for clave in pendientes):
+                celdas, sin_cerrar = previo.celdas, previo.sin_cerrar
+                cumplimiento, sobrantes, filas = previo.cumplimiento, previo.sobrantes, previas["filas"]
+        with ThreadPoolExecutor(thread_name_prefix="crm-historico") as ejecutor:
+            partes.extend(ejecutor.map(self._leer_resumen, pendientes))
+        resumen = ResumenClientes.combinar(partes)
+        pedidos_nuevos = [particiones[clave] for clave in pendientes if clave.startswith("pedido/")]
+        if pedidos_nuevos:
+            cadencia.actualizar(pd.concat(pedidos_nuevos, ignore_index=True))
+
+        # Las líneas de las particiones nuevas van detrás de las ya acumuladas
+        candidatos = np.concatenate([sin_cerrar, np.arange(filas["pedido"], len(pedidos), dtype=np.int64)])
+        nuevas = entregas.iloc[filas["entregado"]:]
+        residuales = pd.concat([sobrantes, nuevas], ignore_index=True)
+        cumplimiento = _emparejar_pendientes(cumplimiento, pedidos, candidatos, residuales)
+        # Un pedido cumplido (o sin cantidad que cumplir) ya no cambia con entregas posteriores
+        cerrado = (
+            cumplimiento["entrega_completa"].to_numpy(dtype=bool)
+            | ~(pedidos["cantidad"].to_numpy(dtype=np.float64) > 0)
+        )[candidatos]
+        sobrantes = entregas_sobrantes(pedidos.take(candidatos), residuales, cerrado)
+        cerrados = candidatos[cerrado]
+        celdas = celdas_por_cliente(
+            preparar_pedidos(pd.concat([pedidos.take(cerrados), cumplimiento.take(cerrados)], axis=1)),
+            preparar_entregas(nuevas),
+            celdas,
+        )
+        sin_cerrar = candidatos[~cerrado]
+
+        por_cliente, eventos = cadencia.estado()
+        _escribir_parquet(resumen.por_cliente, base + "-cliente.parquet")
+        _escribir_parquet(resumen.por_mes, base + "-mes.parquet")
+        _escribir_parquet(por_cliente, base + "-cadencia.parquet")
+        _escribir_parquet(eventos, base + "-eventos.parquet")
+        _escribir_parquet(celdas, base + "-cubo.parquet")
+        _escribir_parquet(pd.DataFrame({"fila": sin_cerrar}), base + "-sin-cerrar.parquet")
+        _escribir_parquet(cumplimiento.reset_index(drop=True), base + "-cumplimiento.parquet")
+        _escribir_parquet(sobrantes, base + "-sobrantes.parquet")
+        _escribir_json({"claves": claves, "filas": {"pedido": len(pedidos), "entregado": len(entregas)}}, base + ".json")
+        self._limpiar_acumulados(nombre)
+        return Acumulado(resumen, cadencia, celdas, sin_cerrar, cumplimiento, sobrantes), nombre
+
+    def _limpiar_acumulados(self, actual: str) -> None:
+        carpeta = self._ruta("acumulado")
+        indices = [nombre[:-5] for nombre in os.listdir(carpeta) if nombre.endswith(".json") and nombre[:-5] != actual]
+        indices.sort(key=lambda nombre: os.path.getmtime(os.path.join(carpeta, nombre + ".json")), reverse=True)
+        for nombre in indices[ACUMULADOS_CONSERVADOS - 1:]:
+            for sufijo in (".json",) + SUFIJOS_ACUMULADO:
+                try:
+                    os.remove(os.path.join(carpeta, nombre + sufijo))
+                except OSError:
+                    pass
+
+    # Carga -------------------------------------------------------------
+
+    def cargar(
+        self,
+        materializadas: Sequence[FuenteMaterializada],
+        hoy: Optional[date] = None,
+        mostrar_tiempos: bool = True,
+    ) -> HojasCRM:
+        """Hojas completas de todas las fuentes, congelando los meses que se hayan cerrado."""
+        inicio = time.perf_counter()
+        tiempos: dict[str, float] = {}
+        cierre = mes_cierre(hoy or date.today(), self.dias_cierre)
+        manifiesto = self.leer_manifiesto()
+        registros = manifiesto["fuentes"]
+
+        # Fuentes sin cambios: sus filas abiertas desde la caché; el resto se analiza
+        datos: list[Optional[dict[str, pd.DataFrame]]] = []
+        for m in materializadas:
+            registro = registros.get(m.fuente.identificador)
+            rutas = [self._abiertas(m.fuente.identificador, hoja) for hoja in registro["hojas"]] if registro else []
+            if registro and registro["huella"] == m.huella and all(os.path.exists(r) for r in rutas):
+                datos.append({hoja: pd.read_parquet(ruta) for hoja, ruta in zip(registro["hojas"], rutas)})
+            else:
+                datos.append(None)
+        cambiadas = [i for i, d in enumerate(datos) if d is None]
+        marca = time.perf_counter()
+        leidas = leer_fuentes([materializadas[i].ruta for i in cambiadas], self.motor, self.paralelo)
+        for i, hojas in zip(cambiadas, leidas):
+            fuente = materializadas[i].fuente
+            registro = registros.get(fuente.identificador)
+            ruta = self._abiertas(fuente.identificador, CUARENTENA)
+            anterior = pd.read_parquet(ruta) if registro and CUARENTENA in registro["hojas"] and os.path.exists(ruta) else None
+            self._validar(hojas, fuente.ubicacion, registro["congelados"] if registro else {}, anterior)
+            datos[i] = hojas
+        tiempos["lectura"] = time.perf_counter() - marca
+
+        # Congelar los meses cerrados y guardar lo que queda abierto de cada fuente
+        marca = time.perf_counter()
+        nuevos_registros = {}
+        for i, (m, hojas) in enumerate(zip(materializadas, datos)):
+            identificador = m.fuente.identificador
+            anterior = registros.get(identificador, {})
+            congelados = {hoja: list(anterior.get("congelados", {}).get(hoja, [])) for hoja in HOJAS_MENSUALES}
+            cambios = i in cambiadas
+            for hoja in HOJAS_MENSUALES:
+                if hoja not in hojas:
+                    continue
+                hojas[hoja], nuevos = self._congelar(hoja, hojas[hoja], identificador, congelados[hoja], cierre)
+                congelados[hoja] = sorted(congelados[hoja] + nuevos)
+                cambios = cambios or bool(nuevos)
+            if cambios:
+                for hoja, df in hojas.items():
+                    _escribir_parquet(df, self._abiertas(identificador, hoja))
+            nuevos_registros[identificador] = {
+                "ubicacion": m.fuente.ubicacion,
+                "huella": m.huella,
+                "hojas": sorted(hojas),
+                "congelados": congelados,
+            }
+        tiempos["congelado"] = time.perf_counter() - marca
+
+        # Particiones de las fuentes en uso, leídas en paralelo (pyarrow libera el GIL)
+        marca = time.perf_counter()
+        claves = sorted(
+            f"{hoja}/{etiqueta_mes(mes)}/{identificador}"
+            for identificador, registro in nuevos_registros.items()
+            for hoja in HOJAS_MENSUALES
+            for mes in registro["congelados"][hoja]
+        )
+        with ThreadPoolExecutor(thread_name_prefix="crm-historico") as ejecutor:
+            particiones = list(ejecutor.map(lambda clave: pd.read_parquet(self._ruta(clave + ".parquet")), claves))
+        tablas, abiertas = {}, {}
+        for hoja in HOJAS_MENSUALES:
+            abiertas[hoja] = [hojas[hoja] for hojas in datos if hoja in hojas]
+            partes = [df for clave, df in zip(claves, particiones) if clave.startswith(hoja + "/")]
+            partes += abiertas[hoja]
+            tablas[hoja] = pd.concat(partes, ignore_index=True) if partes else hoja_vacia(hoja)
+            abiertas[hoja] = pd.concat(abiertas[hoja], ignore_index=True) if abiertas[hoja] else hoja_vacia(hoja)
+        clientes = [hojas["clientes"] for hojas in datos if "clientes" in hojas]
+        if clientes:
+            # Un cliente repetido en varias fuentes queda con los datos de la última
+            clientes = pd.concat(clientes, ignore_index=True)
+            repetidos = clientes["codigo_cliente"].notna() & clientes.duplicated("codigo_cliente", keep="last")
+            clientes = clientes[~repetidos].reset_index(drop=True)
+        else:
+            clientes = hoja_vacia("clientes")
+        tiempos["parquet"] = time.perf_counter() - marca
+
+        # Agregados, cadencia, cubo y emparejamiento: acumulado de las particiones más las filas abiertas
+        marca = time.perf_counter()
+        congeladas = {
+            hoja: sum(len(df) for clave, df in zip(claves, particiones) if clave.startswith(hoja + "/"))
+            for hoja in HOJAS_MENSUALES
+        }
+        acumulado, nombre = self._acumulado(
+            claves, manifiesto.get("acumulado"), dict(zip(claves, particiones)),
+            tablas["pedido"].iloc[:congeladas["pedido"]], tablas["entregado"].iloc[:congeladas["entregado"]],
+        )
+        tiempos["acumulado"] = time.perf_counter() - marca
+
+        # Sólo se emparejan los pedidos congelados sin cerrar y los abiertos
+        marca = time.perf_counter()
+        if acumulado is not None:
+            cumplimiento = _emparejar_pendientes(
+                acumulado.cumplimiento,
+                tablas["pedido"],
+                np.concatenate([
+                    acumulado.sin_cerrar, np.arange(congeladas["pedido"], len(tablas["pedido"]), dtype=np.int64)
+                ]),
+                pd.concat([acumulado.sobrantes, abiertas["entregado"]], ignore_index=True),
+            )
+        else:
+            cumplimiento = emparejar_entregas(tablas["pedido"], tablas["entregado"])
+        tiempos["cumplimiento"] = time.perf_counter() - marca
+
+        # Las filas abiertas se suman al resumen y a la cadencia acumulados
+        marca = time.perf_counter()
+        resumen = ResumenClientes.de_tablas(abiertas["pedido"], abiertas["entregado"])
+        if acumulado is not None:
+            resumen = ResumenClientes.combinar([acumulado.resumen, resumen])
+        agregados = resumen.agregados()
+        # El modelo leído o recién guardado es propio de esta carga: se puede ampliar con las abiertas
+        cadencia = (acumulado.cadencia if acumulado is not None else ModeloCadencia()).actualizar(abiertas["pedido"])
+        congelado = None
+        if acumulado is not None:
+            en_celdas = np.arange(len(tablas["pedido"])) < congeladas["pedido"]
+            en_celdas[acumulado.sin_cerrar] = False
+            congelado = CeldasCongeladas(
+                acumulado.celdas, en_celdas, np.arange(len(tablas["entregado"])) < congeladas["entregado"]
+            )
+        tiempos["agregados"] = time.perf_counter() - marca
+
+        _escribir_json(
+            {"formato": FORMATO, "fuentes": {**registros, **nuevos_registros}, "acumulado": nombre},
+            self._ruta("manifiesto.json"),
+        )
+        tiempos["total"] = time.perf_counter() - inicio
+        hojas = HojasCRM(
+            pedidos=tablas["pedido"],
+            entregas=tablas["entregado"],
+            clientes=clientes,
+            tiempos=tiempos,
+            motor=f"{resolver_motor(self.motor)} ({len(cambiadas)}/{len(materializadas)} fuentes leídas, "
+                  f"{len(claves)} particiones)",
+            agregados=agregados,
+            cadencia=cadencia,
+            cumplimiento=cumplimiento,
+            congelado=congelado,
+            cuarentena=pd.concat(
+                [cuarentena_vacia()] + [hojas[CUARENTENA] for hojas in datos if CUARENTENA in hojas], ignore_index=True
+            )[list(COLUMNAS_CUARENTENA)],
+            validadas=True,
+        )
+        if mostrar_tiempos:
+            print(hojas.resumen_tiempos(), flush=True)
+        return hojas
@@ -0,0 +1,107 @@
+"""Índice por cliente para la vista 360 de la pestaña Clientes.
+
+Se construye una vez por versión del dataset: un diccionario de código
+normalizado a fila de `clientes` y, para `pedidos` y `entregas`, las filas de
+cada cliente contiguas en un único array con sus offsets (formato CSR). Cargar
+un cliente cuesta lo que sus propias filas, no un recorrido de las tablas.
+"""
+from __future__ import annotations
+
+from typing import Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar_codigo(codigo: Hashable) -> str:
+    """Código de cliente como texto sin espacios alrededor."""
+    return str(codigo).strip()
+
+
+def _normalizar(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).str.strip()
+
+
+class _Agrupacion:
+    """Filas de una tabla agrupadas por cliente: `filas[offsets[k]:offsets[k + 1]]`."""
+
+    def __init__(self, df: pd.DataFrame, codigos: pd.Index):
+        self.df = df
+        if "codigo_cliente" in df.columns and len(df):
+            claves = codigos.get_indexer(_normalizar(df["codigo_cliente"]))
+        else:
+            claves = np.empty(0, dtype=np.intp)
+        conteos = np.bincount(claves[claves >= 0], minlength=len(codigos))
+        orden = np.argsort(claves, kind="stable")
+        # Filas de clientes desconocidos (-1) quedan al principio y se descartan
+        descartadas = len(claves) - int(conteos.sum())
+        self.filas = orden[descartadas:].astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+
+    def de(self, clave: int) -> pd.DataFrame:
+        return self.df.take(self.filas[self.offsets[clave]:self.offsets[clave + 1]])
+
+    def claves(self) -> np.ndarray:
+        """Clave de cliente de cada posición de `filas`."""
+        return np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+
+
+class IndiceClientes:
+    """Acceso directo a un cliente y a sus pedidos y entregas."""
+
+    def __init__(self, clientes: pd.DataFrame, pedidos: pd.DataFrame, entregas: pd.DataFrame):
+        self._clientes = clientes
+        normalizados = _normalizar(clientes["codigo_cliente"]).to_numpy(dtype=object)
+        codigos, primeras = np.unique(normalizados, return_index=True)
+        self._codigos = pd.Index(codigos)
+        # Con códigos repetidos vale la primera fila, como el filtrado anterior con iloc[0]
+        self._primera_fila = primeras
+        self._claves = {codigo: clave for clave, codigo in enumerate(codigos)}
+        self._pedidos = _Agrupacion(pedidos, self._codigos)
+        self._entregas = _Agrupacion(entregas, self._codigos)
+
+    def __len__(self) -> int:
+        return len(self._claves)
+
+    def __contains__(self, codigo: Hashable) -> bool:
+        return normalizar_codigo(codigo) in self._claves
+
+    def clave(self, codigo: Hashable) -> Optional[int]:
+        return self._claves.get(normalizar_codigo(codigo))
+
+    @property
+    def filas_clientes(self) -> np.ndarray:
+        """Fila de `clientes` de cada clave."""
+        return self._primera_fila
+
+    def lineas_pedido(self) -> tuple[np.ndarray, np.ndarray]:
+        """(clave de cliente, fila de `pedidos`) de cada línea con cliente conocido."""
+        return self._pedidos.claves(), self._pedidos.filas
+
+    def claves_de(self, codigos: pd.Series) -> np.ndarray:
+        """Clave de cada código de la serie; -1 si el cliente no existe."""
+        # Se normalizan los valores distintos, no cada línea
+        posiciones, valores = pd.factorize(codigos)
+        claves = self._codigos.get_indexer(_normalizar(pd.Series(valores, dtype=object))).astype(np.int32)
+        return np.r_[claves, np.int32(-1)][posiciones]
+
+    def cliente(self, codigo: Hashable) -> Optional[pd.Series]:
+        """Fila de `clientes` del código; None si no existe."""
+        clave = self.clave(codigo)
+        if clave is None:
+            return None
+        return self._clientes.iloc[self._primera_fila[clave]]
+
+    def pedidos(self, codigo: Hashable) -> pd.DataFrame:
+        """Líneas de pedido del cliente en su orden original."""
+        clave = self.clave(codigo)
+        if clave is None:
+            return self._pedidos.df.iloc[:0]
+        return self._pedidos.de(clave)
+
+    def entregas(self, codigo: Hashable) -> pd.DataFrame:
+        """Líneas de entrega del cliente en su orden original."""
+        clave = self.clave(codigo)
+        if clave is None:
+            return self._entregas.df.iloc[:0]
+        return self._entregas.de(clave)
@@ -0,0 +1,191 @@
+"""Lectura del libro de Excel: una sola apertura, hojas en paralelo y tipos explícitos.
+
+Cada hoja se lee con un esquema fijo de tipos y las fechas con un formato
+conocido, de modo que ni el lector ni `pd.to_datetime` tengan que inferirlos.
+Las columnas numéricas y las fechas que no se pueden interpretar no hacen
+fallar la lectura: llegan tal cual a `validacion`, que aparta las filas malas.
+Con libros grandes las hojas se reparten en un pool de procesos; cada proceso
+abre el fichero y analiza únicamente el XML de su hoja.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+from typing import Optional
+
+import pandas as pd
+
+from .cadencia import ModeloCadencia
+from .configuracion import FORMATO_FECHA, MOTOR_EXCEL, UMBRAL_PARALELO
+from .cubo import CeldasCongeladas
+
+HOJAS = ("pedido", "entregado", "clientes")
+
+# Tipos por columna; las que no existan en la hoja se ignoran. Sólo las de texto
+# se fijan al leer; las numéricas las convierte `validacion.validar_hoja`
+ESQUEMAS = {
+    "pedido": {
+        "codigo_cliente": str,
+        "codigo_producto": str,
+        "producto": str,
+        "vendedor": str,
+        "cantidad": "float64",
+        "precio_unitario": "float64",
+    },
+    "entregado": {
+        "codigo_cliente": str,
+        "codigo_producto": str,
+        "producto": str,
+        "cantidad": "float64",
+    },
+    "clientes": {
+        "codigo_cliente": str,
+        "nombre": str,
+        "telefono": str,
+        "direccion": str,
+        "tipo_negocio": str,
+        "quien_atiende": str,
+        "zona": str,
+    },
+}
+
+FECHAS = {
+    "pedido": ("fecha_pedido",),
+    "entregado": ("fecha_entrega",),
+    "clientes": (),
+}
+
+
+@dataclass
+class HojasCRM:
+    """Las tres hojas del libro ya tipadas, con el tiempo de lectura de cada una."""
+
+    pedidos: pd.DataFrame
+    entregas: pd.DataFrame
+    clientes: pd.DataFrame
+    tiempos: dict[str, float] = field(default_factory=dict)
+    motor: str = ""
+    # Métricas por cliente ya calculadas por quien leyó las hojas (histórico particionado)
+    agregados: Optional[pd.DataFrame] = None
+    # Cadencia de compra con todos los pedidos de las hojas, ídem
+    cadencia: Optional[ModeloCadencia] = None
+    # Emparejamiento de `pedidos` con `entregas` (ver `cumplimiento.emparejar_entregas`), ídem
+    cumplimiento: Optional[pd.DataFrame] = None
+    # Celdas del cubo de ventas de las líneas de meses congelados
+    congelado: Optional[CeldasCongeladas] = None
+    # Filas apartadas por la validación (ver `validacion.COLUMNAS_CUARENTENA`)
+    cuarentena: Optional[pd.DataFrame] = None
+    # Las hojas ya pasaron por `validacion` (el histórico valida cada fuente al leerla)
+    validadas: bool = False
+
+    def resumen_tiempos(self) -> str:
+        filas = {"pedido": len(self.pedidos), "entregado": len(self.entregas), "clientes": len(self.clientes)}
+        lineas = [
+            f"  {hoja:<10} {segundos:7.3f} s" + (f"  {filas[hoja]:>9,} filas" if hoja in filas else "")
+            for hoja, segundos in self.tiempos.items()
+        ]
+        return f"[ingesta] motor={self.motor}\n" + "\n".join(lineas)
+
+
+def resolver_motor(motor: Optional[str] = None) -> str:
+    """Devuelve el motor a usar; 'auto' elige calamine si está instalado."""
+    motor = (motor or MOTOR_EXCEL).lower()
+    if motor == "auto":
+        return "calamine" if find_spec("python_calamine") else "openpyxl"
+    return motor
+
+
+def tipos_lectura(hoja: str) -> dict:
+    """Tipos que se fijan al leer `hoja`: sólo los de texto, que no pueden fallar."""
+    return {columna: tipo for columna, tipo in ESQUEMAS[hoja].items() if tipo is str}
+
+
+def tipar_fechas(df: pd.DataFrame, columnas, formato: str = FORMATO_FECHA) -> pd.DataFrame:
+    """Convierte columnas de fecha con formato explícito.
+
+    Las celdas con fecha nativa de Excel ya llegan como datetime64 y no se tocan;
+    el texto se interpreta con `formato` y sólo si no encaja se recurre a inferir.
+    Si alguna celda no se puede interpretar la columna se deja como está y
+    `validacion` pone en cuarentena esas filas.
+    """
+    for columna in columnas:
+        if columna not in df.columns or pd.api.types.is_datetime64_any_dtype(df[columna]):
+            continue
+        try:
+            df[columna] = pd.to_datetime(df[columna], format=formato)
+        except (ValueError, TypeError):
+            try:
+                df[columna] = pd.to_datetime(df[columna], format="mixed", dayfirst=True)
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def leer_hoja(fuente, hoja: str, motor: str) -> tuple[pd.DataFrame, float]:
+    """Lee una hoja con su esquema; devuelve el DataFrame y los segundos empleados."""
+    inicio = time.perf_counter()
+    df = pd.read_excel(fuente, sheet_name=hoja, engine=motor, dtype=tipos_lectura(hoja))
+    df = tipar_fechas(df, FECHAS[hoja])
+    return df, time.perf_counter() - inicio
+
+
+def leer_csv(ruta: str, hoja: str) -> tuple[pd.DataFrame, float]:
+    """Lee un CSV con el esquema de `hoja`; devuelve el DataFrame y los segundos empleados."""
+    inicio = time.perf_counter()
+    df = pd.read_csv(ruta, dtype=tipos_lectura(hoja))
+    df = tipar_fechas(df, FECHAS[hoja])
+    return df, time.perf_counter() - inicio
+
+
+def hoja_vacia(hoja: str) -> pd.DataFrame:
+    """Hoja sin filas con las columnas y tipos del esquema, para fuentes que no la traen."""
+    df = pd.DataFrame({columna: pd.Series(dtype=tipo) for columna, tipo in ESQUEMAS[hoja].items()})
+    for columna in FECHAS[hoja]:
+        df[columna] = pd.Series(dtype="datetime64[ns]")
+    return df
+
+
+def leer_libro(
+    ruta: str,
+    motor: Optional[str] = None,
+    paralelo: Optional[bool] = None,
+    mostrar_tiempos: bool = True,
+) -> HojasCRM:
+    """Lee las hojas pedido, entregado y clientes del libro en `ruta`.
+
+    Con `paralelo=None` se usa el pool de procesos sólo si hay más de un núcleo
+    y el libro supera `UMBRAL_PARALELO` bytes; para libros pequeños arrancar
+    procesos cuesta más de lo que ahorra.
+    """
+    motor = resolver_motor(motor)
+    if paralelo is None:
+        paralelo = os.path.getsize(ruta) >= UMBRAL_PARALELO and (os.cpu_count() or 1) > 1
+
+    inicio = time.perf_counter()
+    if paralelo:
+        # fork evita reimportar el script principal (Streamlit) en cada proceso
+        metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        contexto = multiprocessing.get_context(metodo)
+        with ProcessPoolExecutor(max_workers=len(HOJAS), mp_context=contexto) as pool:
+            futuros = {hoja: pool.submit(leer_hoja, ruta, hoja, motor) for hoja in HOJAS}
+            resultados = {hoja: futuro.result() for hoja, futuro in futuros.items()}
+    else:
+        with pd.ExcelFile(ruta, engine=motor) as libro:
+            resultados = {hoja: leer_hoja(libro, hoja, motor) for hoja in HOJAS}
+
+    tiempos = {hoja: segundos for hoja, (_, segundos) in resultados.items()}
+    tiempos["total"] = time.perf_counter() - inicio
+    hojas = HojasCRM(
+        pedidos=resultados["pedido"][0],
+        entregas=resultados["entregado"][0],
+        clientes=resultados["clientes"][0],
+        tiempos=tiempos,
+        motor=motor + (" (paralelo)" if paralelo else ""),
+    )
+    if mostrar_tiempos:
+        print(hojas.resumen_tiempos(), flush=True)
+    return hojas
@@ -0,0 +1,393 @@
+"""Cola diaria de llamadas por zona (vendedor), priorizada y compartida por los agentes.
+
+La prioridad de cada cliente combina su segmento, su atraso respecto a su
+ritmo de compra, su valor dentro de la zona y el tiempo desde el último
+contacto. La parte fija se calcula una vez por versión del dataset, en bloque;
+el último contacto se lee del registro de llamadas.
+
+Cada zona tiene un montículo (heap) de clientes por prioridad: el siguiente
+cliente sale en O(log n). Al registrar una llamada no se recalcula nada: el
+cliente recibe una nueva entrada (o ninguna, si ya no toca llamarle hoy) y la
+anterior queda obsoleta y se descarta al llegar a la cima. Los clientes que
+deben volver a intentarse más tarde esperan en un segundo montículo por hora.
+
+Las llamadas y las reservas (el cliente que cada agente tiene en curso) se
+guardan en SQLite, de modo que sobreviven a reinicios y se comparten entre
+procesos: cada proceso aplica las llamadas nuevas del registro antes de
+entregar el siguiente cliente, y una reserva sólo se concede si ningún otro
+agente tiene al cliente apartado.
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .compactacion import codigos_y_valores
+from .configuracion import RUTA_LLAMADAS
+from .indice_clientes import normalizar_codigo
+
+# Resultado de una llamada -> etiqueta
+RESULTADOS = {
+    "pedido": "Hizo pedido",
+    "no_interesado": "No interesado",
+    "no_contesta": "No contesta",
+    "volver_a_llamar": "Volver a llamar",
+}
+# Resultados que devuelven al cliente a la cola del día pasados `REINTENTO` segundos, y con qué fracción de su prioridad
+REINTENTAR = {"no_contesta": 0.5, "volver_a_llamar": 1.0}
+REINTENTO = 2 * 3600
+# Segundos que un cliente queda apartado para el agente que lo tomó
+RESERVA = 15 * 60
+
+# Componentes de la prioridad
+PESOS_SEGMENTO = {"Disminuido": 3.0, "Inactivo": 2.0, "Activo": 1.0}
+PESO_ATRASO = 2.0
+PESO_VALOR = 2.0
+# Atraso (en escalas de dispersión) a partir del cual el componente de atraso es máximo
+ATRASO_MAXIMO = 5.0
+# Sin cadencia: días sin comprar a partir de los cuales el atraso es máximo
+DIAS_ATRASO_MAXIMO = 90.0
+# Días tras un contacto hasta recuperar la prioridad completa
+DIAS_RECUPERACION = 7.0
+
+
+def prioridad_base(clientes: pd.DataFrame) -> np.ndarray:
+    """Prioridad de cada fila de `clientes` sin contar los contactos.
+
+    Segmento (Disminuido > Inactivo > Activo), atraso en escalas de dispersión
+    (sin cadencia, días sin comprar) y percentil de `valor_cliente` en su zona.
+    """
+    segmento = clientes["segmento"].astype(object).map(PESOS_SEGMENTO).fillna(PESOS_SEGMENTO["Inactivo"])
+    atraso = np.full(len(clientes), np.nan)
+    if "puntaje_atraso" in clientes.columns:
+        atraso = np.clip(clientes["puntaje_atraso"].to_numpy(dtype=np.float64), 0, ATRASO_MAXIMO) / ATRASO_MAXIMO
+    if "dias_sin_compra" in clientes.columns:
+        recencia = np.clip(clientes["dias_sin_compra"].to_numpy(dtype=np.float64), 0, DIAS_ATRASO_MAXIMO) / DIAS_ATRASO_MAXIMO
+        atraso = np.where(np.isnan(atraso), recencia, atraso)
+    valor = clientes.groupby("zona", observed=True, sort=False)["valor_cliente"].rank(pct=True)
+    return (
+        segmento.to_numpy(dtype=np.float64)
+        + PESO_ATRASO * np.nan_to_num(atraso)
+        + PESO_VALOR * valor.reindex(clientes.index).fillna(0).to_numpy(dtype=np.float64)
+    )
+
+
+def _inicio_dia(ahora: float) -> float:
+    return datetime.combine(datetime.fromtimestamp(ahora).date(), datetime.min.time()).timestamp()
+
+
+class RegistroLlamadas:
+    """Registro de llamadas y reservas en SQLite, con una conexión por hilo."""
+
+    def __init__(self, ruta: str = RUTA_LLAMADAS):
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._local = threading.local()
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS llamadas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codigo_cliente TEXT NOT NULL,
+                zona TEXT,
+                agente TEXT NOT NULL,
+                resultado TEXT NOT NULL,
+                registrada_en REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS llamadas_cliente ON llamadas (codigo_cliente, registrada_en);
+            CREATE TABLE IF NOT EXISTS reservas (
+                codigo_cliente TEXT PRIMARY KEY,
+                agente TEXT NOT NULL,
+                expira REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reservas_agente ON reservas (agente);
+        """)
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            # Sin transacción implícita: cada sentencia se confirma sola salvo en los BEGIN explícitos
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def registrar(self, codigo: Hashable, zona: Optional[str], agente: str, resultado: str,
+                  ahora: Optional[float] = None) -> int:
+        """Guarda una llamada, libera la reserva del cliente y devuelve el id de la llamada."""
+        if resultado not in RESULTADOS:
+            raise ValueError(f"Resultado de llamada desconocido: {resultado}")
+        codigo = normalizar_codigo(codigo)
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conexion.execute(
+                "INSERT INTO llamadas (codigo_cliente, zona, agente, resultado, registrada_en) VALUES (?, ?, ?, ?, ?)",
+                (codigo, zona, agente, resultado, ahora or time.time()),
+            )
+            conexion.execute("DELETE FROM reservas WHERE codigo_cliente = ?", (codigo,))
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return int(cursor.lastrowid)
+
+    def ultimo_id(self) -> int:
+        return int(self._conexion().execute("SELECT COALESCE(MAX(id), 0) FROM llamadas").fetchone()[0])
+
+    def desde(self, id_llamada: int) -> list[tuple[int, str, str, float]]:
+        """(id, código, resultado, hora) de las llamadas posteriores a `id_llamada`, en orden."""
+        return self._conexion().execute(
+            "SELECT id, codigo_cliente, resultado, registrada_en FROM llamadas WHERE id > ? ORDER BY id",
+            (id_llamada,),
+        ).fetchall()
+
+    def ultimos_contactos(self) -> pd.DataFrame:
+        """Hora y resultado de la última llamada de cada cliente, indexados por código."""
+        # En SQLite, con MAX() las columnas sin agregar salen de la fila del máximo
+        filas = self._conexion().execute(
+            "SELECT codigo_cliente, MAX(registrada_en), resultado FROM llamadas GROUP BY codigo_cliente"
+        ).fetchall()
+        return pd.DataFrame(filas, columns=["codigo_cliente", "registrada_en", "resultado"]).set_index("codigo_cliente")
+
+    def historial(self, codigo: Hashable, n: int = 5) -> pd.DataFrame:
+        """Las `n` últimas llamadas del cliente, la más reciente primero."""
+        filas = self._conexion().execute(
+            "SELECT registrada_en, agente, resultado FROM llamadas WHERE codigo_cliente = ? "
+            "ORDER BY registrada_en DESC LIMIT ?",
+            (normalizar_codigo(codigo), n),
+        ).fetchall()
+        historial = pd.DataFrame(filas, columns=["registrada_en", "agente", "resultado"])
+        historial["registrada_en"] = pd.to_datetime(historial["registrada_en"].map(datetime.fromtimestamp))
+        return historial
+
+    def reservar(self, codigo: str, agente: str, ahora: float, duracion: float = RESERVA) -> bool:
+        """Aparta el cliente para el agente si nadie más lo tiene; el agente suelta su reserva anterior."""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute("DELETE FROM reservas WHERE agente = ? AND codigo_cliente <> ?", (agente, codigo))
+            cursor = conexion.execute(
+                "INSERT INTO reservas (codigo_cliente, agente, expira) VALUES (?, ?, ?) "
+                "ON CONFLICT (codigo_cliente) DO UPDATE SET agente = excluded.agente, expira = excluded.expira "
+                "WHERE reservas.expira < ? OR reservas.agente = excluded.agente",
+                (codigo, agente, ahora + duracion, ahora),
+            )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def reserva_de(self, agente: str, ahora: float) -> Optional[str]:
+        """Cliente que el agente tiene apartado, si la reserva no expiró."""
+        fila = self._conexion().execute(
+            "SELECT codigo_cliente FROM reservas WHERE agente = ? AND expira >= ?", (agente, ahora)
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def reserva_del_cliente(self, codigo: str, ahora: float) -> Optional[tuple[str, float]]:
+        """(agente, expira) de la reserva vigente del cliente, si la hay."""
+        fila = self._conexion().execute(
+            "SELECT agente, expira FROM reservas WHERE codigo_cliente = ? AND expira >= ?", (codigo, ahora)
+        ).fetchone()
+        return (fila[0], fila[1]) if fila else None
+
+    def liberar(self, agente: str) -> None:
+        self._conexion().execute("DELETE FROM reservas WHERE agente = ?", (agente,))
+
+
+class ColasLlamadas:
+    """Colas diarias por zona sobre una versión de `clientes`, al día con el registro de llamadas."""
+
+    def __init__(self, clientes: pd.DataFrame, registro: RegistroLlamadas, ahora: Optional[float] = None):
+        self._clientes = clientes
+        self.registro = registro
+        codigos = clientes["codigo_cliente"].astype(str).str.strip().to_numpy(dtype=object)
+        unicos, primeras = np.unique(codigos, return_index=True)
+        # Con códigos repetidos vale la primera fila, como en el índice de clientes
+        self._filas = dict(zip(unicos, primeras))
+        self._primera = np.zeros(len(codigos), dtype=bool)
+        self._primera[primeras] = True
+        self._codigos = codigos
+        self._zonas, self.zonas = codigos_y_valores(clientes["zona"])
+        self._base = prioridad_base(clientes)
+        # Reservas conocidas en este proceso: fila -> (agente, expira), y la fila de cada agente
+        self._reservas: dict[int, tuple[str, float]] = {}
+        self._reserva_agente: dict[str, int] = {}
+        self._candado = threading.Lock()
+        self._construir(ahora or time.time())
+
+    def _construir(self, ahora: float) -> None:
+        """Colas completas a partir de los últimos contactos: O(n) con heapify."""
+        n = len(self._clientes)
+        self.dia = datetime.fromtimestamp(ahora).date()
+        self._ultimo_id = self.registro.ultimo_id()
+        contactos = self.registro.ultimos_contactos().reindex(self._codigos)
+        self._contacto = contactos["registrada_en"].to_numpy(dtype=np.float64, copy=True)
+        self._resultado = contactos["resultado"].to_numpy(dtype=object, copy=True)
+        self._version = np.zeros(n, dtype=np.int64)
+        # Filas con una entrada vigente en la cola o en espera
+        self._en_cola = np.zeros(n, dtype=bool)
+
+        prioridad, disponible = self._prioridades(np.arange(n), ahora)
+        validas = ~np.isnan(prioridad) & (self._zonas >= 0) & self._primera
+        self._en_cola[validas] = True
+        self._colas: dict[int, list] = {}
+        self._esperas: dict[int, list] = {}
+        for zona in range(len(self.zonas)):
+            en_zona = validas & (self._zonas == zona)
+            cola = np.flatnonzero(en_zona & (disponible <= ahora))
+            espera = np.flatnonzero(en_zona & (disponible > ahora))
+            self._colas[zona] = list(zip((-prioridad[cola]).tolist(), [0] * len(cola), cola.tolist()))
+            self._esperas[zona] = list(zip(
+                disponible[espera].tolist(), (-prioridad[espera]).tolist(), [0] * len(espera), espera.tolist()
+            ))
+            heapq.heapify(self._colas[zona])
+            heapq.heapify(self._esperas[zona])
+
+    def _prioridades(self, filas: np.ndarray, ahora: float) -> tuple[np.ndarray, np.ndarray]:
+        """(prioridad, disponible desde) de las filas; prioridad NaN si hoy ya no toca llamarle."""
+        base = self._base[filas]
+        contacto, resultado = self._contacto[filas], self._resultado[filas]
+        hoy = contacto >= _inicio_dia(ahora)
+        # Contactos de días anteriores: la prioridad se recupera en `DIAS_RECUPERACION` días
+        dias = np.maximum((ahora - contacto) / 86400, 1.0)
+        factor = np.where(np.isnan(contacto), 1.0, np.minimum(dias / DIAS_RECUPERACION, 1.0))
+        reintento = np.array([REINTENTAR.get(r, np.nan) for r in resultado]) if hoy.any() else np.ones(len(filas))
+        factor = np.where(hoy, reintento, factor)
+        disponible = np.where(hoy, contacto + REINTENTO, -np.inf)
+        return base * factor, disponible
+
+    def _encolar(self, fila: int, ahora: float) -> None:
+        """Nueva entrada para la fila; las anteriores quedan obsoletas."""
+        self._version[fila] += 1
+        prioridad, disponible = self._prioridades(np.array([fila]), ahora)
+        zona = int(self._zonas[fila])
+        self._en_cola[fila] = not np.isnan(prioridad[0]) and zona >= 0
+        if not self._en_cola[fila]:
+            return
+        if disponible[0] > ahora:
+            heapq.heappush(self._esperas[zona], (disponible[0], -prioridad[0], int(self._version[fila]), fila))
+        else:
+            heapq.heappush(self._colas[zona], (-prioridad[0], int(self._version[fila]), fila))
+
+    def _sincronizar(self, ahora: float) -> None:
+        """Aplica las llamadas registradas desde la última vez, de este u otro proceso."""
+        if datetime.fromtimestamp(ahora).date() != self.dia:
+            self._construir(ahora)
+            return
+        for id_llamada, codigo, resultado, registrada_en in self.registro.desde(self._ultimo_id):
+            self._ultimo_id = id_llamada
+            fila = self._filas.get(codigo)
+            # Una llamada anterior al último contacto conocido (registrada tarde) no cambia nada
+            if fila is None or registrada_en < self._contacto[fila]:
+                continue
+            self._contacto[fila], self._resultado[fila] = registrada_en, resultado
+            self._encolar(fila, ahora)
+
+    def _liberar_esperas(self, zona: int, ahora: float) -> None:
+        espera, cola = self._esperas[zona], self._colas[zona]
+        while espera and espera[0][0] <= ahora:
+            _, prioridad, version, fila = heapq.heappop(espera)
+            if version == self._version[fila]:
+                heapq.heappush(cola, (prioridad, version, fila))
+
+    def _apartar(self, fila: int, agente: str, expira: float) -> None:
+        """Anota la reserva del agente; como en el registro, suelta la que tuviera antes."""
+        anterior = self._reserva_agente.pop(agente, None)
+        if anterior is not None and self._reservas.get(anterior, ("",))[0] == agente:
+            del self._reservas[anterior]
+        self._reservas[fila] = (agente, expira)
+        self._reserva_agente[agente] = fila
+
+    def _apartada_por_otro(self, fila: int, agente: str, ahora: float) -> bool:
+        reserva = self._reservas.get(fila)
+        return reserva is not None and reserva[0] != agente and reserva[1] >= ahora
+
+    def _olvidar_expiradas(self, ahora: float) -> None:
+        expiradas = [fila for fila, (_, expira) in self._reservas.items() if expira < ahora]
+        for fila in expiradas:
+            agente, _ = self._reservas.pop(fila)
+            if self._reserva_agente.get(agente) == fila:
+                del self._reserva_agente[agente]
+
+    def _turno(self, fila: int, prioridad: float) -> pd.Series:
+        cliente = self._clientes.iloc[fila].copy()
+        cliente["prioridad"] = round(float(prioridad), 3)
+        cliente["ultimo_contacto"] = (
+            pd.NaT if np.isnan(self._contacto[fila]) else pd.Timestamp.fromtimestamp(self._contacto[fila])
+        )
+        cliente["ultimo_resultado"] = self._resultado[fila]
+        return cliente
+
+    def siguiente(self, zona: Hashable, agente: str, ahora: Optional[float] = None) -> Optional[pd.Series]:
+        """Cliente que le toca llamar al agente en la zona, apartado para él; None si la cola está vacía.
+
+        Si el agente ya tiene un cliente de la zona apartado y sin llamar, se
+        le devuelve el mismo.
+        """
+        ahora = ahora or time.time()
+        with self._candado:
+            self._sincronizar(ahora)
+            codigo_zona = self.zonas.get_indexer([zona])[0]
+            if codigo_zona < 0:
+                return None
+            reservado = self.registro.reserva_de(agente, ahora)
+            fila = self._filas.get(reservado) if reservado is not None else None
+            if fila is not None and self._zonas[fila] == codigo_zona and self._en_cola[fila]:
+                return self._turno(fila, self._prioridades(np.array([fila]), ahora)[0][0])
+
+            self._liberar_esperas(codigo_zona, ahora)
+            if len(self._reservas) > 4 * len(self._reserva_agente) + 64:
+                self._olvidar_expiradas(ahora)
+            cola, apartadas, turno = self._colas[codigo_zona], [], None
+            while cola:
+                entrada = heapq.heappop(cola)
+                prioridad, version, fila = entrada
+                if version != self._version[fila]:
+                    continue
+                # La entrada vuelve a la cola: si el agente no registra la llamada, al expirar la reserva sigue ahí
+                apartadas.append(entrada)
+                # Las apartadas por otros agentes de este proceso se saltan sin escribir en el registro;
+                # el registro sólo confirma la elegida (y la rechaza si la apartó otro proceso)
+                if self._apartada_por_otro(fila, agente, ahora):
+                    continue
+                codigo = self._codigos[fila]
+                if self.registro.reservar(codigo, agente, ahora):
+                    self._apartar(fila, agente, ahora + RESERVA)
+                    turno = self._turno(fila, -prioridad)
+                    break
+                ajena = self.registro.reserva_del_cliente(codigo, ahora)
+                if ajena is not None:
+                    self._reservas[fila] = ajena
+            for entrada in apartadas:
+                heapq.heappush(cola, entrada)
+            return turno
+
+    def registrar(self, codigo: Hashable, agente: str, resultado: str, ahora: Optional[float] = None) -> None:
+        """Registra la llamada y actualiza sólo la entrada de ese cliente."""
+        ahora = ahora or time.time()
+        fila = self._filas.get(normalizar_codigo(codigo))
+        zona = None if fila is None or self._zonas[fila] < 0 else str(self.zonas[self._zonas[fila]])
+        self.registro.registrar(codigo, zona, agente, resultado, ahora)
+        with self._candado:
+            self._sincronizar(ahora)
+
+    def pendientes(self, zona: Hashable) -> int:
+        """Clientes de la zona que aún están en la cola de hoy (incluidos los que esperan reintento)."""
+        codigo_zona = self.zonas.get_indexer([zona])[0]
+        if codigo_zona < 0:
+            return 0
+        with self._candado:
+            self._sincronizar(time.time())
+            return int(np.count_nonzero(self._en_cola & (self._zonas == codigo_zona)))
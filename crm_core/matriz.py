@@ -0,0 +1,114 @@
+"""Matriz dispersa vendedor×producto para la pestaña Vendedores.
+
+Se arma desde las celdas del cubo (ya cortadas por los filtros) como una
+matriz CSR con sólo las combinaciones que tienen ventas. La vista nunca
+materializa la matriz completa: el top-N de productos por vendedor sale de
+cada fila dispersa, las columnas se ordenan por totales precalculados y sólo
+la página visible se convierte a una tabla densa (y se colorea). La
+exportación a CSV recorre los valores no nulos en formato largo.
+"""
+from __future__ import annotations
+
+from typing import Hashable, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Centinelas y no cadenas: `orden_columnas` también recibe nombres de fila, y
+# un vendedor llamado "total" no debe confundirse con el orden por total
+ORDEN_TOTAL = object()
+ORDEN_NOMBRE = object()
+
+
+class MatrizVentas:
+    """Matriz filas×columnas de una medida, con filas y columnas sin ventas descartadas."""
+
+    def __init__(self, filas: np.ndarray, columnas: np.ndarray, valores: np.ndarray,
+                 nombres_filas: pd.Index, nombres_columnas: pd.Index,
+                 eje_filas: str = "vendedor", eje_columnas: str = "producto", medida: str = "cantidad"):
+        self.eje_filas, self.eje_columnas, self.medida = eje_filas, eje_columnas, medida
+        validas = (filas >= 0) & (columnas >= 0)
+        matriz = sparse.coo_matrix(
+            (valores[validas], (filas[validas], columnas[validas])),
+            shape=(len(nombres_filas), len(nombres_columnas)),
+        ).tocsr()
+        matriz.eliminate_zeros()
+        con_filas = np.flatnonzero(np.diff(matriz.indptr))
+        con_columnas = np.flatnonzero(np.bincount(matriz.indices, minlength=matriz.shape[1]))
+        self._matriz = matriz[con_filas][:, con_columnas].tocsr()
+        self._matriz.sort_indices()
+        self.filas = pd.Index(np.asarray(nombres_filas)[con_filas], name=eje_filas)
+        self.columnas = pd.Index(np.asarray(nombres_columnas)[con_columnas], name=eje_columnas)
+        self.total_filas = np.asarray(self._matriz.sum(axis=1)).ravel()
+        self.total_columnas = np.asarray(self._matriz.sum(axis=0)).ravel()
+
+    @property
+    def forma(self) -> tuple[int, int]:
+        return self._matriz.shape
+
+    @property
+    def no_nulos(self) -> int:
+        return int(self._matriz.nnz)
+
+    def orden_columnas(self, por: Hashable = ORDEN_TOTAL, descendente: bool = True) -> np.ndarray:
+        """Posiciones de las columnas ordenadas por total, por nombre o por los valores de una fila."""
+        if por is ORDEN_NOMBRE:
+            orden = np.argsort(self.columnas.astype(str).str.lower().to_numpy(dtype=object), kind="stable")
+            return orden[::-1] if descendente else orden
+        if por is ORDEN_TOTAL:
+            claves = self.total_columnas
+        else:
+            claves = self._matriz[self.filas.get_loc(por)].toarray().ravel()
+        # A igualdad de valor, el total de la columna y luego su posición deciden
+        orden = np.lexsort((np.arange(len(claves)), -self.total_columnas, -claves if descendente else claves))
+        return orden
+
+    def pagina(self, orden: np.ndarray, inicio: int = 0, ancho: int = 25) -> pd.DataFrame:
+        """Tabla densa de todas las filas y las columnas `orden[inicio:inicio + ancho]`."""
+        columnas = orden[inicio:inicio + ancho]
+        return pd.DataFrame(
+            self._matriz[:, columnas].toarray(),
+            index=self.filas,
+            columns=pd.Index(self.columnas[columnas], name=self.eje_columnas),
+        )
+
+    def top_por_fila(self, n: int = 10) -> pd.DataFrame:
+        """Las `n` columnas con mayor valor de cada fila, en formato largo con su puesto."""
+        matriz = self._matriz
+        filas, columnas, puestos = [], [], []
+        for fila in range(matriz.shape[0]):
+            inicio, fin = matriz.indptr[fila], matriz.indptr[fila + 1]
+            valores = matriz.data[inicio:fin]
+            mejores = np.argpartition(-valores, n - 1)[:n] if len(valores) > n else np.arange(len(valores))
+            mejores = mejores[np.lexsort((matriz.indices[inicio:fin][mejores], -valores[mejores]))]
+            filas.append(np.full(len(mejores), fila))
+            columnas.append(inicio + mejores)
+            puestos.append(np.arange(1, len(mejores) + 1))
+        if not filas:
+            return pd.DataFrame(columns=[self.eje_filas, "puesto", self.eje_columnas, self.medida])
+        filas, posiciones = np.concatenate(filas), np.concatenate(columnas)
+        return pd.DataFrame({
+            self.eje_filas: self.filas[filas],
+            "puesto": np.concatenate(puestos),
+            self.eje_columnas: self.columnas[matriz.indices[posiciones]],
+            self.medida: matriz.data[posiciones],
+        })
+
+    def a_csv(self, orden: Optional[np.ndarray] = None, tamano_bloque: int = 100_000) -> bytes:
+        """CSV largo (fila, columna, valor) de los valores no nulos, escrito por bloques.
+
+        Con `orden` las columnas salen en ese orden dentro de cada fila.
+        """
+        matriz = self._matriz if orden is None else self._matriz[:, orden].tocsr()
+        nombres_columnas = self.columnas if orden is None else self.columnas[orden]
+        filas = np.repeat(np.arange(matriz.shape[0]), np.diff(matriz.indptr))
+        partes = [f"{self.eje_filas},{self.eje_columnas},{self.medida}\n"]
+        for inicio in range(0, matriz.nnz, tamano_bloque):
+            fin = inicio + tamano_bloque
+            partes.append(pd.DataFrame({
+                self.eje_filas: self.filas[filas[inicio:fin]],
+                self.eje_columnas: nombres_columnas[matriz.indices[inicio:fin]],
+                self.medida: matriz.data[inicio:fin],
+            }).to_csv(index=False, header=False))
+        return "".join(partes).encode("utf-8")
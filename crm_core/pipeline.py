@@ -0,0 +1,195 @@
+"""Pipeline de características de clientes, independiente de Streamlit.
+
+Cada etapa es una función pura sobre DataFrames para poder ejecutarla por
+separado en procesos batch, perfilarla o cachearla. `ejecutar_pipeline` las
+encadena a partir de las hojas leídas y devuelve un `DatosCRM`.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .agregacion import agregar_por_cliente, meses_desde_epoch
+from .cadencia import CICLOS_INACTIVO, cadencia_clientes
+from .compactacion import compactar_tablas, resumen_memoria
+from .cubo import CeldasCongeladas
+from .cumplimiento import emparejar_entregas
+from .descarga import descargar_libro
+from .geocodificacion import geocodificar_clientes
+from .ingesta import HojasCRM, leer_libro
+from .validacion import cuarentena_vacia, validar_hojas
+
+SEGMENTOS = ["Activo", "Disminuido", "Inactivo"]
+FRECUENCIA_MAXIMA = 365
+
+
+@dataclass
+class DatosCRM:
+    """Resultado del pipeline: tabla de clientes enriquecida y tablas de apoyo."""
+
+    clientes: pd.DataFrame
+    top_productos: pd.DataFrame
+    bottom_productos: pd.DataFrame
+    pedidos: pd.DataFrame
+    entregas: pd.DataFrame
+    periodo_pedidos: tuple[str, str] = ("N/A", "N/A")
+    periodo_entregas: tuple[str, str] = ("N/A", "N/A")
+    # Memoria (antes, después) de cada tabla en la compactación de tipos
+    memoria: dict[str, tuple[int, int]] = field(default_factory=dict)
+    # Filas apartadas o corregidas por la validación de las hojas
+    cuarentena: pd.DataFrame = field(default_factory=cuarentena_vacia)
+    # Celdas del cubo ya sumadas por el histórico particionado (ver `cubo.CeldasCongeladas`)
+    congelado: Optional[CeldasCongeladas] = None
+
+    @classmethod
+    def vacio(cls) -> "DatosCRM":
+        return cls(pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame())
+
+    @property
+    def esta_vacio(self) -> bool:
+        return self.clientes.empty
+
+
+def limpiar_clientes(clientes: pd.DataFrame) -> pd.DataFrame:
+    """Quita comillas y espacios sobrantes de la dirección y normaliza la zona."""
+    clientes = clientes.copy()
+    clientes["direccion"] = clientes["direccion"].astype(str).str.replace('"', '').str.strip()
+    clientes["zona"] = clientes["zona"].fillna("No especificada")
+    return clientes
+
+
+def preparar_pedidos(pedidos: pd.DataFrame) -> pd.DataFrame:
+    """Añade el mes del pedido (código entero) y el monto de cada línea."""
+    pedidos = pedidos.copy()
+    pedidos["mes_pedido"] = meses_desde_epoch(pedidos["fecha_pedido"]).astype(np.int32)
+    pedidos["monto"] = pedidos["cantidad"] * pedidos["precio_unitario"]
+    return pedidos
+
+
+def preparar_entregas(entregas: pd.DataFrame) -> pd.DataFrame:
+    """Añade el mes de la entrega (código entero)."""
+    entregas = entregas.copy()
+    entregas["mes_entrega"] = meses_desde_epoch(entregas["fecha_entrega"]).astype(np.int32)
+    return entregas
+
+
+def rango_fechas(fechas: pd.Series) -> tuple[str, str]:
+    """Primera y última fecha en formato dd/mm/aaaa, o N/A si no hay datos."""
+    if fechas.empty:
+        return "N/A", "N/A"
+    return fechas.min().strftime('%d/%m/%Y'), fechas.max().strftime('%d/%m/%Y')
+
+
+def construir_clientes(
+    clientes: pd.DataFrame,
+    agregados: pd.DataFrame,
+    hoy: Optional[pd.Timestamp] = None,
+    cadencia: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Une clientes con sus agregados y su cadencia y calcula frecuencia, segmento y valor."""
+    df = pd.merge(clientes, agregados, on="codigo_cliente", how="left")
+    # La fecha queda como NaT en lugar de 0 para conservar su tipo; el mes, -1
+    df = df.fillna({c: 0 for c in agregados.columns if c not in ("ultimo_pedido", "mes_frecuente")})
+    df["mes_frecuente"] = df["mes_frecuente"].fillna(-1).astype(np.int32)
+    df[["total_pedidos", "entregas_count"]] = df[["total_pedidos", "entregas_count"]].astype(np.int32)
+
+    # Días sin compra: desde el último pedido, limitados a 365 (sin pedidos: 365)
+    hoy = hoy if hoy is not None else pd.Timestamp.now().normalize()
+    recencia = (hoy - df["ultimo_pedido"]).dt.days.to_numpy(dtype=np.float64)
+    df["dias_sin_compra"] = np.clip(np.nan_to_num(recencia, nan=FRECUENCIA_MAXIMA), None, FRECUENCIA_MAXIMA).astype(np.int16)
+
+    # Cadencia: intervalos reales entre días de compra (NaN con menos de dos compras)
+    if cadencia is None:
+        cadencia = pd.DataFrame(index=pd.Index([], name="codigo_cliente"))
+    cadencia = cadencia.reindex(df["codigo_cliente"].astype(str).str.strip())
+    for columna in cadencia.columns:
+        df[columna] = cadencia[columna].to_numpy()
+    if "compras" in df.columns:
+        df["compras"] = df["compras"].fillna(0).astype(np.int32)
+    limite_activo = cadencia["limite_activo"].to_numpy(dtype=np.float64) if "limite_activo" in cadencia else np.full(len(df), np.nan)
+
+    # Frecuencia de compra: intervalo mediano entre compras (sin cadencia: 365)
+    intervalo = cadencia["intervalo_mediano"].to_numpy(dtype=np.float64) if "intervalo_mediano" in cadencia else np.full(len(df), np.nan)
+    df["frecuencia_compra"] = np.clip(np.round(np.nan_to_num(intervalo, nan=FRECUENCIA_MAXIMA)), 1, FRECUENCIA_MAXIMA).astype(np.int16)
+
+    # Segmentación: con cadencia, según el atraso respecto a su propio ritmo de compra;
+    # sin ella (menos de dos compras), por días desde la última compra
+    por_recencia = np.select([df["dias_sin_compra"] < 30, df["dias_sin_compra"] < 90], [0, 1], 2)
+    dias = np.nan_to_num(recencia, nan=np.inf)
+    por_cadencia = np.select([dias <= limite_activo, dias <= CICLOS_INACTIVO * limite_activo], [0, 1], 2)
+    df["segmento"] = pd.Categorical.from_codes(
+        np.where(np.isnan(limite_activo), por_recencia, por_cadencia),
+        dtype=pd.CategoricalDtype(SEGMENTOS, ordered=True),
+    )
+
+    # Valor del cliente (proyección anual): gasto por día de compra por las compras esperadas en
+    # un año según su intervalo mediano; con menos de dos compras no hay intervalo y se cuenta una
+    # al año. No se usa `ticket_promedio`, que es por línea y no por compra
+    compras = df["compras"].to_numpy(dtype=np.float64) if "compras" in df.columns else np.ones(len(df))
+    gasto_por_compra = df["monto_total"].to_numpy(dtype=np.float64) / np.maximum(compras, 1)
+    compras_al_anio = np.where(np.isnan(intervalo), 1.0, 365 / intervalo)
+    df["valor_cliente"] = np.round(gasto_por_compra * compras_al_anio, 2)
+    return df
+
+
+def productos_extremos(pedidos: pd.DataFrame, n: int = 5) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Los `n` productos más y menos vendidos por cantidad."""
+    cantidades = pedidos.groupby("producto", observed=True)["cantidad"].sum()
+    top = cantidades.nlargest(n).reset_index().dropna()
+    bottom = cantidades.nsmallest(n).reset_index().dropna()
+    return top, bottom
+
+
+def ejecutar_pipeline(
+    hojas: HojasCRM,
+    hoy: Optional[pd.Timestamp] = None,
+    mostrar_memoria: bool = True,
+    geocodificar: bool = True,
+) -> DatosCRM:
+    """Encadena todas las etapas a partir de las hojas ya leídas."""
+    if not hojas.validadas:
+        hojas = validar_hojas(hojas)
+    cuarentena = hojas.cuarentena if hojas.cuarentena is not None else cuarentena_vacia()
+    if mostrar_memoria and not cuarentena.empty:
+        print(f"[validación] {len(cuarentena):,} incidencias en cuarentena", flush=True)
+    clientes = limpiar_clientes(hojas.clientes)
+    if geocodificar:
+        clientes = geocodificar_clientes(clientes, mostrar_resumen=mostrar_memoria)
+    tablas, memoria = compactar_tablas(
+        clientes=clientes,
+        pedidos=preparar_pedidos(hojas.pedidos),
+        entregas=preparar_entregas(hojas.entregas),
+    )
+    clientes, pedidos, entregas = tablas["clientes"], tablas["pedidos"], tablas["entregas"]
+    if mostrar_memoria:
+        print(resumen_memoria(memoria), flush=True)
+    cumplimiento = hojas.cumplimiento if hojas.cumplimiento is not None else emparejar_entregas(pedidos, entregas)
+    pedidos = pd.concat([pedidos, cumplimiento], axis=1)
+
+    # El histórico particionado trae los agregados y la cadencia de meses cerrados más mes abierto
+    agregados = hojas.agregados if hojas.agregados is not None else agregar_por_cliente(pedidos, entregas)
+    cadencia = hojas.cadencia.tabla(hoy) if hojas.cadencia is not None else cadencia_clientes(pedidos, hoy)
+    df = construir_clientes(clientes, agregados, hoy, cadencia)
+    top_productos, bottom_productos = productos_extremos(pedidos)
+
+    return DatosCRM(
+        clientes=df,
+        top_productos=top_productos,
+        bottom_productos=bottom_productos,
+        pedidos=pedidos,
+        entregas=entregas,
+        periodo_pedidos=rango_fechas(pedidos["fecha_pedido"]),
+        periodo_entregas=rango_fechas(entregas["fecha_entrega"]),
+        memoria=memoria,
+        cuarentena=cuarentena,
+        congelado=hojas.congelado,
+    )
+
+
+def cargar_datos(file_id: str, hoy: Optional[pd.Timestamp] = None, **opciones_descarga) -> DatosCRM:
+    """Descarga (o revalida) el libro y ejecuta el pipeline completo."""
+    libro = descargar_libro(file_id, **opciones_descarga)
+    return ejecutar_pipeline(leer_libro(libro.ruta), hoy)
@@ -0,0 +1,175 @@
+"""Tablas de recomendación de la pestaña Clientes, precalculadas por versión.
+
+"Recomendados" son los productos con más unidades pedidas en la celda del
+cliente (mismo tipo de negocio y zona). "Oportunidades" son los productos que
+el cliente nunca pidió, ordenados por popularidad en su celda y después en
+todo el catálogo. Las compras de cada cliente se guardan como un bitset
+cliente×producto, de modo que una consulta es una diferencia de conjuntos
+sobre un ranking ya ordenado.
+"""
+from __future__ import annotations
+
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+from .compactacion import codigos_y_valores
+from .indice_clientes import IndiceClientes
+
+TOP_RECOMENDADOS = 5
+
+
+class TablasRecomendacion:
+    """Top-N por celda (tipo_negocio, zona), bitset de compras y rankings por celda."""
+
+    def __init__(
+        self,
+        clientes: pd.DataFrame,
+        pedidos: pd.DataFrame,
+        indice: IndiceClientes,
+        top: int = TOP_RECOMENDADOS,
+    ):
+        self._indice = indice
+        self.top = top
+        n_clientes = len(indice)
+
+        # Celda de cada clave de cliente; -1 si le falta tipo de negocio o zona
+        celdas_filas = (
+            clientes.groupby(["tipo_negocio", "zona"], observed=True, sort=False).ngroup()
+            .fillna(-1).to_numpy().astype(np.int32)
+        )
+        self._celdas = celdas_filas[indice.filas_clientes]
+        n_celdas = int(celdas_filas.max()) + 1 if len(celdas_filas) else 0
+
+        claves, filas = indice.lineas_pedido()
+        if len(filas) and "producto" in pedidos.columns:
+            productos_fila, self._productos = codigos_y_valores(pedidos["producto"])
+            productos = productos_fila[filas]
+            cantidades = pedidos["cantidad"].to_numpy(dtype=np.float64)[filas]
+            validas = productos >= 0
+            claves, productos, cantidades = claves[validas], productos[validas], cantidades[validas]
+        else:
+            self._productos = pd.Index([])
+            claves = productos = np.empty(0, dtype=np.int32)
+            cantidades = np.empty(0, dtype=np.float64)
+        n_productos = len(self._productos)
+
+        # Bitset: una fila de bytes por cliente, un bit por producto
+        self._bytes_fila = (n_productos + 7) // 8
+        pares, par_linea = np.unique(claves.astype(np.int64) * max(n_productos, 1) + productos, return_inverse=True)
+        bits = np.zeros(n_clientes * self._bytes_fila, dtype=np.uint8)
+        if len(pares):
+            clave_par, producto_par = np.divmod(pares, n_productos)
+            posiciones = clave_par * self._bytes_fila + producto_par // 8
+            np.bitwise_or.at(bits, posiciones, (0x80 >> (producto_par % 8)).astype(np.uint8))
+        self._bits = bits.reshape(n_clientes, self._bytes_fila)
+
+        # Producto con más unidades de cada cliente; a igualdad, el primero del catálogo
+        self._mas_comprado = np.full(n_clientes, -1, dtype=np.int32)
+        if len(pares):
+            unidades_par = np.bincount(par_linea.ravel(), weights=cantidades, minlength=len(pares))
+            orden = np.lexsort((producto_par, -unidades_par, clave_par))
+            primeros = orden[np.r_[True, clave_par[orden][1:] != clave_par[orden][:-1]]]
+            self._mas_comprado[clave_par[primeros]] = producto_par[primeros]
+
+        # Unidades por (celda, producto) y en total; sólo cuentan productos pedidos
+        celda_linea = self._celdas[claves] if len(claves) else np.empty(0, dtype=np.int32)
+        con_celda = celda_linea >= 0
+        self._popularidad = np.bincount(
+            celda_linea[con_celda].astype(np.int64) * n_productos + productos[con_celda],
+            weights=cantidades[con_celda],
+            minlength=n_celdas * n_productos,
+        ).reshape(n_celdas, n_productos)
+        global_ = np.bincount(productos, weights=cantidades, minlength=n_productos)
+        self._catalogo = np.flatnonzero(global_ > 0)
+
+        # Ranking por celda: popularidad en la celda y, a igualdad, en todo el catálogo
+        orden_global = self._catalogo[np.argsort(-global_[self._catalogo], kind="stable")]
+        self._orden_global = orden_global.astype(np.int32)
+        self._ranking = np.empty((n_celdas, len(orden_global)), dtype=np.int32)
+        for celda in range(n_celdas):
+            orden = np.argsort(-self._popularidad[celda, orden_global], kind="stable")
+            self._ranking[celda] = orden_global[orden]
+
+    def _clave_y_celda(self, codigo: Hashable) -> tuple[int, int]:
+        clave = self._indice.clave(codigo)
+        if clave is None:
+            return -1, -1
+        return clave, int(self._celdas[clave])
+
+    def comprados(self, codigo: Hashable) -> np.ndarray:
+        """Máscara de productos que el cliente pidió alguna vez."""
+        clave, _ = self._clave_y_celda(codigo)
+        if clave < 0:
+            return np.zeros(len(self._productos), dtype=bool)
+        return np.unpackbits(self._bits[clave], count=len(self._productos)).astype(bool)
+
+    def recomendados(self, codigo: Hashable) -> pd.DataFrame:
+        """Productos con más unidades en la celda del cliente (columnas producto, cantidad)."""
+        _, celda = self._clave_y_celda(codigo)
+        if celda < 0:
+            return pd.DataFrame({"producto": pd.Series([], dtype=object), "cantidad": pd.Series([], dtype=float)})
+        top = self._ranking[celda][: self.top]
+        unidades = self._popularidad[celda, top]
+        top = top[unidades > 0]
+        return pd.DataFrame({"producto": self._productos[top], "cantidad": unidades[unidades > 0]})
+
+    def oportunidades(self, codigo: Hashable, n: int = TOP_RECOMENDADOS) -> list:
+        """Productos que el cliente no pidió nunca, los más populares de su celda primero."""
+        _, celda = self._clave_y_celda(codigo)
+        ranking = self._ranking[celda] if celda >= 0 else self._orden_global
+        candidatos = ranking[~self.comprados(codigo)[ranking]]
+        return list(self._productos[candidatos[:n]])
+
+    def _celdas_de(self, claves: np.ndarray) -> np.ndarray:
+        """Celda de cada clave de cliente; -1 para claves desconocidas o sin celda."""
+        if not len(self._celdas):
+            return np.full(len(claves), -1, dtype=np.int64)
+        return np.where(claves >= 0, self._celdas[np.maximum(claves, 0)], -1)
+
+    def oportunidad_principal(self, claves: np.ndarray) -> pd.Series:
+        """Primera oportunidad de cada clave de cliente (None si no hay), resuelta por lotes.
+
+        Recorre el ranking posición a posición sólo para las claves aún sin
+        resolver; casi todas se resuelven en los primeros puestos.
+        """
+        claves = np.asarray(claves)
+        resultado = np.full(len(claves), -1, dtype=np.int64)
+        celdas = self._celdas_de(claves)
+        pendientes = np.arange(len(claves))
+        for posicion in range(len(self._orden_global)):
+            if not len(pendientes):
+                break
+            celda, clave = celdas[pendientes], claves[pendientes]
+            producto = np.full(len(pendientes), self._orden_global[posicion], dtype=np.int64)
+            if len(self._ranking):
+                producto = np.where(celda >= 0, self._ranking[np.maximum(celda, 0), posicion], producto)
+            bits = self._bits[np.maximum(clave, 0), producto // 8] if len(self._bits) else np.zeros(len(clave), dtype=np.uint8)
+            comprado = (clave >= 0) & ((bits & (0x80 >> (producto % 8))) != 0)
+            resultado[pendientes[~comprado]] = producto[~comprado]
+            pendientes = pendientes[comprado]
+        return self._nombres(resultado)
+
+    def _nombres(self, posiciones: np.ndarray) -> pd.Series:
+        """Nombre de producto de cada posición; None donde es -1."""
+        nombres = np.asarray(self._productos, dtype=object)
+        if not len(nombres):
+            return pd.Series([None] * len(posiciones), dtype=object)
+        return pd.Series(np.where(posiciones >= 0, nombres[np.maximum(posiciones, 0)], None), dtype=object)
+
+    def mas_comprado(self, claves: np.ndarray) -> pd.Series:
+        """Producto con más unidades pedidas de cada clave de cliente (None sin historial)."""
+        claves = np.asarray(claves)
+        return self._nombres(np.where(claves >= 0, self._mas_comprado[np.maximum(claves, 0)], -1) if len(self._mas_comprado) else claves)
+
+    def recomendado_principal(self, claves: np.ndarray) -> pd.Series:
+        """Primer producto de `recomendados` de cada clave de cliente (None sin celda o sin ventas en ella)."""
+        claves = np.asarray(claves)
+        celdas = self._celdas_de(claves)
+        productos = np.full(len(claves), -1, dtype=np.int64)
+        if self._ranking.size:
+            primero = self._ranking[np.maximum(celdas, 0), 0]
+            con_ventas = (celdas >= 0) & (self._popularidad[np.maximum(celdas, 0), primero] > 0)
+            productos = np.where(con_ventas, primero, -1)
+        return self._nombres(productos)
@@ -0,0 +1,177 @@
+"""Refresco de datos en segundo plano con intercambio atómico de versión.
+
+Un hilo por proceso revalida el libro cada cierto intervalo (o cuando se le
+pide) y reconstruye las tablas fuera del camino de las peticiones. La nueva
+versión sustituye a la anterior con una sola asignación: cada ejecución del
+script toma `actual()` al principio y trabaja con esa versión hasta el final,
+aunque entretanto se publique otra.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Optional, Sequence
+
+from .configuracion import INTERVALO_REVALIDACION
+from .dataset import DatasetCompartido
+from .descarga import descargar_libro
+from .historico import Fuente, HistoricoParticionado, huella_conjunta, materializar_fuentes
+from .ingesta import leer_libro
+from .pipeline import ejecutar_pipeline
+from .snapshot import escribir_snapshot, leer_snapshot, version_snapshot
+
+
+@dataclass(frozen=True)
+class VersionDatos:
+    """Una versión publicada de los datos y de dónde viene."""
+
+    dataset: DatasetCompartido
+    version: str
+    sha256: str
+    dia: date
+    descargado_en: float
+    publicado_en: float
+
+    def antiguedad(self, ahora: Optional[float] = None) -> float:
+        """Segundos desde que se descargaron los bytes de esta versión."""
+        return (ahora or time.time()) - self.descargado_en
+
+
+def cargar_version(
+    file_id: str,
+    anterior: Optional[VersionDatos] = None,
+    forzar: bool = False,
+) -> VersionDatos:
+    """Revalida el libro y devuelve la versión vigente.
+
+    Sin `forzar`, una revalidación hecha por otro proceso dentro del intervalo
+    se da por buena. Si los bytes y el día no cambiaron devuelve `anterior`
+    tal cual; si no, usa el snapshot de esa versión cuando existe y sólo en
+    último caso ejecuta el pipeline completo (y publica el snapshot).
+    """
+    libro = descargar_libro(file_id, max_antiguedad=0 if forzar else INTERVALO_REVALIDACION)
+    hoy = date.today()
+    if anterior and anterior.sha256 == libro.sha256 and anterior.dia == hoy:
+        return anterior
+
+    version = version_snapshot(libro.sha256, hoy)
+    datos = leer_snapshot(version)
+    if datos is None:
+        datos = ejecutar_pipeline(leer_libro(libro.ruta))
+        escribir_snapshot(datos, version)
+    return VersionDatos(
+        dataset=DatasetCompartido(datos, version=version).precalcular(),
+        version=version,
+        sha256=libro.sha256,
+        dia=hoy,
+        descargado_en=libro.descargado_en,
+        publicado_en=time.time(),
+    )
+
+
+def cargar_version_fuentes(
+    fuentes: Sequence[Fuente],
+    anterior: Optional[VersionDatos] = None,
+    forzar: bool = False,
+    historico: Optional[HistoricoParticionado] = None,
+) -> VersionDatos:
+    """Como `cargar_version`, pero con varias fuentes sobre el histórico particionado.
+
+    Las fuentes se revalidan a la vez y la versión depende de la huella de todas;
+    al reconstruir, sólo se analizan las fuentes que cambiaron y los agregados
+    de los meses cerrados salen del resumen acumulado de sus particiones.
+    """
+    materializadas = materializar_fuentes(fuentes, max_antiguedad=0 if forzar else INTERVALO_REVALIDACION)
+    huella = huella_conjunta(materializadas)
+    hoy = date.today()
+    if anterior and anterior.sha256 == huella and anterior.dia == hoy:
+        return anterior
+
+    version = version_snapshot(huella, hoy)
+    datos = leer_snapshot(version)
+    if datos is None:
+        datos = ejecutar_pipeline((historico or HistoricoParticionado()).cargar(materializadas, hoy))
+        escribir_snapshot(datos, version)
+    return VersionDatos(
+        dataset=DatasetCompartido(datos, version=version).precalcular(),
+        version=version,
+        sha256=huella,
+        dia=hoy,
+        # La antigüedad de la versión es la de la fuente revalidada hace más tiempo
+        descargado_en=min(m.descargado_en for m in materializadas),
+        publicado_en=time.time(),
+    )
+
+
+class RefrescadorDatos:
+    """Mantiene la versión actual de los datos y la refresca en un hilo propio.
+
+    `cargar(anterior, forzar)` produce la nueva versión; en producción es
+    `functools.partial(cargar_version, file_id)` o, con varias fuentes,
+    `functools.partial(cargar_version_fuentes, fuentes)`.
+    """
+
+    def __init__(
+        self,
+        cargar: Callable[[Optional[VersionDatos], bool], VersionDatos],
+        intervalo: float = INTERVALO_REVALIDACION,
+    ):
+        self._cargar = cargar
+        self.intervalo = intervalo
+        self._actual: Optional[VersionDatos] = None
+        self._candado = threading.Lock()
+        self._pedido = threading.Event()
+        self._forzar = False
+        self._primera = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.refrescando = False
+        self.ultimo_error: Optional[Exception] = None
+        self.ultimo_intento: Optional[float] = None
+
+    def iniciar(self) -> "RefrescadorDatos":
+        with self._candado:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="crm-refresco", daemon=True)
+                self._hilo.start()
+        return self
+
+    def actual(self) -> Optional[VersionDatos]:
+        return self._actual
+
+    def esperar_primera_version(self, timeout: Optional[float] = None) -> Optional[VersionDatos]:
+        """Bloquea hasta el primer intento de carga (con o sin éxito)."""
+        self._primera.wait(timeout)
+        return self._actual
+
+    def solicitar(self, forzar: bool = True) -> None:
+        """Pide un refresco inmediato sin esperar a que termine.
+
+        Con `forzar` se ignora la revalidación reciente hecha por otros procesos.
+        """
+        self._forzar = self._forzar or forzar
+        self._pedido.set()
+
+    def refrescar(self) -> None:
+        """Un ciclo de refresco; los errores se guardan y se conserva la versión anterior."""
+        forzar, self._forzar = self._forzar, False
+        self.refrescando = True
+        self.ultimo_intento = time.time()
+        try:
+            nueva = self._cargar(self._actual, forzar)
+            with self._candado:
+                self._actual = nueva
+            self.ultimo_error = None
+        except Exception as e:
+            self.ultimo_error = e
+        finally:
+            self.refrescando = False
+            self._primera.set()
+
+    def _bucle(self) -> None:
+        while True:
+            # Se limpia antes de cargar: un pedido llegado durante la carga no se pierde
+            self._pedido.clear()
+            self.refrescar()
+            self._pedido.wait(self.intervalo)
@@ -0,0 +1,123 @@
+"""Snapshot versionado de los datos procesados en formato Arrow IPC (Feather v2).
+
+Cada versión se escribe sin compresión en su propio directorio y se publica
+con un renombrado atómico; el fichero `ACTUAL` apunta a la última versión.
+Los procesos la abren con `pyarrow.memory_map`, de modo que todos comparten
+la misma copia en la caché de páginas del sistema operativo y un proceso
+nuevo arranca sin volver a leer el Excel.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .configuracion import DIRECTORIO_CACHE
+from .pipeline import DatosCRM
+
+# Se incrementa cuando cambia el contenido o el esquema de las tablas
+FORMATO = 6
+TABLAS = ("clientes", "top_productos", "bottom_productos", "pedidos", "entregas", "cuarentena")
+VERSIONES_CONSERVADAS = 3
+
+
+def directorio_snapshots(directorio: str = DIRECTORIO_CACHE) -> str:
+    return os.path.join(directorio, "snapshots")
+
+
+def version_snapshot(sha256: str, dia: Optional[date] = None) -> str:
+    """Versión para un libro y un día: la frecuencia de compra depende de la fecha."""
+    dia = dia or date.today()
+    return f"f{FORMATO}-{dia:%Y%m%d}-{sha256[:16]}"
+
+
+def _escribir_puntero(base: str, version: str) -> None:
+    fd, temporal = tempfile.mkstemp(dir=base, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(temporal, os.path.join(base, "ACTUAL"))
+
+
+def _limpiar_antiguas(base: str, actual: str) -> None:
+    """Borra versiones viejas; los procesos que aún las tengan mapeadas no se ven afectados."""
+    versiones = [
+        os.path.join(base, nombre) for nombre in os.listdir(base)
+        if nombre.startswith("f") and os.path.isdir(os.path.join(base, nombre)) and nombre != actual
+    ]
+    versiones.sort(key=os.path.getmtime, reverse=True)
+    for ruta in versiones[VERSIONES_CONSERVADAS - 1:]:
+        shutil.rmtree(ruta, ignore_errors=True)
+
+
+def escribir_snapshot(datos: DatosCRM, version: str, directorio: str = DIRECTORIO_CACHE) -> str:
+    """Escribe las tablas de `datos` como versión `version` y la marca como actual."""
+    base = directorio_snapshots(directorio)
+    os.makedirs(base, exist_ok=True)
+    destino = os.path.join(base, version)
+
+    if not os.path.isdir(destino):
+        temporal = tempfile.mkdtemp(dir=base, prefix=".tmp-")
+        try:
+            for nombre in TABLAS:
+                tabla = pa.Table.from_pandas(getattr(datos, nombre), preserve_index=False)
+                feather.write_feather(tabla, os.path.join(temporal, nombre + ".arrow"), compression="uncompressed")
+            meta = {
+                "version": version,
+                "creado_en": time.time(),
+                "periodo_pedidos": list(datos.periodo_pedidos),
+                "periodo_entregas": list(datos.periodo_entregas),
+                "memoria": datos.memoria,
+            }
+            with open(os.path.join(temporal, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.rename(temporal, destino)
+        except OSError:
+            # Otro proceso publicó la misma versión a la vez: vale la suya
+            shutil.rmtree(temporal, ignore_errors=True)
+            if not os.path.isdir(destino):
+                raise
+
+    _escribir_puntero(base, version)
+    _limpiar_antiguas(base, version)
+    return destino
+
+
+def version_actual(directorio: str = DIRECTORIO_CACHE) -> Optional[str]:
+    try:
+        with open(os.path.join(directorio_snapshots(directorio), "ACTUAL"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def leer_snapshot(version: Optional[str] = None, directorio: str = DIRECTORIO_CACHE) -> Optional[DatosCRM]:
+    """Abre una versión (por defecto la actual) mapeada en memoria; None si no existe."""
+    version = version or version_actual(directorio)
+    if not version:
+        return None
+    ruta = os.path.join(directorio_snapshots(directorio), version)
+    try:
+        with open(os.path.join(ruta, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        tablas = {}
+        for nombre in TABLAS:
+            lector = pa.ipc.open_file(pa.memory_map(os.path.join(ruta, nombre + ".arrow"), "r"))
+            # split_blocks evita consolidar columnas y así no copia las numéricas sin nulos
+            tablas[nombre] = lector.read_all().to_pandas(split_blocks=True)
+    except (OSError, ValueError, pa.ArrowInvalid):
+        return None
+
+    return DatosCRM(
+        periodo_pedidos=tuple(meta["periodo_pedidos"]),
+        periodo_entregas=tuple(meta["periodo_entregas"]),
+        memoria={nombre: tuple(valores) for nombre, valores in meta.get("memoria", {}).items()},
+        **tablas,
+    )